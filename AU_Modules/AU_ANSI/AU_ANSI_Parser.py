@@ -18,10 +18,16 @@ screen to the user.
 This function do not conflict with the module ansi.py
 """
 
+import os
 import re
 import sys
+import json
 import getopt
 import codecs
+import hashlib
+from contextlib import contextmanager, suppress
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 # ANSI/EVENNIA Definitions
 
@@ -151,8 +157,23 @@ ansi_map = [
     ('47h', EVENNIA_ANSI_BACK_HI_WHITE)
 ]
 
-# LAst parsed escape command
-LAST_EC_PARSED = '0'
+# Mapping as a lookup table
+ANSI_MAP_DICT = dict(ansi_map)
+
+# Escape codes to convert, and those added by TheDraw to remove
+ANSI_PATTERN = re.compile(r"\033\[(?:([0-9;]+)m|\?7h|255D)")
+# An escape code not complete yet, at the end of a chunk
+ANSI_PARTIAL_PATTERN = re.compile(r"\033(?:\[[0-9;?]*)?\Z")
+
+# Size of the chunks read when converting files
+ANSI_CHUNK_SIZE = 65536
+
+# Batch conversion of directories
+ANSI_SCREEN_EXTENSIONS = ('.ans', '.utf8ans')
+ANSI_OUTPUT_EXTENSION = '.txt'
+ANSI_MANIFEST = '.au_ansi_manifest.json'
+ANSI_SCREENS_MODULE = 'AU_ANSI_Screens_{}.py'
+ANSI_SCREEN_VARIABLE = 'AU_ANSI_Screen_{}'
 
 
 # Parse funcion
@@ -160,139 +181,362 @@ def au_ansi_parser(ansi_screen):
     """
     Main function, start the parsing.
     """
-    parsed_string = ansi_screen
+    return AUANSIConverter().convert(ansi_screen)
 
-    # replace the escape codes added by TheDraw
-    # \033[?7h
-    # \033[255D
-    parsed_string = parsed_string.replace('\033[?7h', '')
-    parsed_string = parsed_string.replace('\033[255D', '')
 
-    # Pattern to match escape codes in the ansi screen
-    ansi_pattern = r"\033\[[0-9;]+m"
-    ansi_compiled_pattern = re.compile(ansi_pattern)
+class AUANSIConverter(object):
+    """
+    Converts ANSI escape codes to evennia color tags in one pass. The
+    last foreground color is kept per converter, so any number of
+    screens can be converted at the same time. A screen can also be
+    fed in chunks, as read from a file.
+
+        Ex:
+            converter = AUANSIConverter()
+            parsed_screen = converter.feed(chunk1) + converter.feed(chunk2) + converter.close()
+    """
 
-    # tokenized the ANSI codes
-    tokens = ansi_compiled_pattern.finditer(parsed_string)
+    def __init__(self):
+        """
+        Init the converter with no color set.
+        """
+        self.last_fore = '0'
+        self.pending = ''
+
+    def convert(self, ansi_screen):
+        """
+        Convert a whole screen, adding a final '|n' code.
+        """
+        return self.feed(ansi_screen) + self.close()
+
+    def feed(self, chunk):
+        """
+        Convert the next chunk of a screen. An escape code cut at the
+        end of the chunk is kept until the next one.
+        """
+        text = self.pending + chunk
+        partial = ANSI_PARTIAL_PATTERN.search(text, max(0, text.rfind(AU_ANSI_ESCAPE)))
+        if partial:
+            self.pending = text[partial.start():]
+            text = text[:partial.start()]
+        else:
+            self.pending = ''
+        return ANSI_PATTERN.sub(self._replace, text)
 
-    # Iterate through the tokens (ANSI codes) and replace
-    # then with evennia color tags
-    for token in tokens:
-        parsed_string = parsed_string.replace(token.group(), evennia_colors(token.group()), 1)
+    def close(self):
+        """
+        End the screen, returning the rest and a final '|n' code.
+        """
+        rest, self.pending = self.pending, ''
+        return rest + EVENNIA_ANSI_NORMAL
 
-    # return the parsed string and add a final '|n' code
-    return parsed_string + EVENNIA_ANSI_NORMAL
+    def _replace(self, match):
+        ansi_code = match.group(1)
+        if ansi_code is None:
+            # TheDraw codes are removed
+            return ''
+        colortag, self.last_fore = evennia_colors(ansi_code, self.last_fore)
+        return colortag
 
 
 # Auxuliary function
-def evennia_colors(ansi_code):
+@lru_cache(maxsize=None)
+def evennia_colors(ansi_code, last_fore='0'):
     """
     Translate the ANSI codes to evennia color tags
-    """
-    # Global variable for Moebious way to write ANSI code
-    # when HILITE white
-    global LAST_EC_PARSED
 
-    colortag = ''
+    Args:
+        ansi_code: the terms of an ANSI code, as '0;32' for '\033[0;32m'
+        last_fore: the last FOREGROUND color, for Moebious way to write
+                   ANSI code when HILITE white
 
-    # remove the escape code plus [ from ANSI codes
-    ansi_code = ansi_code.replace(AU_ANSI_ESCAPE_COLOR, '')
-    # remove the final m from ANSI codes
-    ansi_code = ansi_code.replace('m', '')
+    Returns:
+        (colortag, last_fore): the evennia color tags and the new last
+                               FOREGROUND color
+    """
+    colortag = ''
 
     # split the terms of the ansi code
-    codes = re.split(';', ansi_code)
+    codes = ansi_code.split(';')
 
     # Determine the amount of terms in the ANSI code
     terms = len(codes)
 
-    # Convert te map in a dictionary
-    ansi_map_dict = dict(ansi_map)
-
     # Do the actual replacement ANSI -> EVENNIA
-    code = ''
     if terms == 1:
         if codes[0] == '0':
-            colortag = ansi_map_dict[codes[0]]
+            colortag = ANSI_MAP_DICT[codes[0]]
         elif codes[0] == '1':
-            colortag = ansi_map_dict[LAST_EC_PARSED + 'h']
+            colortag = ANSI_MAP_DICT[last_fore + 'h']
         elif codes[0] == '4':
-            colortag = ansi_map_dict[codes[0]]
+            colortag = ANSI_MAP_DICT[codes[0]]
         elif codes[0] == '5':
-            colortag = ansi_map_dict[codes[0]]
+            colortag = ANSI_MAP_DICT[codes[0]]
         else:
-            colortag = ansi_map_dict[codes[0]]
-            LAST_EC_PARSED = codes[0]  # Save the FOREGROUND color
+            colortag = ANSI_MAP_DICT[codes[0]]
+            last_fore = codes[0]  # Save the FOREGROUND color
     elif terms == 2:
-        if codes[0] == '0':
-            for code in codes:
-                colortag = colortag + ansi_map_dict[code]
-
-            LAST_EC_PARSED = codes[1]  # Save the FOREGROUND color
-        elif codes[0] == '1':
-            colortag = ansi_map_dict[codes[1] + 'h']
-
-            LAST_EC_PARSED = codes[1]  # Save the FOREGROUND color
-        elif codes[0] == '4':
-            for code in codes:
-                colortag = colortag + ansi_map_dict[code]
-
-            LAST_EC_PARSED = codes[1]  # Save the FOREGROUND color
-        elif codes[0] == '5':
-            for code in codes:
-                colortag = colortag + ansi_map_dict[code]
-
-            LAST_EC_PARSED = codes[1]  # Save the FOREGROUND color
+        if codes[0] == '1':
+            colortag = ANSI_MAP_DICT[codes[1] + 'h']
         else:
             for code in codes:
-                colortag = colortag + ansi_map_dict[code]
+                colortag = colortag + ANSI_MAP_DICT[code]
 
-            LAST_EC_PARSED = codes[0]  # Save the FOREGROUND color
-    elif terms >= 3:
+        if codes[0] in ('0', '1', '4', '5'):
+            last_fore = codes[1]  # Save the FOREGROUND color
+        else:
+            last_fore = codes[0]  # Save the FOREGROUND color
+    else:
         HI = ''
         for code in codes:
             if code == '1':
                 HI = 'h'
             else:
                 if int(code) >= 30:
-                    colortag = colortag + ansi_map_dict[code + HI]
+                    colortag = colortag + ANSI_MAP_DICT[code + HI]
                     HI = ''
-                    if int(code < 40):
-                        LAST_EC_PARSED = code
+                    if int(code) < 40:
+                        last_fore = code
                 else:
-                    colortag = colortag + ansi_map_dict[code]
-    else:
-        pass
+                    colortag = colortag + ANSI_MAP_DICT[code]
+
+    return colortag, last_fore
 
-    return colortag
+
+@contextmanager
+def atomic_write(path):
+    """
+    Open a file to write, replacing the file only once written completely.
+    A conversion interrupted never leaves a file half written.
+
+    Args:
+        path: the file to write
+
+    Yields:
+        ofile: the temporary file to write to
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as ofile:
+            yield ofile
+        os.replace(tmp_path, path)
+    except BaseException:
+        # the temporary file may not exist, if opening it failed
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def convert_file(input_file, output_file):
+    """
+    Convert a file with a ANSI Art screen to a file with evennia color tags,
+    in chunks.
+
+    Args:
+        input_file: the ANSI Art screen
+        output_file: the file to write
+    """
+    converter = AUANSIConverter()
+    with open(input_file, 'r') as ifile, atomic_write(output_file) as ofile:
+        for chunk in iter(lambda: ifile.read(ANSI_CHUNK_SIZE), ''):
+            ofile.write(converter.feed(chunk))
+        ofile.write(converter.close())
+
+
+def file_hash(path):
+    """
+    The hash of the contents of a file, to find out if it changed.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as ifile:
+        for chunk in iter(lambda: ifile.read(ANSI_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _convert_job(job):
+    """
+    Convert a file of a batch, in a process of the pool.
+    """
+    input_file, output_file = job
+    convert_file(input_file, output_file)
+    return output_file
+
+
+def convert_directory(input_dir, output_dir, jobs=None, force=False):
+    """
+    Convert all the ANSI Art screens of a directory, in parallel.
+
+    Screens not changed since the last conversion (same contents, same
+    parser) are skipped, using a manifest with the hashes of the screens
+    kept in the output directory.
+
+    Args:
+        input_dir: the directory with the ANSI Art screens (.ans, .utf8ans)
+        output_dir: the directory to write the converted screens (.txt)
+        jobs: the number of processes, all the CPUs if None, 1 to convert
+              without a pool
+        force: convert all the screens, changed or not
+
+    Returns:
+        (converted, outputs): the names of the screens converted, and the
+                              converted files of all the screens by name
+
+    Raises:
+        ValueError: two screens would be converted to the same file or
+                    variable, as foo.ans and foo.utf8ans
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, ANSI_MANIFEST)
+    manifest = {}
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as mfile:
+            manifest = json.load(mfile)
+    parser_hash = file_hash(__file__)
+    if manifest.get('parser') != parser_hash:
+        manifest = {'parser': parser_hash, 'screens': {}}
+
+    outputs = {}
+    hashes = {}
+    pending = []
+    variables = {}
+    for filename in sorted(os.listdir(input_dir)):
+        name, extension = os.path.splitext(filename)
+        if extension.lower() not in ANSI_SCREEN_EXTENSIONS:
+            continue
+        variable = screen_variable(name)
+        if variable in variables:
+            raise ValueError("The screens '{}' and '{}' would have the same name, rename one.".format(
+                variables[variable], filename))
+        variables[variable] = filename
+        input_file = os.path.join(input_dir, filename)
+        output_file = os.path.join(output_dir, name + ANSI_OUTPUT_EXTENSION)
+        outputs[name] = output_file
+        hashes[name] = file_hash(input_file)
+        if manifest['screens'].get(name) != hashes[name] or not os.path.exists(output_file):
+            pending.append((name, (input_file, output_file)))
+
+    if pending and (jobs == 1 or len(pending) == 1):
+        for name, job in pending:
+            _convert_job(job)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(_convert_job, [job for name, job in pending]))
+
+    manifest['screens'] = hashes
+    with atomic_write(manifest_path) as mfile:
+        json.dump(manifest, mfile, indent=4, sort_keys=True)
+
+    return [name for name, job in pending], outputs
+
+
+def screen_variable(name):
+    """
+    The name of the variable of a screen in a screens module.
+    """
+    return ANSI_SCREEN_VARIABLE.format(re.sub(r'\W', '_', name))
+
+
+def write_screens_module(path, screens):
+    """
+    Write a screens module, as AU_ANSI_Screens_0000.py, with a variable
+    for each screen.
+
+    Args:
+        path: the module to write
+        screens: list of (name, screen) with the screens converted to
+                 evennia color tags
+    """
+    with atomic_write(path) as ofile:
+        ofile.write('"""\nFile to store the ANSI art Screens, generated by AU_ANSI_Parser.py\n\nList\n')
+        for name, screen in screens:
+            ofile.write('    {}: {}\n'.format(screen_variable(name), name))
+        ofile.write('\n\n"""\n')
+        for name, screen in screens:
+            # keep the screen as is in a triple quoted string
+            screen = screen.replace('\\', '\\\\').replace('"""', '""\\"')
+            if screen.endswith('"'):
+                screen = screen[:-1] + '\\"'
+            ofile.write('\n\n# Screen {}\n{} = """{}"""\n'.format(name, screen_variable(name), screen))
+
+
+def convert_screens(input_dir, output_dir, module=None, jobs=None, force=False):
+    """
+    Convert all the ANSI Art screens of a directory and, optionally, write
+    them all in a screens module.
+
+    Args:
+        input_dir: the directory with the ANSI Art screens
+        output_dir: the directory to write the converted screens, and the
+                    module
+        module: the name of the screens module, 'XXXX' for AU_ANSI_Screens_XXXX.py
+        jobs: the number of processes
+        force: convert all the screens, changed or not
+
+    Returns:
+        converted: the names of the screens converted
+    """
+    converted, outputs = convert_directory(input_dir, output_dir, jobs=jobs, force=force)
+    if module is not None:
+        module_path = os.path.join(output_dir, ANSI_SCREENS_MODULE.format(module))
+        if converted or force or not os.path.exists(module_path):
+            screens = []
+            for name in sorted(outputs):
+                with open(outputs[name], 'r', encoding='utf-8') as ifile:
+                    screens.append((name, ifile.read()))
+            write_screens_module(module_path, screens)
+    return converted
 
 
 def main(argv):
     input_file = ""
     output_file = ""
-    result = ""
+    module = None
+    jobs = None
+    force = False
+    usage = ('parser.py -i <inputfile> -o <outputfile>\n'
+             'parser.py -i <inputdir> -o <outputdir> [-m <module>] [-j <jobs>] [-f]')
 
     try:
-        opts, args = getopt.getopt(argv, "hi:o:", ["ifile=", "ofile="])
-    except getopt.GetopError:
-        print('parser.py -i <inputfile> -o <outputfile>')
+        opts, args = getopt.getopt(argv, "hi:o:m:j:f", ["ifile=", "ofile=", "module=", "jobs=", "force"])
+    except getopt.GetoptError:
+        print(usage)
         sys.exit(2)
 
     for opt, arg in opts:
         if opt == '-h':
-            print("parser.py -i <inputfile> -o <outputfile>")
+            print(usage)
             sys.exit(1)
         elif opt in ("-i", "--ifile"):
             input_file = arg
         elif opt in ("-o", "--ofile"):
             output_file = arg
+        elif opt in ("-m", "--module"):
+            module = arg
+        elif opt in ("-j", "--jobs"):
+            try:
+                jobs = int(arg)
+            except ValueError:
+                jobs = 0
+            if jobs < 1:
+                print(usage)
+                sys.exit(2)
+        elif opt in ("-f", "--force"):
+            force = True
+
+    if not input_file or not output_file:
+        print(usage)
+        sys.exit(2)
 
-    with open(input_file, 'r') as ifile:
-        data = ifile.read()
-        result = au_ansi_parser(data)
-
-    with open(output_file, "w", encoding="utf-8") as ofile:
-        ofile.write(result)
+    if os.path.isdir(input_file):
+        try:
+            converted = convert_screens(input_file, output_file, module=module, jobs=jobs, force=force)
+        except ValueError as err:
+            print(err)
+            sys.exit(2)
+        print('{} screens converted.'.format(len(converted)))
+    else:
+        convert_file(input_file, output_file)
 
 
 if __name__ == "__main__":
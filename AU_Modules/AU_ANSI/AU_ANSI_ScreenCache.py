@@ -0,0 +1,195 @@
+"""
+ANSI - Pre-rendered screens
+
+Evennia converts the color tags of every text it sends, for every
+session. For a large ANSI Art screen shown to every new connection,
+like the connection screen, this is done once per output flavour
+instead and the result is sent as is.
+
+    Ex:
+        screen_cache = AUScreenCache(AU_ANSI_Screens_0000, 'AU_ANSI_Screen_0000')
+        screen_cache.send(session)
+
+The screen is taken from a variable of a screens module. When the file
+of the module changes (for example when the screens are generated again)
+the module is reloaded and the screen rendered again. AURenderedScreen
+only keeps the rendered screens, for callers watching the module
+themselves.
+"""
+
+import os
+import re
+import importlib
+
+from evennia.utils import logger
+from evennia.utils.ansi import parse_ansi
+from evennia.utils.text2html import parse_html
+
+# Output flavours
+FLAVOUR_ANSI = 'ansi'
+FLAVOUR_XTERM256 = 'xterm256'
+FLAVOUR_NOCOLOR = 'nocolor'
+FLAVOUR_HTML = 'html'
+FLAVOUR_HTML_NOCOLOR = 'html_nocolor'
+
+FLAVOURS = (FLAVOUR_ANSI, FLAVOUR_XTERM256, FLAVOUR_NOCOLOR, FLAVOUR_HTML, FLAVOUR_HTML_NOCOLOR)
+
+# A final normal tag, removed before adding one as the telnet protocol does
+RE_FINAL_NORMAL = re.compile(r"\|n$")
+
+
+def session_flavour(session):
+    """
+    Find out how the text sent to a session is rendered, the same way
+    its protocol does.
+
+    Args:
+        session (Session): the session to send to
+
+    Returns:
+        flavour (str or None): one of FLAVOURS, or None if the session
+                               renders in a way not pre-rendered (screen
+                               readers, MXP)
+    """
+    flags = session.protocol_flags
+    if flags.get('SCREENREADER', False) or flags.get('RAW', False):
+        return None
+
+    if session.protocol_key.startswith('webclient'):
+        return FLAVOUR_HTML_NOCOLOR if flags.get('NOCOLOR', False) else FLAVOUR_HTML
+
+    if flags.get('MXP', False):
+        return None
+    ttype = flags.get('TTYPE', False)
+    xterm256 = flags.get('XTERM256', False) if ttype else True
+    useansi = flags.get('ANSI', False) if ttype else True
+    if flags.get('NOCOLOR') or not (xterm256 or useansi):
+        return FLAVOUR_NOCOLOR
+    return FLAVOUR_XTERM256 if xterm256 else FLAVOUR_ANSI
+
+
+def render_screen(screen, flavour):
+    """
+    Render a screen with evennia color tags for an output flavour.
+
+    Args:
+        screen (str): the screen with evennia color tags
+        flavour (str): one of FLAVOURS
+
+    Returns:
+        rendered (str): the screen ready to send
+    """
+    if flavour in (FLAVOUR_HTML, FLAVOUR_HTML_NOCOLOR):
+        return parse_html(screen, strip_ansi=flavour == FLAVOUR_HTML_NOCOLOR)
+
+    # kill the color at the end, as the telnet protocol does
+    screen = RE_FINAL_NORMAL.sub("", screen) + ("||n" if screen.endswith("|") else "|n")
+    return parse_ansi(screen, strip_ansi=flavour == FLAVOUR_NOCOLOR, xterm256=flavour == FLAVOUR_XTERM256)
+
+
+def module_mtime(module):
+    """
+    The time the file of a module was changed, to know when to reload it.
+
+    Args:
+        module (module or None): the module
+
+    Returns:
+        mtime (float or None): the time, None if the module has no file
+    """
+    try:
+        return os.path.getmtime(module.__file__)
+    except (AttributeError, TypeError, OSError):
+        return None
+
+
+class AURenderedScreen(object):
+    """
+    A screen pre-rendered per output flavour, rendered the first time
+    each flavour is needed.
+    """
+
+    def __init__(self, screen):
+        """
+        Args:
+            screen (str): the screen with evennia color tags
+        """
+        self.screen = screen
+        self.rendered = {}
+
+    def get(self, flavour):
+        """
+        Get the screen rendered for an output flavour.
+
+        Args:
+            flavour (str): one of FLAVOURS, or None for the screen with
+                           evennia color tags
+
+        Returns:
+            screen (str): the screen
+        """
+        if flavour is None:
+            return self.screen
+        if flavour not in self.rendered:
+            self.rendered[flavour] = render_screen(self.screen, flavour)
+        return self.rendered[flavour]
+
+    def send(self, session):
+        """
+        Send the screen to a session, pre-rendered when possible.
+
+        Args:
+            session (Session): the session to send to
+        """
+        flavour = session_flavour(session)
+        if flavour is None:
+            session.msg(self.get(None))
+        else:
+            session.msg(self.get(flavour), options={'raw': True, 'client_raw': True})
+
+    pass  # END of CLASS
+
+
+class AUScreenCache(AURenderedScreen):
+    """
+    A screen of a screens module pre-rendered per output flavour, rendered
+    again when the module file changes.
+    """
+
+    def __init__(self, module, variable, strip=True):
+        """
+        Args:
+            module (module): the screens module holding the screen
+            variable (str): the name of the screen in the module
+            strip (bool): strip the screen
+        """
+        self.module = module
+        self.variable = variable
+        self.strip = strip
+        self.mtime = module_mtime(module)
+        super(AUScreenCache, self).__init__(self._load())
+
+    def _load(self):
+        screen = getattr(self.module, self.variable)
+        return screen.strip() if self.strip else screen
+
+    def check(self):
+        """
+        Reload the screen if its module file changed.
+        """
+        mtime = module_mtime(self.module)
+        if mtime == self.mtime:
+            return
+        self.mtime = mtime
+        try:
+            self.module = importlib.reload(self.module)
+            self.screen = self._load()
+        except Exception:
+            logger.log_trace("Could not reload the screen '{}'.".format(self.variable))
+        self.rendered = {}
+
+    def get(self, flavour):
+        self.check()
+        return super(AUScreenCache, self).get(flavour)
+
+    pass  # END of CLASS
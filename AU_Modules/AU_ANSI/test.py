@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Testing suit for the AU ANSI parser
+
+"""
+import os
+import sys
+import importlib
+from io import StringIO
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+
+from evennia.utils.test_resources import EvenniaTest
+from evennia.utils.ansi import parse_ansi
+from evennia.utils.text2html import parse_html
+
+from AU_Modules.AU_ANSI.AU_ANSI_Parser import AUANSIConverter, atomic_write, au_ansi_parser, convert_screens, main
+from AU_Modules.AU_ANSI import AU_ANSI_ScreenCache as screencache
+
+
+class _TestSession(object):
+    """
+    A session of a protocol, remembering what is sent to it.
+    """
+
+    def __init__(self, protocol_key, **protocol_flags):
+        self.protocol_key = protocol_key
+        self.protocol_flags = protocol_flags
+        self.sent = []
+
+    def msg(self, text=None, **kwargs):
+        self.sent.append((text, kwargs))
+
+
+class TestANSIParser(EvenniaTest):
+
+    def test_ansi_converter(self):
+        """
+        Test Class 01
+        Test the conversion of ANSI codes to evennia color tags.
+                * [color codes]
+                * [last foreground hilite]
+                * [TheDraw codes]
+
+        """
+        screen = "\033[?7h\033[255D\033[0;31mRed \033[1mBright\033[0m \033[1;32mGreen\033[0m\033[255D"
+
+        self.assertEqual("|n|RRed |rBright|n |gGreen|n|n", au_ansi_parser(screen), "Testing the conversion.")
+
+    def test_ansi_converter_chunks(self):
+        """
+        Test Class 02
+        Test converting a screen in chunks, as read from a file.
+                * [codes cut between chunks]
+                * [independent converters]
+
+        """
+        path = os.path.join(os.path.dirname(__file__), "AU_conn_screen.utf8ans")
+        with open(path, 'r') as ifile:
+            screen = ifile.read()
+        parsed_screen = au_ansi_parser(screen)
+
+        converter = AUANSIConverter()
+        other = AUANSIConverter()
+        chunks = []
+        for istart in range(0, len(screen), 7):
+            chunks.append(converter.feed(screen[istart:istart + 7]))
+            other.feed("\033[1;33m")
+        chunks.append(converter.close())
+
+        self.assertEqual(parsed_screen, "".join(chunks), "Testing the chunked conversion.")
+
+    def test_screen_cache(self):
+        """
+        Test Class 03
+        Test the connection screens pre-rendered per output flavour.
+                * [flavour of the protocols]
+                * [rendered as the protocols do]
+                * [sent raw]
+                * [reload when the file changes]
+
+        """
+        self.assertEqual(screencache.FLAVOUR_XTERM256, screencache.session_flavour(_TestSession("telnet")),
+                         "Testing telnet without TTYPE.")
+        self.assertEqual(screencache.FLAVOUR_ANSI,
+                         screencache.session_flavour(_TestSession("telnet", TTYPE=True, ANSI=True)),
+                         "Testing telnet with ANSI only.")
+        self.assertEqual(screencache.FLAVOUR_NOCOLOR,
+                         screencache.session_flavour(_TestSession("ssh", NOCOLOR=True)), "Testing no color.")
+        self.assertEqual(screencache.FLAVOUR_HTML, screencache.session_flavour(_TestSession("webclient/websocket")),
+                         "Testing the webclient.")
+        self.assertIsNone(screencache.session_flavour(_TestSession("telnet", SCREENREADER=True)),
+                          "Testing screen readers.")
+
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "au_test_screens.py")
+            with open(path, 'w') as ofile:
+                ofile.write('SCREEN = """\n|rRed |[B|gGreen|n\n"""\n')
+            sys.path.insert(0, tmpdir)
+            self.addCleanup(sys.path.remove, tmpdir)
+            self.addCleanup(sys.modules.pop, "au_test_screens", None)
+            cache = screencache.AUScreenCache(importlib.import_module("au_test_screens"), "SCREEN")
+
+            self.assertEqual(parse_ansi("|rRed |[B|gGreen|n", xterm256=True), cache.get(screencache.FLAVOUR_XTERM256),
+                             "Testing the xterm256 screen.")
+            self.assertEqual(parse_ansi("|rRed |[B|gGreen|n", strip_ansi=True), cache.get(screencache.FLAVOUR_NOCOLOR),
+                             "Testing the no color screen.")
+            self.assertEqual(parse_html("|rRed |[B|gGreen|n"), cache.get(screencache.FLAVOUR_HTML),
+                             "Testing the html screen.")
+
+            session = _TestSession("telnet")
+            cache.send(session)
+            self.assertEqual([(cache.get(screencache.FLAVOUR_XTERM256), {'options': {'raw': True, 'client_raw': True}})],
+                             session.sent, "Testing sending the screen raw.")
+
+            with open(path, 'w') as ofile:
+                ofile.write('SCREEN = "|bBlue"\n')
+            os.utime(path, (cache.mtime + 10, cache.mtime + 10))
+            self.assertEqual(parse_ansi("|bBlue|n", strip_ansi=True), cache.get(screencache.FLAVOUR_NOCOLOR),
+                             "Testing the screen reloaded.")
+
+    def test_batch_conversion(self):
+        """
+        Test Class 04
+        Test converting a directory of screens into a screens module.
+                * [converted screens]
+                * [unchanged screens skipped]
+                * [screens module]
+
+        """
+        with TemporaryDirectory() as tmpdir:
+            input_dir = os.path.join(tmpdir, "ansi")
+            output_dir = os.path.join(tmpdir, "screens")
+            os.mkdir(input_dir)
+            with open(os.path.join(input_dir, "red.ans"), 'w') as ofile:
+                ofile.write("\033[0;31mRed \"\"\"quoted\"\"\"")
+            with open(os.path.join(input_dir, "green.utf8ans"), 'w') as ofile:
+                ofile.write("\033[1;32mGreen")
+
+            self.assertEqual(["green", "red"], convert_screens(input_dir, output_dir, module="9999", jobs=1),
+                             "Testing the screens converted.")
+            with open(os.path.join(output_dir, "red.txt"), 'r', encoding='utf-8') as ifile:
+                self.assertEqual('|n|RRed """quoted"""|n', ifile.read(), "Testing the converted screen.")
+
+            self.assertEqual([], convert_screens(input_dir, output_dir, module="9999", jobs=1),
+                             "Testing the unchanged screens.")
+            with open(os.path.join(input_dir, "green.utf8ans"), 'a') as ofile:
+                ofile.write(" and more")
+            self.assertEqual(["green"], convert_screens(input_dir, output_dir, module="9999", jobs=1),
+                             "Testing a screen changed.")
+
+            sys.path.insert(0, output_dir)
+            self.addCleanup(sys.path.remove, output_dir)
+            self.addCleanup(sys.modules.pop, "AU_ANSI_Screens_9999", None)
+            screens = importlib.import_module("AU_ANSI_Screens_9999")
+            self.assertEqual('|n|RRed """quoted"""|n', screens.AU_ANSI_Screen_red, "Testing the module screen.")
+            self.assertEqual("|gGreen and more|n", screens.AU_ANSI_Screen_green, "Testing the module screen changed.")
+
+    def test_atomic_write(self):
+        """
+        Test Class 05
+        Test writing a file only once written completely.
+                * [file written]
+                * [file kept when the writing fails]
+                * [error kept when the file can not be opened]
+
+        """
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "screen.txt")
+            with atomic_write(path) as ofile:
+                ofile.write("Screen")
+            with self.assertRaises(RuntimeError):
+                with atomic_write(path) as ofile:
+                    ofile.write("Half")
+                    raise RuntimeError("Interrupted.")
+            with open(path, 'r', encoding='utf-8') as ifile:
+                self.assertEqual("Screen", ifile.read(), "Testing the file kept.")
+            self.assertEqual(["screen.txt"], os.listdir(tmpdir), "Testing no temporary file left.")
+
+            with self.assertRaises(FileNotFoundError):
+                with atomic_write(os.path.join(tmpdir, "missing", "screen.txt")) as ofile:
+                    ofile.write("Screen")
+
+    def test_batch_conversion_duplicates(self):
+        """
+        Test Class 06
+        Test screens that would be converted to the same screen.
+                * [same name, other extension]
+                * [same variable]
+
+        """
+        for filenames in (("red.ans", "red.utf8ans"), ("dark-red.ans", "dark_red.ans")):
+            with TemporaryDirectory() as tmpdir:
+                input_dir = os.path.join(tmpdir, "ansi")
+                output_dir = os.path.join(tmpdir, "screens")
+                os.mkdir(input_dir)
+                for filename in filenames:
+                    with open(os.path.join(input_dir, filename), 'w') as ofile:
+                        ofile.write("\033[0;31mRed")
+
+                with self.assertRaises(ValueError, msg="Testing {} rejected.".format(" and ".join(filenames))):
+                    convert_screens(input_dir, output_dir, module="9999", jobs=1)
+                self.assertFalse(os.path.exists(os.path.join(output_dir, "red.txt")), "Testing nothing converted.")
+
+    def test_main_options(self):
+        """
+        Test Class 07
+        Test the command line options checked before converting.
+                * [missing output]
+                * [missing input]
+                * [invalid jobs]
+
+        """
+        with TemporaryDirectory() as tmpdir:
+            for argv in (["-i", tmpdir], ["-o", tmpdir], ["-i", tmpdir, "-o", tmpdir, "-j", "abc"],
+                         ["-i", tmpdir, "-o", tmpdir, "-j", "0"]):
+                output = StringIO()
+                with self.assertRaises(SystemExit, msg="Testing {} rejected.".format(" ".join(argv))) as exit_error:
+                    with redirect_stdout(output):
+                        main(argv)
+                self.assertEqual(2, exit_error.exception.code, "Testing the exit code.")
+                self.assertIn("parser.py -i", output.getvalue(), "Testing the usage shown.")
+
+    pass  # END of CLASS
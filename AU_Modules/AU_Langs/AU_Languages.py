@@ -18,4 +18,5 @@ english_noun_postfix = ""
 english_vowels = "aeiouy"
 english_manual_translations = None
 english_auto_translations = utils.get_game_dir_path() + '/AU_Modules/AU_Langs/AU_Words.txt'
+english_lexicon = 'AU_Modules/AU_Langs/AU_English.lexicon'
 english_force = False
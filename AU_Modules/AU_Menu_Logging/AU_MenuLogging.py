@@ -5,6 +5,7 @@ Original Contribution - Vincent-lg 2016, Griatch 2019 (rework for modern EvMenu)
 Modified by MaCorvalan, 2022
     * Add email input
     * Miscellaneous changes
+    * Hash passwords in a login queue, out of the reactor
 
 This changes the Evennia login to ask for the account name and password in
 sequence instead of requiring you to enter both at once.
@@ -23,16 +24,35 @@ called automatically when a new user connects.
 """
 
 from django.conf import settings
+from django.db import close_old_connections
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import check_password, make_password
 
 import re
+import sys
+import random
+import importlib
+from time import perf_counter
+from threading import Lock
+from twisted.internet import reactor
+from twisted.internet.task import deferLater
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
 from evennia import Command, CmdSet
 from evennia import syscmdkeys
+from evennia.utils import logger
 from evennia.utils.evmenu import EvMenu
-from evennia.utils.utils import random_string_from_module, class_from_module, callables_from_module
+from evennia.utils.utils import class_from_module, mod_import, all_from_module
+from evennia.accounts.accounts import LOGIN_THROTTLE
+
+from AU_Modules.AU_ANSI.AU_ANSI_ScreenCache import AURenderedScreen, module_mtime
 
 # Variables ------------------------------------------------------------------------------------------------------------
 
 _CONNECTION_SCREEN_MODULE = settings.CONNECTION_SCREEN_MODULE
+# The authentication backend of Evennia, checked here with only the hashing in the login queue
+_DEFAULT_BACKENDS = ["evennia.web.utils.backends.CaseInsensitiveModelBackend"]
+_CUSTOM_BACKENDS = list(settings.AUTHENTICATION_BACKENDS) != _DEFAULT_BACKENDS
 _GUEST_ENABLED = settings.GUEST_ENABLED
 _ACCOUNT = class_from_module(settings.BASE_ACCOUNT_TYPECLASS)
 _GUEST = class_from_module(settings.BASE_GUEST_TYPECLASS)
@@ -68,8 +88,353 @@ _ACCOUNT_LOGGING = "Enter a new or existing |yACCOUNT|n name to login:"
 
 _EMAIL_LOGGING = "Enter a valid |yEMAIL|n address (empty to abort):"
 
+_WAIT_LOGGING = "|yChecking the password, please wait...|n"
+
+_BUSY_LOGGING = "|RToo many logins right now, please try again in a moment.|n"
+
+_THROTTLED_LOGGING = "Too many login failures; please try again in a few minutes."
+
+_BANNED_LOGGING = (
+    "|rYou have been banned and cannot continue from here."
+    "\nIf you feel this ban is in error, please email an admin.|x"
+)
+
+_FAILED_LOGGING = "Username and/or password is incorrect."
+
+_ERROR_LOGGING = "An error occurred. Please try again."
+
 _SHOW_CS = True
 
+# Logins checked at the same time (threads), and waiting for a thread
+_LOGIN_THREADS = 4
+_LOGIN_QUEUE_SIZE = 100
+
+# Connection screens, resolved by load_connection_screens
+_CONNECTION_SCREENS = {"module": None, "mtime": None, "send": None, "dynamic": None, "variants": []}
+
+
+# Connection screens
+
+def load_connection_screens():
+    """
+    Resolve the connection screen variants of the connection screen module, so the menu
+    picks one from memory. Called at import, and again by the server at start and reload.
+
+    The module can define, in order of preference:
+        * send_connection_screen(session): sends the screen itself
+        * connection_screen(): returns the screen, for dynamic screens
+        * string variables: the screens, one picked at random, pre-rendered
+    """
+    _resolve_connection_screens(mod_import(_CONNECTION_SCREEN_MODULE))
+
+
+def _resolve_connection_screens(module):
+    members = all_from_module(module) if module else {}
+    send = members.get("send_connection_screen")
+    dynamic = members.get("connection_screen")
+    variants = [AURenderedScreen(value) for key, value in sorted(members.items()) if isinstance(value, str)]
+
+    _CONNECTION_SCREENS["module"] = module
+    _CONNECTION_SCREENS["mtime"] = module_mtime(module)
+    _CONNECTION_SCREENS["send"] = send if callable(send) else None
+    _CONNECTION_SCREENS["dynamic"] = dynamic if callable(dynamic) else None
+    _CONNECTION_SCREENS["variants"] = variants
+
+
+def _check_connection_screens():
+    """
+    Import the connection screen module again, once, if its file changed, and resolve its
+    connection screens again. It is imported anew rather than reloaded, so that screens
+    removed from the file are gone.
+    """
+    module = _CONNECTION_SCREENS["module"]
+    mtime = module_mtime(module)
+    if mtime == _CONNECTION_SCREENS["mtime"]:
+        return
+    name = module.__name__
+    try:
+        sys.modules.pop(name, None)
+        module = importlib.import_module(name)
+    except Exception:
+        sys.modules[name] = module
+        logger.log_trace("Could not reload the connection screens of '{}'.".format(name))
+        _CONNECTION_SCREENS["mtime"] = mtime
+        return
+    _resolve_connection_screens(module)
+
+
+def _connection_screen(session):
+    """
+    Show one of the connection screens to a session.
+
+    Returns:
+        screen (str): the screen to show with the node text, empty if already sent
+    """
+    _check_connection_screens()
+    if _CONNECTION_SCREENS["send"]:
+        _CONNECTION_SCREENS["send"](session)
+    elif _CONNECTION_SCREENS["dynamic"]:
+        return _CONNECTION_SCREENS["dynamic"]()
+    elif _CONNECTION_SCREENS["variants"]:
+        random.choice(_CONNECTION_SCREENS["variants"]).send(session)
+    return ""
+
+
+load_connection_screens()
+
+
+# Login queue
+
+class AULoginQueue(object):
+    """
+    Hash passwords out of the reactor, in a bounded pool of threads.
+
+    Django hashes passwords slowly on purpose, tens of milliseconds per login, which would
+    stop the whole game while a hundred players reconnect after a restart. Only the hashing
+    (or custom authentication backends, as a whole) runs in the pool; the accounts are looked
+    up and created back in the reactor, as the typeclasses are not thread-safe. The logins wait in the queue of the pool, and are
+    rejected when too many are waiting.
+
+    The metrics of the queue (depth, hash latency) are given by `metrics()`, shown by the
+    `loginqueue` command and logged when the server stops.
+    """
+
+    def __init__(self, threads=_LOGIN_THREADS, queue_size=_LOGIN_QUEUE_SIZE):
+        """
+        Args:
+            threads (int): the passwords hashed at the same time
+            queue_size (int): the logins waiting for a thread before rejecting more
+        """
+        self.threads = threads
+        self.queue_size = queue_size
+        self.pool = None
+        self.lock = Lock()
+        self.waiting = 0
+        self.active = 0
+        self.max_depth = 0
+        self.logins = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.hash_latency = 0.0
+        self.max_hash_latency = 0.0
+
+    def _start(self):
+        if self.pool is None:
+            self.pool = ThreadPool(minthreads=0, maxthreads=self.threads, name="AULoginQueue")
+            self.pool.start()
+            reactor.addSystemEventTrigger("before", "shutdown", self.pool.stop)
+
+    def depth(self):
+        """
+        The logins waiting or being hashed.
+        """
+        return self.waiting + self.active
+
+    def run(self, func, *args, **kwargs):
+        """
+        Queue a hashing function, as `check_password` or `make_password`. It should not use
+        the typeclasses; the database connection of the thread is closed afterwards.
+
+        Returns:
+            deferred (Deferred or None): fires with the result of the function,
+                                         None if the queue is full
+        """
+        with self.lock:
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return None
+            self.waiting += 1
+            self.max_depth = max(self.max_depth, self.depth())
+        self._start()
+        return deferToThreadPool(reactor, self.pool, self._call, perf_counter(), func, args, kwargs)
+
+    def _call(self, queued, func, args, kwargs):
+        started = perf_counter()
+        with self.lock:
+            self.waiting -= 1
+            self.active += 1
+            self.wait_time += started - queued
+        try:
+            return func(*args, **kwargs)
+        finally:
+            hash_latency = perf_counter() - started
+            with self.lock:
+                self.active -= 1
+                self.logins += 1
+                self.hash_latency += hash_latency
+                self.max_hash_latency = max(self.max_hash_latency, hash_latency)
+            # never keep a database connection open in a pool thread
+            close_old_connections()
+
+    def metrics(self):
+        """
+        The metrics of the queue, times in seconds.
+        """
+        with self.lock:
+            logins = self.logins or 1
+            started = self.logins + self.active or 1
+            return {
+                "depth": self.depth(),
+                "waiting": self.waiting,
+                "active": self.active,
+                "max_depth": self.max_depth,
+                "logins": self.logins,
+                "rejected": self.rejected,
+                "avg_wait_time": self.wait_time / started,
+                "avg_hash_latency": self.hash_latency / logins,
+                "max_hash_latency": self.max_hash_latency,
+            }
+
+    def format_metrics(self):
+        """
+        The metrics of the queue, in one line.
+        """
+        return (
+            "Login queue: depth {depth} (max {max_depth}), {logins} logins, {rejected} rejected, "
+            "wait {avg_wait_time:.3f} s, hash {avg_hash_latency:.3f} s (max {max_hash_latency:.3f} s)"
+        ).format(**self.metrics())
+
+    def log_metrics(self):
+        """
+        Log the metrics of the queue.
+        """
+        logger.log_info(self.format_metrics())
+
+    pass  # END of CLASS
+
+
+LOGIN_QUEUE = AULoginQueue()
+
+
+class AUHashedPassword(str):
+    """
+    A password already hashed in the login queue. The account typeclass stores the hash
+    given in `encoded` instead of hashing the password again in the reactor.
+    """
+
+    def __new__(cls, password, encoded):
+        hashed_password = super(AUHashedPassword, cls).__new__(cls, password)
+        hashed_password.encoded = encoded
+        return hashed_password
+
+
+def _upgrade_password(account, password):
+    """
+    Store a password hashed again in the login queue with the current hasher, as the setter
+    of Django's `check_password` does.
+    """
+    account.set_password(password)
+    account._password = None
+    account.save(update_fields=["password"])
+
+
+def _password_setter(account):
+    """
+    The setter given to `check_password`, called in the login queue when the password was
+    hashed with an old hasher. The account is saved back in the reactor.
+    """
+    def _setter(password):
+        reactor.callFromThread(_upgrade_password, account, AUHashedPassword(password, make_password(password)))
+    return _setter
+
+
+def _check_password(account, accountname, password):
+    """
+    Queue the password check of an account with Evennia's authentication backend. A missing
+    account hashes the password all the same, as Django's ModelBackend does, so the time
+    taken does not tell which accounts exist.
+
+    Returns:
+        deferred (Deferred or None): fires with the account authenticated or None, None if
+                                     the queue is full
+    """
+    if _CUSTOM_BACKENDS:
+        return LOGIN_QUEUE.run(authenticate, username=accountname, password=password)
+    if account is None:
+        deferred = LOGIN_QUEUE.run(make_password, password)
+        return deferred and deferred.addCallback(lambda encoded: None)
+    deferred = LOGIN_QUEUE.run(check_password, password, account.password, _password_setter(account))
+    return deferred and deferred.addCallback(lambda valid: account if valid else None)
+
+
+def _authenticate(session, accountname, password):
+    """
+    Check the password of an account as `_ACCOUNT.authenticate` does, with only the
+    hashing in the login queue. Custom AUTHENTICATION_BACKENDS run in the login queue
+    as a whole.
+
+    Returns:
+        deferred (Deferred or None): fires with (account, errors), None if the queue is full
+    """
+    ip = str(session.address or "")
+    # the menu goes on once the node returns, in the next turn of the reactor
+    if ip and LOGIN_THROTTLE.check(ip):
+        return deferLater(reactor, 0, lambda: (None, [_THROTTLED_LOGGING]))
+    if _ACCOUNT.is_banned(username=accountname, ip=ip):
+        logger.log_sec("Authentication Denied (Banned): {} (IP: {}).".format(accountname, ip))
+        LOGIN_THROTTLE.update(ip, "Too many sightings of banned artifact.")
+        return deferLater(reactor, 0, lambda: (None, [_BANNED_LOGGING]))
+    account = _ACCOUNT.objects.filter(username__iexact=accountname).first()
+
+    deferred = _check_password(account, accountname, password)
+    if deferred is None:
+        return None
+
+    def _password_checked(authenticated):
+        if authenticated and authenticated.is_active:
+            logger.log_sec("Authentication Success: {} (IP: {}).".format(authenticated, ip))
+            return authenticated, []
+        logger.log_sec("Authentication Failure: {} (IP: {}).".format(accountname, ip))
+        if ip:
+            LOGIN_THROTTLE.update(ip, "Too many authentication failures.")
+        if account:
+            account.at_failed_login(session)
+        return None, [_FAILED_LOGGING]
+
+    return deferred.addCallback(_password_checked)
+
+
+def _create_account(session, accountname, email, password):
+    """
+    Create an account with `_ACCOUNT.create`, with the password hashed beforehand in the
+    login queue.
+
+    Returns:
+        deferred (Deferred or None): fires with (account, errors), None if the queue is full
+    """
+    deferred = LOGIN_QUEUE.run(make_password, password)
+    if deferred is None:
+        return None
+    return deferred.addCallback(lambda encoded: _ACCOUNT.create(
+        username=accountname, email=email, password=AUHashedPassword(password, encoded),
+        ip=session.address, session=session))
+
+
+def _resume_login(result, session, menu, new_account, kwargs):
+    """
+    Continue the menu of a session when its password was checked, if still there.
+    """
+    account, errors = result
+    if session.sessid not in session.sessionhandler or session.ndb._menutree is not menu:
+        return
+    if account:
+        if new_account:
+            session.msg("|gA new account |g{}|g was created. Welcome!|n".format(kwargs["accountname"]))
+        # pass login info to login node
+        menu.goto("node_quit_or_login", "", login=True, account=account)
+    else:
+        # restart due to errors
+        session.msg("|R{}".format("\n".join(errors)))
+        menu.goto("node_enter_password", "", **dict(kwargs, retry_password=True))
+
+
+def _login_error(failure, accountname):
+    """
+    Report an error checking a password, as a failed login.
+    """
+    logger.log_err("Login of '{}' failed: {}".format(accountname, failure.getTraceback()))
+    return None, [_ERROR_LOGGING]
+
 
 # Menu nodes
 
@@ -143,15 +508,14 @@ def node_enter_accountname(caller, raw_text, **kwargs):
         caller.msg("|yCancelled login.|n")
         return "node_enter_accountname"
 
-    callables = callables_from_module(_CONNECTION_SCREEN_MODULE)
-    if "connection_screen" in callables:
-        connection_screen = callables["connection_screen"]()
-    else:
-        connection_screen = random_string_from_module(_CONNECTION_SCREEN_MODULE)
-
     global _SHOW_CS
     if _SHOW_CS:
-        m_text = "{}\n\n{}".format(connection_screen, _ACCOUNT_LOGGING)
+        connection_screen = _connection_screen(caller)
+        if connection_screen:
+            m_text = "{}\n\n{}".format(connection_screen, _ACCOUNT_LOGGING)
+        else:
+            # the screen went pre-rendered on its own, the line break after it is sent with it
+            m_text = "\n{}".format(_ACCOUNT_LOGGING)
         _SHOW_CS = False
     else:
         m_text = "\n\n{}".format(_ACCOUNT_LOGGING)
@@ -240,29 +604,23 @@ def node_enter_password(caller, raw_string, **kwargs):
         _SHOW_CS = True
 
         session = caller
-        address = session.address
         if new_account:
             # create a new account
-            account, errors = _ACCOUNT.create(
-                username=accountname, email=email, password=password, ip=address, session=session
-            )
+            deferred = _create_account(session, accountname, email, password)
         else:
             # check password against existing account
-            account, errors = _ACCOUNT.authenticate(
-                username=accountname, password=password, ip=address, session=session
-            )
+            deferred = _authenticate(session, accountname, password)
 
-        if account:
-            if new_account:
-                session.msg("|gA new account |g{}|g was created. Welcome!|n".format(accountname))
-            # pass login info to login node
-            return "node_quit_or_login", {"login": True, "account": account}
-        else:
-            # restart due to errors
-            session.msg("|R{}".format("\n".join(errors)))
+        if deferred is None:
+            session.msg(_BUSY_LOGGING)
             kwargs["retry_password"] = True
             return "node_enter_password", kwargs
 
+        deferred.addErrback(_login_error, accountname)
+        deferred.addCallback(_resume_login, session, session.ndb._menutree, new_account, kwargs)
+        deferred.addErrback(lambda failure: logger.log_err(failure.getTraceback()))
+        return "node_wait_login", kwargs
+
     def _restart_login(caller, *args, **kwargs):
         global _SHOW_CS
         _SHOW_CS = True
@@ -289,6 +647,14 @@ def node_enter_password(caller, raw_string, **kwargs):
     return text, options
 
 
+def node_wait_login(caller, raw_string, **kwargs):
+    """
+    Wait for the password to be checked, the menu continues when it is.
+    """
+    options = ({"key": "_default", "goto": "node_wait_login"},)
+    return _WAIT_LOGGING, options
+
+
 def node_quit_or_login(caller, raw_text, **kwargs):
     """
     Exit menu, either by disconnecting or logging in.
@@ -358,3 +724,24 @@ class CmdUnloggedinLook(Command):
             cmd_on_exit=None,
             node_formatter=_node_formatter,
         )
+
+
+class CmdLoginQueue(Command):
+    """
+    Show the metrics of the login queue
+
+    Usage:
+      loginqueue
+
+    Shows how many logins are waiting for their password to be hashed,
+    and how long hashing takes.
+    """
+    key = "loginqueue"
+    locks = "cmd:perm(Developer)"
+    help_category = "System"
+
+    def func(self):
+        """
+        Show the metrics.
+        """
+        self.caller.msg(LOGIN_QUEUE.format_metrics())
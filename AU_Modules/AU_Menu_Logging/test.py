@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Testing suit for the AU login menu
+
+"""
+import os
+import sys
+import importlib
+from threading import Thread
+from time import perf_counter
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.hashers import make_password
+from django.test import override_settings
+from twisted.internet.defer import Deferred, succeed
+from twisted.python.threadpool import ThreadPool
+
+from evennia.utils.test_resources import EvenniaTest
+
+from AU_Modules.AU_Menu_Logging import AU_MenuLogging
+
+
+class _TestMenu(object):
+    """
+    A menu, remembering the nodes it goes to.
+    """
+
+    def __init__(self):
+        self.nodes = []
+
+    def goto(self, nodename, raw_string, **kwargs):
+        self.nodes.append((nodename, kwargs))
+
+
+class _TestLoginQueue(object):
+    """
+    A login queue running the functions at once, remembering them.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, func, *args, **kwargs):
+        self.calls.append(func.__name__)
+        return succeed(func(*args, **kwargs))
+
+
+class _TestReactor(object):
+    """
+    A reactor calling what the threads give it at once.
+    """
+
+    def callFromThread(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+
+class _TestNAttributes(object):
+    pass
+
+
+class _TestSession(object):
+    """
+    A session in the login menu, remembering what is sent to it.
+    """
+
+    def __init__(self, menu):
+        self.sessid = 1
+        self.sessionhandler = {self.sessid: self}
+        self.ndb = _TestNAttributes()
+        self.ndb._menutree = menu
+        self.address = None
+        self.protocol_key = "telnet"
+        self.protocol_flags = {"NOCOLOR": True}
+        self.sent = []
+
+    def msg(self, text=None, **kwargs):
+        self.sent.append(text)
+
+
+class TestMenuLogging(EvenniaTest):
+
+    def test_login_queue(self):
+        """
+        Test Class 01
+        Test the bounded login queue and its metrics.
+                * [logins queued]
+                * [logins rejected when full]
+                * [queue depth]
+                * [latency metrics]
+
+        """
+        queue = AU_MenuLogging.AULoginQueue(threads=1, queue_size=2)
+        # a pool not started keeps the logins waiting
+        queue.pool = ThreadPool(minthreads=0, maxthreads=1)
+
+        self.assertIsInstance(queue.run(sum, [1, 2]), Deferred, "Testing a login queued.")
+        self.assertIsInstance(queue.run(sum, [3, 4]), Deferred, "Testing a second login queued.")
+        self.assertIsNone(queue.run(sum, [5, 6]), "Testing a login rejected.")
+        self.assertEqual(2, queue.depth(), "Testing the queue depth.")
+
+        thread = Thread(target=queue._call, args=(perf_counter(), sum, ([1, 2],), {}))
+        thread.start()
+        thread.join()
+
+        metrics = queue.metrics()
+        self.assertEqual(1, metrics["depth"], "Testing the depth after a login.")
+        self.assertEqual(2, metrics["max_depth"], "Testing the max depth.")
+        self.assertEqual(1, metrics["logins"], "Testing the logins.")
+        self.assertEqual(1, metrics["rejected"], "Testing the logins rejected.")
+        self.assertEqual(metrics["max_hash_latency"], metrics["avg_hash_latency"], "Testing the hash latency.")
+        self.assertGreaterEqual(metrics["avg_wait_time"], 0.0, "Testing the wait time.")
+        self.assertIn("depth 1 (max 2)", queue.format_metrics(), "Testing the metrics line.")
+
+    def test_resume_login(self):
+        """
+        Test Class 02
+        Test the menu going on when the password was checked.
+                * [login]
+                * [wrong password]
+                * [error checking]
+                * [session gone]
+                * [menu gone]
+
+        """
+        kwargs = {"accountname": "tester", "new_account": False, "email": ""}
+
+        menu = _TestMenu()
+        session = _TestSession(menu)
+        deferred = Deferred()
+        deferred.addErrback(AU_MenuLogging._login_error, "tester")
+        deferred.addCallback(AU_MenuLogging._resume_login, session, menu, False, kwargs)
+        deferred.callback((self.account, []))
+        self.assertEqual([("node_quit_or_login", {"login": True, "account": self.account})], menu.nodes,
+                         "Testing the login.")
+
+        menu = _TestMenu()
+        session = _TestSession(menu)
+        AU_MenuLogging._resume_login((None, ["Wrong."]), session, menu, False, kwargs)
+        self.assertEqual([("node_enter_password", dict(kwargs, retry_password=True))], menu.nodes,
+                         "Testing the wrong password.")
+        self.assertEqual(["|RWrong."], session.sent, "Testing the errors sent.")
+
+        menu = _TestMenu()
+        session = _TestSession(menu)
+        deferred = Deferred()
+        deferred.addErrback(AU_MenuLogging._login_error, "tester")
+        deferred.addCallback(AU_MenuLogging._resume_login, session, menu, False, kwargs)
+        deferred.errback(RuntimeError("Hashing failed."))
+        self.assertEqual("node_enter_password", menu.nodes[0][0], "Testing the error checking.")
+
+        menu = _TestMenu()
+        session = _TestSession(menu)
+        session.sessionhandler = {}
+        AU_MenuLogging._resume_login((self.account, []), session, menu, False, kwargs)
+        self.assertEqual([], menu.nodes, "Testing the session gone.")
+
+        menu = _TestMenu()
+        session = _TestSession(_TestMenu())
+        AU_MenuLogging._resume_login((self.account, []), session, menu, False, kwargs)
+        self.assertEqual([], menu.nodes, "Testing the menu gone.")
+
+    def _screens_module(self, name, source):
+        """
+        Write a connection screen module and use it for the login menu.
+        """
+        path = os.path.join(self.screens_dir, name + ".py")
+        with open(path, "w") as ofile:
+            ofile.write(source)
+        importlib.invalidate_caches()
+        self.addCleanup(sys.modules.pop, name, None)
+        AU_MenuLogging._CONNECTION_SCREEN_MODULE = name
+        AU_MenuLogging.load_connection_screens()
+        return path
+
+    def test_connection_screens(self):
+        """
+        Test Class 03
+        Test the connection screens resolved from the connection screen module.
+                * [send_connection_screen]
+                * [connection_screen()]
+                * [string variants]
+                * [module reloaded once when it changes]
+                * [screens added and removed]
+                * [module resolved again at reload]
+
+        """
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.screens_dir = tmpdir.name
+        sys.path.insert(0, self.screens_dir)
+        self.addCleanup(sys.path.remove, self.screens_dir)
+        self.addCleanup(AU_MenuLogging.load_connection_screens)
+        self.addCleanup(setattr, AU_MenuLogging, "_CONNECTION_SCREEN_MODULE",
+                        AU_MenuLogging._CONNECTION_SCREEN_MODULE)
+
+        self._screens_module("au_test_screens_send",
+                             'SCREEN = "Variant"\n\n'
+                             'def connection_screen():\n    return "Dynamic"\n\n'
+                             'def send_connection_screen(session):\n    session.msg("Sent")\n')
+        session = _TestSession(_TestMenu())
+        self.assertEqual("", AU_MenuLogging._connection_screen(session), "Testing nothing to show.")
+        self.assertEqual(["Sent"], session.sent, "Testing send_connection_screen.")
+
+        self._screens_module("au_test_screens_dynamic",
+                             'SCREEN = "Variant"\n\n'
+                             'def connection_screen():\n    return "Dynamic"\n')
+        session = _TestSession(_TestMenu())
+        self.assertEqual("Dynamic", AU_MenuLogging._connection_screen(session), "Testing connection_screen().")
+        self.assertEqual([], session.sent, "Testing nothing sent.")
+
+        with open(os.path.join(self.screens_dir, "au_test_screens_loads.py"), "w") as ofile:
+            ofile.write("LOADS = []\n")
+        self.addCleanup(sys.modules.pop, "au_test_screens_loads", None)
+        loads = "import au_test_screens_loads\nau_test_screens_loads.LOADS.append(1)\n"
+        path = self._screens_module("au_test_screens_variants", loads + 'SCREEN_A = "Welcome"\nSCREEN_B = "Hello"\n')
+        session = _TestSession(_TestMenu())
+        self.assertEqual("", AU_MenuLogging._connection_screen(session), "Testing nothing to show.")
+        self.assertIn(session.sent[0], ("Welcome", "Hello"), "Testing a string variant.")
+        self.assertEqual(2, len(AU_MenuLogging._CONNECTION_SCREENS["variants"]), "Testing the variants.")
+
+        def change_module(source):
+            with open(path, "w") as ofile:
+                ofile.write(source)
+            mtime = os.path.getmtime(path) + 10
+            os.utime(path, (mtime, mtime))
+
+        change_module(loads + 'SCREEN_A = "Welcome again"\nSCREEN_B = "Hello again"\nSCREEN_C = "Hi again"\n')
+        session = _TestSession(_TestMenu())
+        AU_MenuLogging._connection_screen(session)
+        self.assertIn(session.sent[0], ("Welcome again", "Hello again", "Hi again"), "Testing the variants reloaded.")
+        self.assertEqual(3, len(AU_MenuLogging._CONNECTION_SCREENS["variants"]), "Testing a screen added.")
+        self.assertEqual(2, len(sys.modules["au_test_screens_loads"].LOADS), "Testing the module reloaded once.")
+
+        change_module(loads + 'def send_connection_screen(session):\n    session.msg("Sent again")\n')
+        session = _TestSession(_TestMenu())
+        AU_MenuLogging._connection_screen(session)
+        self.assertEqual(["Sent again"], session.sent, "Testing send_connection_screen added.")
+        self.assertEqual([], AU_MenuLogging._CONNECTION_SCREENS["variants"], "Testing the screens removed.")
+
+        AU_MenuLogging._CONNECTION_SCREEN_MODULE = "au_test_screens_send"
+        AU_MenuLogging.load_connection_screens()
+        session = _TestSession(_TestMenu())
+        AU_MenuLogging._connection_screen(session)
+        self.assertEqual(["Sent"], session.sent, "Testing the module resolved again.")
+
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher",
+                                         "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"])
+    def test_authenticate(self):
+        """
+        Test Class 04
+        Test checking the password of an account in the login queue.
+                * [login]
+                * [wrong password]
+                * [missing account hashed all the same]
+                * [password of an old hasher upgraded]
+
+        """
+        queue = _TestLoginQueue()
+        self.addCleanup(setattr, AU_MenuLogging, "LOGIN_QUEUE", AU_MenuLogging.LOGIN_QUEUE)
+        self.addCleanup(setattr, AU_MenuLogging, "reactor", AU_MenuLogging.reactor)
+        self.addCleanup(setattr, AU_MenuLogging, "_CUSTOM_BACKENDS", AU_MenuLogging._CUSTOM_BACKENDS)
+        AU_MenuLogging.LOGIN_QUEUE = queue
+        AU_MenuLogging.reactor = _TestReactor()
+        AU_MenuLogging._CUSTOM_BACKENDS = False
+        session = _TestSession(_TestMenu())
+        self.account.set_password("testpassword")
+        self.account.save()
+
+        def authenticate(accountname, password):
+            results = []
+            AU_MenuLogging._authenticate(session, accountname, password).addCallback(results.append)
+            return results[0]
+
+        self.assertEqual((self.account, []), authenticate(self.account.key, "testpassword"), "Testing the login.")
+        self.assertEqual((None, [AU_MenuLogging._FAILED_LOGGING]), authenticate(self.account.key, "wrong"),
+                         "Testing the wrong password.")
+        self.assertEqual(["check_password", "check_password"], queue.calls, "Testing the passwords checked.")
+
+        queue.calls = []
+        self.assertEqual((None, [AU_MenuLogging._FAILED_LOGGING]), authenticate("nobody", "testpassword"),
+                         "Testing the missing account.")
+        self.assertEqual(["make_password"], queue.calls, "Testing the missing account hashed.")
+
+        self.account.password = make_password("testpassword", hasher="pbkdf2_sha1")
+        self.account.save()
+        self.assertEqual((self.account, []), authenticate(self.account.key, "testpassword"),
+                         "Testing the login with an old hasher.")
+        self.account.refresh_from_db()
+        self.assertTrue(self.account.password.startswith("pbkdf2_sha256$"), "Testing the password upgraded.")
+
+    pass  # END of CLASS
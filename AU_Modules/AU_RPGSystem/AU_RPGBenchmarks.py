@@ -0,0 +1,613 @@
+"""
+Benchmarks for the RP system
+
+Created by MaCorvalan, 2022
+
+Micro-benchmarks for the hot paths of AU_RPGCommunications and
+AU_RPGLanguages. They need the Evennia environment loaded, so run them
+from the game dir with `evennia shell`:
+
+    ```python
+    from AU_Modules.AU_RPGSystem import AU_RPGBenchmarks
+
+    AU_RPGBenchmarks.bench_ordered_permutation_regex()
+    ```
+
+Every benchmark prints a table and returns its rows as a list of dicts.
+
+The end-to-end benchmarks (`bench_communications`) create rooms,
+characters and props. Run them on a throw-away database with the
+Evennia test runner, which also writes the results as JSON to
+`server/logs/rp_bench*.json` for comparing runs with
+`compare_bench_results`:
+
+    evennia test --settings settings.py AU_Modules.AU_RPGSystem.AU_RPGBenchmarks
+
+"""
+import os
+import re
+import sys
+import json
+import itertools
+import tracemalloc
+from re import escape as re_escape
+from time import perf_counter, strftime
+
+from django.conf import settings
+from evennia import create_object, create_script
+from evennia.utils.test_resources import EvenniaTest
+
+from AU_Modules.AU_RPGSystem import AU_RPGCommunications as rpsystem
+from AU_Modules.AU_RPGSystem import AU_RPGLanguages as rplanguage
+
+
+_BENCH_WORDS = "the very tall and rather thin man with a long grey coat and hat".split()
+
+_BENCH_ADJECTIVES = "tall short old young thin stout pale tanned grim cheerful".split()
+_BENCH_NOUNS = "man woman dwarf elf sailor priest merchant guard thief scholar".split()
+_BENCH_PROPS = "chair table barrel lamp crate bench rug painting mug candle".split()
+
+# Where BenchRPSystem writes the results of the benchmarks, in the
+# server log dir.
+_BENCH_RESULTS = "rp_bench.json"
+_BENCH_RECOG_RESULTS = "rp_bench_recog.json"
+_BENCH_SDESC_RESULTS = "rp_bench_sdesc.json"
+_BENCH_TRANSLATE_RESULTS = "rp_bench_translate.json"
+
+_LEGACY_RE_EXTRA_CHARS = re.compile(
+    r"\s+(?=\W)|[,.?;](?=[,.?;]|\s+[,.?;])", rplanguage._RE_FLAGS
+)
+
+
+def _legacy_ordered_permutation_regex(sentence):
+    """
+    The original 2^n `ordered_permutation_regex`, kept for comparison.
+
+    """
+    words = sentence.split()
+    combinations = itertools.product((True, False), repeat=len(words))
+    solution = []
+    for combination in combinations:
+        comb = []
+        for iword, word in enumerate(words):
+            if combination[iword]:
+                comb.append(word)
+            elif comb:
+                break
+        if comb:
+            solution.append(
+                rpsystem._PREFIX
+                + r"[0-9]*%s*%s(?=\W|$)+"
+                % (rpsystem._NUM_SEP, re_escape(" ".join(comb)).rstrip("\\"))
+            )
+    return r"|".join(sorted(set(solution), key=lambda item: (-len(item), item)))
+
+
+def _timed(func, number, purge=True):
+    """
+    Average time of `number` calls to func, in microseconds. Unless
+    `purge` is unset, the re module cache is purged before every call so
+    compile times are real.
+
+    """
+    total = 0.0
+    for _ in range(number):
+        if purge:
+            re.purge()
+        start = perf_counter()
+        func()
+        total += perf_counter() - start
+    return total / number * 1e6
+
+
+def bench_ordered_permutation_regex(max_words=12, number=20):
+    """
+    Compare building, compiling and matching ordered permutation regexes
+    with the legacy and the current algorithm, by word count.
+
+    Args:
+        max_words (int, optional): Longest sentence to try.
+        number (int, optional): Repetitions per measurement.
+
+    Returns:
+        rows (list): One dict per word count, times in microseconds.
+
+    """
+    build = rpsystem._ordered_permutation_pattern.__wrapped__
+    rows = []
+    for nwords in range(1, max_words + 1):
+        sentence = " ".join(_BENCH_WORDS[:nwords])
+        marker = "%s%s looks around." % (rpsystem._PREFIX, " ".join(_BENCH_WORDS[nwords // 2 : nwords]))
+        legacy = re.compile(_legacy_ordered_permutation_regex(sentence), rpsystem._RE_FLAGS)
+        current = rpsystem.compile_ordered_permutation_regex(sentence)
+        rows.append(
+            {
+                "words": nwords,
+                "alternatives": sum(1 for _ in rpsystem.ordered_word_runs(sentence.split())),
+                "legacy_build": _timed(lambda: _legacy_ordered_permutation_regex(sentence), number),
+                "build": _timed(lambda: build(sentence), number),
+                "compile": _timed(lambda: re.compile(build(sentence), rpsystem._RE_FLAGS), number),
+                "cached": _timed(lambda: rpsystem.compile_ordered_permutation_regex(sentence), number),
+                "legacy_match": _timed(lambda: legacy.match(marker), number),
+                "match": _timed(lambda: current.match(marker), number),
+            }
+        )
+
+    header = ("words", "alternatives", "legacy_build", "build", "compile", "cached",
+              "legacy_match", "match")
+    print(" ".join("%13s" % col for col in header))
+    for row in rows:
+        print(" ".join("%13s" % (row[col] if isinstance(row[col], int) else "%.1f" % row[col])
+                       for col in header))
+    return rows
+
+
+def bench_results_path(name):
+    """
+    Find where BenchRPSystem writes a result file.
+
+    Args:
+        name (str): The file name, one of the `_BENCH_*RESULTS`.
+
+    Returns:
+        path (str): The file in the server log dir.
+
+    """
+    return os.path.join(settings.LOG_DIR, name)
+
+
+def _write_results(output, number, rows):
+    """
+    Write benchmark rows as JSON, with the run's metadata.
+
+    """
+    with open(output, "w") as fil:
+        json.dump(
+            {
+                "date": strftime("%Y-%m-%d %H:%M:%S"),
+                "python": sys.version.split()[0],
+                "number": number,
+                "rows": rows,
+            },
+            fil,
+            indent=2,
+        )
+
+
+def build_bench_room(ncharacters, nrecogs=5, nprops=10):
+    """
+    Create a room with characters and props for the end-to-end
+    benchmarks. Every character has a distinct sdesc and recognizes
+    the `nrecogs` characters following it.
+
+    Args:
+        ncharacters (int): Number of `AURPGRPCharacter`s.
+        nrecogs (int, optional): Recogs per character.
+        nprops (int, optional): Number of `AURPGRPObject` props.
+
+    Returns:
+        room, characters, props (tuple): The room and the lists of the
+            objects created in it.
+
+    """
+    room = create_object(rpsystem.AURPGRPRoom, key="Benchmark hall")
+    characters = []
+    for ichar in range(ncharacters):
+        char = create_object(rpsystem.AURPGRPCharacter, key="Bencher%i" % ichar, location=room)
+        char.sdesc.add(
+            "a %s %s %i"
+            % (
+                _BENCH_ADJECTIVES[ichar % len(_BENCH_ADJECTIVES)],
+                _BENCH_NOUNS[ichar // len(_BENCH_ADJECTIVES) % len(_BENCH_NOUNS)],
+                ichar,
+            )
+        )
+        characters.append(char)
+    for ichar, char in enumerate(characters):
+        for irecog in range(1, min(nrecogs, ncharacters - 1) + 1):
+            other = characters[(ichar + irecog) % ncharacters]
+            char.recog.add(other, "Friend%i" % other.id)
+    props = [
+        create_object(
+            rpsystem.AURPGRPObject,
+            key="%s %i" % (_BENCH_PROPS[iprop % len(_BENCH_PROPS)], iprop),
+            location=room,
+        )
+        for iprop in range(nprops)
+    ]
+    return room, characters, props
+
+
+def _bench_emote(characters, props, nsays):
+    """
+    An emote referencing the sender, another character and a prop, with
+    `nsays` says.
+
+    """
+    target = characters[-1].sdesc.get()
+    prop = props[0].key if props else "floor"
+    says = " ".join('"Say number %i to /%s."' % (isay, target) for isay in range(nsays))
+    return "/me looks at /%s and points at the /%s. %s" % (target, prop, says)
+
+
+def _run_command(cmdclass, caller, args):
+    """
+    Run a command as the command handler would, without sessions.
+
+    """
+    cmd = cmdclass()
+    cmd.caller = caller
+    cmd.cmdstring = cmd.key
+    cmd.args = args
+    cmd.parse()
+    cmd.func()
+
+
+def bench_communications(
+    ncharacters=(10, 50, 100), nrecogs=5, nprops=10, nsays=1, number=20, output=None
+):
+    """
+    Time the RP communication layer end-to-end in rooms of growing size:
+    `send_emote`, `CmdSay`, `CmdEmote`, `CmdPose` and
+    `AURPGRPObject.search`. The objects are deleted afterwards.
+
+    Args:
+        ncharacters (iterable, optional): Room sizes to try.
+        nrecogs (int, optional): Recogs per character.
+        nprops (int, optional): Props per room.
+        nsays (int, optional): Says per emote.
+        number (int, optional): Repetitions per measurement.
+        output (str, optional): Write the results as JSON to this file.
+
+    Returns:
+        rows (list): One dict per room size and operation, with the
+            average time in microseconds as "usec".
+
+    """
+    rows = []
+    for nchars in ncharacters:
+        room, characters, props = build_bench_room(nchars, nrecogs, nprops)
+        sender = characters[0]
+        emote = _bench_emote(characters, props, nsays)
+        target = characters[-1].sdesc.get()
+        operations = (
+            ("send_emote", lambda: rpsystem.send_emote(sender, room.contents, emote)),
+            ("CmdSay", lambda: _run_command(rpsystem.CmdSay, sender, emote)),
+            ("CmdEmote", lambda: _run_command(rpsystem.CmdEmote, sender, emote)),
+            ("CmdPose", lambda: _run_command(rpsystem.CmdPose, sender, "leans towards /%s" % target)),
+            ("search", lambda: sender.search(target, quiet=True)),
+        )
+        for operation, func in operations:
+            rows.append(
+                {
+                    "characters": nchars,
+                    "recogs": nrecogs,
+                    "props": nprops,
+                    "says": nsays,
+                    "operation": operation,
+                    "usec": _timed(func, number, purge=False),
+                }
+            )
+        for obj in characters + props + [room]:
+            obj.delete()
+
+    header = ("characters", "operation", "usec")
+    print(" ".join("%13s" % col for col in header))
+    for row in rows:
+        print("%13i %13s %13.1f" % tuple(row[col] for col in header))
+    if output:
+        _write_results(output, number, rows)
+    return rows
+
+
+def _legacy_recog_load(obj):
+    """
+    What loading the original RecogHandler did with its three
+    Attribute dictionaries, kept for comparison.
+
+    """
+    ref2recog = obj.attributes.get("_recog_ref2recog", default={})
+    obj2regex = obj.attributes.get("_recog_obj2regex", default={})
+    obj2recog = obj.attributes.get("_recog_obj2recog", default={})
+    obj2regex = dict((obj, re.compile(regex, rpsystem._RE_FLAGS)) for obj, regex in obj2regex.items() if obj)
+    obj2recog = dict((obj, recog) for obj, recog in obj2recog.items() if obj)
+    return ref2recog, obj2regex, obj2recog
+
+
+def bench_recog_load(nrecogs=(10, 100, 500), number=20, output=None):
+    """
+    Compare the login-time cost of loading a character's recogs from
+    the legacy three-dictionary layout and from the current per-object
+    Attributes, on the same character. The Attribute cache is emptied
+    before every load.
+
+    Args:
+        nrecogs (iterable, optional): Numbers of recogs to try.
+        number (int, optional): Repetitions per measurement.
+        output (str, optional): Write the results as JSON to this file.
+
+    Returns:
+        rows (list): One dict per number of recogs, times in microseconds.
+
+    """
+    rows = []
+    for nrecog in nrecogs:
+        room, characters, props = build_bench_room(nrecog + 1, nrecogs=0, nprops=0)
+        char = characters[0]
+        for other in characters[1:]:
+            char.recog.add(other, "Friend%i" % other.id)
+        char.attributes.add(
+            "_recog_ref2recog", dict(("#%i" % other.id, "Friend%i" % other.id) for other in characters[1:])
+        )
+        char.attributes.add(
+            "_recog_obj2recog", dict((other, "Friend%i" % other.id) for other in characters[1:])
+        )
+        char.attributes.add(
+            "_recog_obj2regex",
+            dict((other, rpsystem.ordered_permutation_regex("Friend%i" % other.id)) for other in characters[1:]),
+        )
+
+        def _legacy():
+            char.attributes.reset_cache()
+            _legacy_recog_load(char)
+
+        def _current():
+            char.attributes.reset_cache()
+            rpsystem.RecogHandler(char)
+
+        legacy_load = _timed(_legacy, number)
+        # drop the legacy layout, or the handler would migrate it
+        for attrname in ("_recog_ref2recog", "_recog_obj2recog", "_recog_obj2regex"):
+            char.attributes.remove(attrname)
+        rows.append({"recogs": nrecog, "legacy_load": legacy_load, "load": _timed(_current, number)})
+        for obj in characters + [room]:
+            obj.delete()
+
+    header = ("recogs", "legacy_load", "load")
+    print(" ".join("%13s" % col for col in header))
+    for row in rows:
+        print("%13i %13.1f %13.1f" % tuple(row[col] for col in header))
+    if output:
+        _write_results(output, number, rows)
+    return rows
+
+
+def compare_bench_results(old, new, threshold=0.1):
+    """
+    Compare two JSON result files of `bench_communications`.
+
+    Args:
+        old (str): Results of the reference run.
+        new (str): Results of the run to check.
+        threshold (float, optional): Relative slowdown reported as a
+            regression.
+
+    Returns:
+        regressions (list): `(characters, operation, old_usec, new_usec)`
+            for every operation slower than allowed.
+
+    """
+    with open(old) as fil:
+        old_rows = json.load(fil)["rows"]
+    with open(new) as fil:
+        new_rows = json.load(fil)["rows"]
+    reference = dict(((row["characters"], row["operation"]), row["usec"]) for row in old_rows)
+    regressions = []
+    for row in new_rows:
+        key = (row["characters"], row["operation"])
+        if key not in reference:
+            continue
+        ratio = row["usec"] / reference[key] if reference[key] else 1.0
+        print("%13i %13s %13.1f %13.1f %7.2f" % (key + (reference[key], row["usec"], ratio)))
+        if ratio > 1.0 + threshold:
+            regressions.append(key + (reference[key], row["usec"]))
+    return regressions
+
+
+def _measured(func):
+    """
+    Time one call to func and the memory it leaves allocated.
+
+    Returns:
+        usec, kbytes, result (tuple): The time in microseconds, the
+            memory in KiB and what func returned.
+
+    """
+    re.purge()
+    tracemalloc.start()
+    start = perf_counter()
+    result = func()
+    usec = (perf_counter() - start) * 1e6
+    kbytes = tracemalloc.get_traced_memory()[0] / 1024.0
+    tracemalloc.stop()
+    return usec, kbytes, result
+
+
+def bench_sdesc_load(nobjects=(100, 1000), nsdescs=10, output=None):
+    """
+    Compare loading the SdescHandlers of many NPCs sharing a few sdescs
+    (like the default "A normal person") with the legacy eager compile
+    of every handler's regex and the current lazy, interned regexes.
+    Try `nobjects=(10000,)` for a reload-sized run. Times are for
+    loading all handlers and then matching every NPC's regex once;
+    memory is what the handlers and their regexes keep allocated.
+
+    Args:
+        nobjects (iterable, optional): Numbers of NPCs to try.
+        nsdescs (int, optional): Number of distinct sdescs among them.
+        output (str, optional): Write the results as JSON to this file.
+
+    Returns:
+        rows (list): One dict per number of NPCs.
+
+    """
+    rows = []
+    for nobj in nobjects:
+        room = create_object(rpsystem.AURPGRPRoom, key="Benchmark hall")
+        npcs = []
+        for iobj in range(nobj):
+            npc = create_object(rpsystem.AURPGRPCharacter, key="Npc%i" % iobj, location=room)
+            npc.sdesc.add(
+                "a %s person" % _BENCH_ADJECTIVES[iobj % min(nsdescs, len(_BENCH_ADJECTIVES))]
+            )
+            npcs.append(npc)
+
+        def _legacy():
+            return [
+                re.compile(npc.attributes.get("_sdesc_regex", default=""), rpsystem._RE_FLAGS)
+                for npc in npcs
+            ]
+
+        def _current():
+            return [rpsystem.SdescHandler(npc) for npc in npcs]
+
+        legacy_usec, legacy_kbytes, regexes = _measured(_legacy)
+        start = perf_counter()
+        for regex in regexes:
+            regex.match("/person")
+        legacy_match = (perf_counter() - start) * 1e6
+        del regexes
+
+        usec, kbytes, handlers = _measured(_current)
+        start = perf_counter()
+        for handler in handlers:
+            handler.sdesc_regex.match("/person")
+        match = (perf_counter() - start) * 1e6
+        del handlers
+
+        rows.append(
+            {
+                "objects": nobj,
+                "sdescs": nsdescs,
+                "legacy_load": legacy_usec,
+                "load": usec,
+                "legacy_match": legacy_match,
+                "match": match,
+                "legacy_kbytes": legacy_kbytes,
+                "kbytes": kbytes,
+            }
+        )
+        for obj in npcs + [room]:
+            obj.delete()
+
+    header = ("objects", "legacy_load", "load", "legacy_match", "match", "legacy_kbytes", "kbytes")
+    print(" ".join("%13s" % col for col in header))
+    for row in rows:
+        print("%13i" % row["objects"] + "".join(" %13.1f" % row[col] for col in header[1:]))
+    if output:
+        _write_results(output, 1, rows)
+    return rows
+
+
+def _legacy_translate_text(model, text, level=0.0):
+    """
+    The original two-pass `translate_text`, looking back over all the
+    text before every word, kept for comparison.
+
+    """
+    threshold = int(10 * (1.0 - max(0, min(level, 1.0))))
+
+    def _translate_sub(match):
+        word = match.group()
+        start_sentence = False
+        if len(word) > threshold and word.lower() not in model.translation:
+            preceeding = match.string[: match.start()].strip()
+            start_sentence = preceeding.endswith((".", "!", "?")) or not preceeding
+        return rplanguage.translate_word(model, word, threshold, start_sentence)
+
+    translation = rplanguage._RE_WORD.sub(_translate_sub, text)
+    return _LEGACY_RE_EXTRA_CHARS.sub("", translation)
+
+
+def _bench_text(size):
+    """
+    About `size` characters of sentences, with names, shouting and
+    sloppy punctuation for the translation to clean up.
+
+    """
+    sentences = []
+    length = 0
+    for isentence in itertools.count():
+        words = _BENCH_WORDS[isentence % 5 :]
+        words[0] = words[0].capitalize()
+        if isentence % 3 == 0:
+            words[2] = "Bob"
+        if isentence % 4 == 0:
+            words[-1] = words[-1].upper()
+        sentence = " ".join(words) + (" ,  really ?" if isentence % 2 else ".")
+        sentences.append(sentence)
+        length += len(sentence) + 1
+        if length >= size:
+            break
+    return " ".join(sentences)
+
+
+def bench_translate(sizes=(1024, 10240), levels=(0.5, 1.0), number=5, output=None):
+    """
+    Compare translating texts with the legacy two-pass `translate_text`
+    and the current single-pass one. Both share the language model and
+    its cache of made-up words, so only the tokenizing differs.
+
+    Args:
+        sizes (iterable, optional): Text sizes to try, in characters.
+        levels (iterable, optional): Translation levels to try.
+        number (int, optional): Repetitions per measurement.
+        output (str, optional): Write the results as JSON to this file.
+
+    Returns:
+        rows (list): One dict per size and level, times in microseconds.
+
+    """
+    handler = create_script(rplanguage.AURPGLanguageHandler, key="bench_language_handler")
+    handler.add(key="bench", auto_translations=_BENCH_WORDS[:4])
+    model = handler.get_model("bench")
+    rows = []
+    for size in sizes:
+        text = _bench_text(size)
+        for level in levels:
+            # fill the word cache, so both translate the same words
+            rplanguage.translate_text(model, text, level)
+            rows.append(
+                {
+                    "size": len(text),
+                    "level": level,
+                    "legacy": _timed(lambda: _legacy_translate_text(model, text, level), number, False),
+                    "translate": _timed(lambda: rplanguage.translate_text(model, text, level), number, False),
+                    "stream": _timed(
+                        lambda: rplanguage.translate_text(model, text, level, output=[]), number, False
+                    ),
+                }
+            )
+    handler.delete()
+
+    header = ("size", "level", "legacy", "translate", "stream")
+    print(" ".join("%13s" % col for col in header))
+    for row in rows:
+        print("%13i %13.1f %13.1f %13.1f %13.1f" % tuple(row[col] for col in header))
+    if output:
+        _write_results(output, number, rows)
+    return rows
+
+
+class BenchRPSystem(EvenniaTest):
+    """
+    Runs `bench_communications` on the test database, see the module
+    docstring.
+
+    """
+
+    def test_bench_communications(self):
+        rows = bench_communications(output=bench_results_path(_BENCH_RESULTS))
+        self.assertEqual(15, len(rows), "Testing the benchmark rows.")
+
+    def test_bench_recog_load(self):
+        rows = bench_recog_load(output=bench_results_path(_BENCH_RECOG_RESULTS))
+        self.assertEqual(3, len(rows), "Testing the benchmark rows.")
+
+    def test_bench_sdesc_load(self):
+        rows = bench_sdesc_load(output=bench_results_path(_BENCH_SDESC_RESULTS))
+        self.assertEqual(2, len(rows), "Testing the benchmark rows.")
+
+    def test_bench_translate(self):
+        rows = bench_translate(output=bench_results_path(_BENCH_TRANSLATE_RESULTS))
+        self.assertEqual(4, len(rows), "Testing the benchmark rows.")
@@ -9,6 +9,9 @@ Modified by MaCorvalan, 2022
       add duplicate text to whispers send and received.
     * Modified the description on how it works and installation.
     * Add 'DefaultRoom' inheritance to AURPGRPRoom.
+    * Emote references are resolved through word-tries (MatchTrie) kept
+      per location and per recog handler instead of one regex per
+      candidate.
 
 This module contains the AURPGRPObject, AURPGRPRoom and
 AURPGRPCharacter typeclasses.  If you inherit your
@@ -53,6 +56,10 @@ to a game, common to many RP-centric games:
         in a room as sdesc + pose.
     - in-emote says, including seamless integration with language
         obscuration routine (such as AURPG/rplanguage.py)
+    - language comprehension. Says in a language, like `(elvish)"Hello"`,
+        are obscured by how well speaker and listener know it, from
+        `get_language_skill` on the Character. Each room caches these
+        levels in a speaker x listener matrix.
 
 Examples:
 
@@ -102,15 +109,24 @@ Verbose Installation Instructions:
 
 """
 import re
+import time
 from re import escape as re_escape
-import itertools
+from itertools import count
+from weakref import WeakValueDictionary
+from collections import deque, OrderedDict
+from functools import lru_cache
+from twisted.internet.defer import Deferred, succeed
+from twisted.internet.task import Cooperator
 from django.conf import settings
+from django.db.models.signals import m2m_changed, post_save
 from evennia import DefaultObject, DefaultCharacter, DefaultRoom, ObjectDB
 from evennia import Command, CmdSet
 from evennia import ansi
 from evennia.utils.utils import lazy_property, make_iter, variable_from_module
 from evennia.utils import logger
 
+from AU_Modules.AU_RPGSystem.AU_RPGLanguages import obfuscate_language_many
+
 
 _AT_SEARCH_RESULT = variable_from_module(*settings.SEARCH_AT_RESULT.rsplit(".", 1))
 # ------------------------------------------------------------
@@ -131,6 +147,25 @@ _PREFIX = "/"
 # 2-tall etc.
 _NUM_SEP = "-"
 
+# The max number of compiled ordered permutation regexes kept in memory.
+# Identical sdescs/recogs/keys share the same compiled object.
+_REGEX_CACHE_SIZE = 1024
+
+# Chunked broadcasts (send_emote(..., chunked=True)) deliver this many
+# receivers per unit of work, and work for at most this many seconds
+# per reactor tick before yielding to other sessions.
+_BROADCAST_CHUNK_SIZE = 20
+_BROADCAST_TICK_BUDGET = 0.01
+
+# Time the phases of the emote pipeline (see the emoteprofile command).
+# Each phase keeps its last _PROFILE_WINDOW samples.
+_PROFILE_EMOTES = False
+_PROFILE_WINDOW = 1000
+
+# The max number of (object, looker) renders of return_appearance kept in
+# memory, least recently used ones are dropped first.
+_APPEARANCE_CACHE_SIZE = 1024
+
 # Texts
 
 _EMOTE_NOMATCH_ERROR = """|RNo match for |r{ref}|R.|n"""
@@ -148,8 +183,6 @@ _RE_PREFIX = re.compile(r"^%s" % _PREFIX, re.UNICODE)
 # and "/2-tall man" will return groups ("2", "tall").
 _RE_OBJ_REF_START = re.compile(r"%s(?:([0-9]+)%s)*(\w+)" % (_PREFIX, _NUM_SEP), _RE_FLAGS)
 
-_RE_LEFT_BRACKETS = re.compile(r"\{+", _RE_FLAGS)
-_RE_RIGHT_BRACKETS = re.compile(r"\}+", _RE_FLAGS)
 # Reference markers are used internally when distributing the emote to
 # all that can see it. They are never seen by players and are on the form {#dbref}.
 _RE_REF = re.compile(r"\{+\#([0-9]+)\}+")
@@ -166,10 +199,23 @@ _RE_REF_LANG = re.compile(r"\{+\##([0-9]+)\}+")
 # this regex returns in groups (langname, say), where langname can be empty.
 _RE_LANGUAGE = re.compile(r"(?:\((\w+)\))*(\".+?\")")
 
+# Finds both kinds of reference markers when compiling an emote into an
+# EmoteTemplate, returning groups ("#", dbref) or ("##", n).
+_RE_EMOTE_TOKEN = re.compile(r"\{(\#\#?)([0-9]+)\}")
+
+# EmoteTemplate slot kinds
+_TOKEN_OBJ = "obj"
+_TOKEN_LANG = "lang"
+
+# Match kinds, in the order candidates are listed when resolving a
+# multimatch with a num-specifier (1-tall, 2-tall).
+_MATCH_SELF, _MATCH_RECOG, _MATCH_SDESC, _MATCH_KEY = range(4)
+
 # the emote parser works in two steps:
 #  1) convert the incoming emote into an intermediary
-#     form with all object references mapped to ids.
-#  2) for every person seeing the emote, parse this
+#     form with all object references mapped to ids,
+#     compiled into an EmoteTemplate.
+#  2) for every person seeing the emote, render this
 #     intermediary form into the one valid for that char.
 
 
@@ -197,6 +243,58 @@ def _dummy_process(text, *args, **kwargs):
 # emoting mechanisms
 
 
+def _clean_sentence(sentence):
+    """
+    Strip emote markers from a sentence before it is used for matching.
+
+    Args:
+        sentence (str): The sdesc, recog or key/alias string.
+
+    Returns:
+        sentence (str): The sentence with {#nnn}/{##nnn} markers replaced
+            by nnn and self-references removed.
+
+    """
+    # escape {#nnn} markers from sentence, replace with nnn
+    sentence = _RE_REF.sub(r"\1", sentence)
+    # escape {##nnn} markers, replace with nnn
+    sentence = _RE_REF_LANG.sub(r"\1", sentence)
+    # escape self-ref marker from sentence
+    return _RE_SELF_REF.sub(r"", sentence)
+
+
+def _match_words(sentence):
+    """
+    Get the lowercase words of a sentence, as used by `MatchTrie`.
+
+    Args:
+        sentence (str): The (ANSI-free) sentence to split.
+
+    Returns:
+        words (tuple): The cleaned, lowercase words of the sentence.
+
+    """
+    return tuple(_clean_sentence(sentence).lower().split())
+
+
+def ordered_word_runs(words):
+    """
+    Generate the contiguous runs of a list of words, longest first.
+    There are n(n+1)/2 of them for n words.
+
+    Args:
+        words (list): The words of a sentence.
+
+    Yields:
+        run (list): A contiguous slice of `words`.
+
+    """
+    nwords = len(words)
+    for length in range(nwords, 0, -1):
+        for istart in range(nwords - length + 1):
+            yield words[istart : istart + length]
+
+
 def ordered_permutation_regex(sentence):
     """
     Builds a regex that matches 'ordered permutations' of a sentence's
@@ -206,9 +304,9 @@ def ordered_permutation_regex(sentence):
         sentence (str): The sentence to build a match pattern to
 
     Returns:
-        regex (re object): Compiled regex object represented the
-            possible ordered permutations of the sentence, from longest to
-            shortest.
+        regex (str): Regex pattern representing the possible ordered
+            permutations of the sentence, from longest to shortest. Use
+            `compile_ordered_permutation_regex` for a compiled one.
     Example:
          The sdesc_regex for an sdesc of " very tall man" will
          result in the following allowed permutations,
@@ -220,42 +318,101 @@ def ordered_permutation_regex(sentence):
          like /2-tall.
 
     """
-    # escape {#nnn} markers from sentence, replace with nnn
-    sentence = _RE_REF.sub(r"\1", sentence)
-    # escape {##nnn} markers, replace with nnn
-    sentence = _RE_REF_LANG.sub(r"\1", sentence)
-    # escape self-ref marker from sentence
-    sentence = _RE_SELF_REF.sub(r"", sentence)
-
-    # ordered permutation algorithm
-    words = sentence.split()
-    combinations = itertools.product((True, False), repeat=len(words))
-    solution = []
-    for combination in combinations:
-        comb = []
-        for iword, word in enumerate(words):
-            if combination[iword]:
-                comb.append(word)
-            elif comb:
-                break
-        if comb:
-            solution.append(
-                _PREFIX
-                + r"[0-9]*%s*%s(?=\W|$)+" % (_NUM_SEP, re_escape(" ".join(comb)).rstrip("\\"))
-            )
+    return _ordered_permutation_pattern(_clean_sentence(sentence))
+
+
+@lru_cache(maxsize=_REGEX_CACHE_SIZE)
+def _ordered_permutation_pattern(sentence):
+    """
+    Build the ordered permutation pattern of an already cleaned sentence.
 
+    """
+    solution = set(
+        _PREFIX + r"[0-9]*%s*%s(?=\W|$)+" % (_NUM_SEP, re_escape(" ".join(run)).rstrip("\\"))
+        for run in ordered_word_runs(sentence.split())
+    )
     # combine into a match regex, first matching the longest down to the shortest components
-    regex = r"|".join(sorted(set(solution), key=lambda item: (-len(item), item)))
+    return r"|".join(sorted(solution, key=lambda item: (-len(item), item)))
+
+
+# Compiled match regexes by pattern, weakly held. Handlers keep the
+# regexes they use alive, so everyone using the same pattern shares
+# one compiled object.
+_REGEX_POOL = WeakValueDictionary()
+
+
+def intern_regex(pattern):
+    """
+    Get the shared compiled regex of a match pattern.
+
+    Args:
+        pattern (str): A pattern like those of `ordered_permutation_regex`.
+
+    Returns:
+        regex (re object): Compiled regex object, the same for everyone
+            using `pattern`.
+
+    """
+    regex = _REGEX_POOL.get(pattern)
+    if regex is None:
+        regex = _REGEX_POOL[pattern] = re.compile(pattern, _RE_FLAGS)
     return regex
 
 
+def compile_ordered_permutation_regex(sentence):
+    """
+    Get the compiled `ordered_permutation_regex` of a sentence. Compiled
+    regexes are interned by pattern, and the most recent ones are also
+    kept in an LRU cache keyed by the cleaned sentence, so identical
+    sdescs (like "a tall man") only compile once.
+
+    Args:
+        sentence (str): The sentence to build a match pattern to
+
+    Returns:
+        regex (re object): Compiled regex object.
+
+    """
+    return _compile_ordered_permutation_pattern(" ".join(_clean_sentence(sentence).split()))
+
+
+@lru_cache(maxsize=_REGEX_CACHE_SIZE)
+def _compile_ordered_permutation_pattern(sentence):
+    """
+    Compile the ordered permutation pattern of an already cleaned sentence.
+
+    """
+    return intern_regex(_ordered_permutation_pattern(sentence))
+
+
+def _key_alias_cache(obj):
+    """
+    Get the key/alias match data cached on an object, rebuilding it if
+    the key or aliases changed since it was cached.
+
+    Args:
+        obj (Object): The object to get match data for.
+
+    Returns:
+        cache (list): List `[(key, aliases), words, regex]`. The regex is
+            None until first requested by `regex_tuple_from_key_alias`.
+
+    """
+    signature = (obj.key, tuple(obj.aliases.all()))
+    cache = obj.ndb._key_alias_match
+    if not cache or cache[0] != signature:
+        cache = [signature, _match_words(" ".join((obj.key,) + signature[1])), None]
+        obj.ndb._key_alias_match = cache
+    return cache
+
+
 def regex_tuple_from_key_alias(obj):
     """
     This will build a regex tuple for any object, not just from those
     with sdesc/recog handlers. It's used as a legacy mechanism for
-    being able to mix this AURPG with objects not using sdescs, but
-    note that creating the ordered permutation regex dynamically for
-    every object will add computational overhead.
+    being able to mix this AURPG with objects not using sdescs. The
+    regex is cached on the object (non-persistently) until its key or
+    aliases change.
 
     Args:
         obj (Object): This object's key and eventual aliases will
@@ -266,11 +423,271 @@ def regex_tuple_from_key_alias(obj):
             (ordered_permutation_regex, obj, key/alias)
 
     """
-    return (
-        re.compile(ordered_permutation_regex(" ".join([obj.key] + obj.aliases.all())), _RE_FLAGS),
-        obj,
-        obj.key,
-    )
+    cache = _key_alias_cache(obj)
+    if cache[2] is None:
+        cache[2] = compile_ordered_permutation_regex(" ".join((obj.key,) + cache[0][1]))
+    return cache[2], obj, obj.key
+
+
+def _match_entries(obj):
+    """
+    Get the match-index entries for an object.
+
+    Args:
+        obj (Object): The object to index.
+
+    Returns:
+        entries (tuple): Tuple of `((kind, dbid), words)` pairs. Objects
+            with an sdesc are indexed by it, objects lacking either sdesc
+            or recog handlers are (also) indexed by key and aliases.
+
+    """
+    entries = []
+    if hasattr(obj, "sdesc"):
+        entries.append(((_MATCH_SDESC, obj.id), obj.sdesc.match_words))
+    if not (hasattr(obj, "recog") and hasattr(obj, "sdesc")):
+        entries.append(((_MATCH_KEY, obj.id), _key_alias_cache(obj)[1]))
+    return tuple(entries)
+
+
+def _marker_word_starts(string, istart):
+    """
+    Find where the words of a marker may start, mirroring the
+    `/[0-9]*-*` head of the `ordered_permutation_regex` patterns.
+
+    Args:
+        string (str): The emote.
+        istart (int): Index of the marker prefix in `string`.
+
+    Returns:
+        starts (list): Possible start indices of the first word.
+
+    """
+    ipos = istart + len(_PREFIX)
+    starts = [ipos]
+    while ipos < len(string) and string[ipos] in "0123456789":
+        ipos += 1
+        starts.append(ipos)
+    while ipos < len(string) and string[ipos] == _NUM_SEP:
+        ipos += 1
+        starts.append(ipos)
+    return starts
+
+
+class MatchTrie(object):
+    """
+    A word-trie over every ordered word-run of a set of texts. Looking
+    up a marker walks the trie once along the emote, so the cost does
+    not grow with the number of indexed texts.
+
+    Every node is a tuple `(children, refs)` where `children` maps a
+    lowercase word to the next node and `refs` counts the texts having
+    a word-run ending at that node. Refs are `(kind, dbid)` tuples.
+
+    """
+
+    def __init__(self):
+        self.root = ({}, {})
+        self.ref2words = {}
+
+    def __contains__(self, ref):
+        return ref in self.ref2words
+
+    def add(self, ref, words):
+        """
+        Index a text, replacing any earlier text indexed under `ref`.
+
+        Args:
+            ref (tuple): The `(kind, dbid)` reference of the text.
+            words (tuple): The lowercase words of the text.
+
+        """
+        if ref in self.ref2words:
+            self.remove(ref)
+        self.ref2words[ref] = words
+        for istart in range(len(words)):
+            node = self.root
+            for word in words[istart:]:
+                node = node[0].setdefault(word, ({}, {}))
+                node[1][ref] = node[1].get(ref, 0) + 1
+
+    def remove(self, ref):
+        """
+        Remove a text from the trie.
+
+        Args:
+            ref (tuple): The `(kind, dbid)` reference of the text.
+
+        """
+        words = self.ref2words.pop(ref, ())
+        for istart in range(len(words)):
+            path = []
+            node = self.root
+            for word in words[istart:]:
+                path.append((node, word))
+                node = node[0][word]
+                if node[1][ref] > 1:
+                    node[1][ref] -= 1
+                else:
+                    del node[1][ref]
+            # prune branches no longer leading anywhere
+            for parent, word in reversed(path):
+                child = parent[0][word]
+                if child[0] or child[1]:
+                    break
+                del parent[0][word]
+
+    def match(self, string, ipos):
+        """
+        Match word-runs from a position in a string.
+
+        Args:
+            string (str): The string to match in.
+            ipos (int): Index of the first word to match.
+
+        Returns:
+            matches (dict): Mapping `{ref: iend}` where `iend` is the
+                index just past the longest run of `ref` matched. As
+                with the regexes, a run must be followed by a
+                non-alphanumeric character or the end of the string.
+
+        """
+        matches = {}
+        node = self.root
+        length = len(string)
+        while node[0]:
+            iend = ipos
+            while iend < length and not string[iend].isspace():
+                iend += 1
+            token = string[ipos:iend]
+            if not token:
+                break
+            for icut in range(1, len(token) + 1):
+                if icut < len(token) and (token[icut].isalnum() or token[icut] == "_"):
+                    continue
+                child = node[0].get(token[:icut].lower())
+                if child:
+                    for ref in child[1]:
+                        matches[ref] = ipos + icut
+            # runs continue only over whole words separated by one space
+            node = node[0].get(token.lower())
+            if node is None or iend >= length or string[iend] != " ":
+                break
+            ipos = iend + 1
+        return matches
+
+
+class _CandidateMatcher(object):
+    """
+    Resolves `/ref` markers against a set of candidates, using the
+    match index of each candidate's location and the recogs of the
+    sender.
+
+    """
+
+    def __init__(self, sender, candidates):
+        """
+        Args:
+            sender (Object): The object doing the referencing.
+            candidates (iterable): Objects valid for referencing.
+
+        """
+        self.sender = sender
+        self.objects = {}
+        self.order = {}
+        for ipos, obj in enumerate(candidates):
+            if obj.id not in self.order:
+                self.order[obj.id] = ipos
+                self.objects[obj.id] = obj
+        self.self_ref = hasattr(sender, "sdesc")
+        self.recog = sender.recog if hasattr(sender, "recog") else None
+        self.recog_allowed = {}
+
+        self.tries = [self.recog.trie] if self.recog else []
+        indexes = {}
+        loose = []
+        for obj in self.objects.values():
+            location = obj.location
+            if location is not None and hasattr(location, "match_index"):
+                if location.id not in indexes:
+                    indexes[location.id] = location.match_index
+                    location.match_index.sync()
+                if obj.id in indexes[location.id].entries:
+                    continue
+            loose.append(obj)
+        self.tries.extend(index.trie for index in indexes.values())
+        if loose:
+            # candidates not inside an indexed location (like the room itself)
+            trie = MatchTrie()
+            for obj in loose:
+                for ref, words in _match_entries(obj):
+                    trie.add(ref, words)
+            self.tries.append(trie)
+
+    def _allowed(self, ref):
+        """
+        Check the enable_recog lock for recog matches.
+
+        """
+        kind, dbid = ref
+        if kind != _MATCH_RECOG:
+            return True
+        if dbid not in self.recog_allowed:
+            self.recog_allowed[dbid] = self.objects[dbid].access(
+                self.sender, "enable_recog", default=True
+            )
+        return self.recog_allowed[dbid]
+
+    def _resolve(self, ref):
+        """
+        Get the `(obj, text)` tuple for a ref.
+
+        """
+        kind, dbid = ref
+        if kind == _MATCH_SELF:
+            return self.sender, self.sender.sdesc.get()
+        obj = self.objects[dbid]
+        if kind == _MATCH_RECOG:
+            return obj, self.recog.recogs.get(dbid, ("",))[0]
+        if kind == _MATCH_SDESC:
+            return obj, obj.sdesc.get()
+        return obj, obj.key
+
+    def match(self, string, istart):
+        """
+        Find the candidates best matching the marker at `istart`.
+
+        Args:
+            string (str): The emote.
+            istart (int): Index of the marker prefix in `string`.
+
+        Returns:
+            (maxscore, bestmatches) (tuple): The length of the longest
+                match and a list of `(obj, text)` for all candidates
+                matching with that length, ordered self-reference, recogs,
+                sdescs and keys, each in candidate order. `maxscore` is -1
+                if nothing matched.
+
+        """
+        scores = {}
+        if self.self_ref:
+            self_match = _RE_SELF_REF.match(string, istart)
+            if self_match:
+                scores[(_MATCH_SELF, self.sender.id)] = self_match.end() - istart
+        for ipos in _marker_word_starts(string, istart):
+            for trie in self.tries:
+                for ref, iend in trie.match(string, ipos).items():
+                    score = iend - istart
+                    if ref[1] in self.order and score > scores.get(ref, -1) and self._allowed(ref):
+                        scores[ref] = score
+        if not scores:
+            return -1, []
+        maxscore = max(scores.values())
+        bestrefs = sorted(
+            (ref for ref, score in scores.items() if score == maxscore),
+            key=lambda ref: (ref[0], self.order.get(ref[1], -1)),
+        )
+        return maxscore, [self._resolve(ref) for ref in bestrefs]
 
 
 def parse_language(speaker, emote):
@@ -306,6 +723,9 @@ def parse_language(speaker, emote):
     """
     # escape mapping syntax on the form {##id} if it exists already in emote,
     # if so it is replaced with just "id".
+    profiling = _EMOTE_PROFILER.enabled
+    if profiling:
+        tstart = time.perf_counter()
     emote = _RE_REF_LANG.sub(r"\1", emote)
 
     errors = []
@@ -326,6 +746,9 @@ def parse_language(speaker, emote):
         # catch errors and report
         raise LanguageError("\n".join(errors))
 
+    if profiling:
+        _EMOTE_PROFILER.record("language", time.perf_counter() - tstart, len(mapping))
+
     # at this point all says have been replaced with {##nn} markers
     # and mapping maps 1:1 to this.
     return emote, mapping
@@ -350,6 +773,7 @@ def parse_sdescs_and_recogs(sender, candidates, string, search_mode=False):
             (default), a tuple where the emote is the emote string, with
             all references replaced with internal-representation {#dbref}
             markers and mapping is a dictionary `{"#dbref":obj, ...}`.
+            Use `EmoteTemplate.from_string` to render it.
         result (list): If `search_mode` is `True` we are
             performing a search query on `string`, looking for a specific
             object. A list with zero, one or more matches.
@@ -367,31 +791,18 @@ def parse_sdescs_and_recogs(sender, candidates, string, search_mode=False):
         - says, "..." are
 
     """
-     # Load all candidate regex tuples [(regex, obj, sdesc/recog),...]
-    candidate_regexes = (
-        ([(_RE_SELF_REF, sender, sender.sdesc.get())] if hasattr(sender, "sdesc") else [])
-        + (
-            [sender.recog.get_regex_tuple(obj) for obj in candidates]
-            if hasattr(sender, "recog")
-            else []
-        )
-        + [obj.sdesc.get_regex_tuple() for obj in candidates if hasattr(obj, "sdesc")]
-        + [
-            regex_tuple_from_key_alias(obj)  # handle objects without sdescs
-            for obj in candidates
-            if not (hasattr(obj, "recog") and hasattr(obj, "sdesc"))
-        ]
-    )
-
-    # filter out non-found data
-    candidate_regexes = [tup for tup in candidate_regexes if tup]
+    profiling = _EMOTE_PROFILER.enabled
+    if profiling:
+        tstart = time.perf_counter()
+    # index the candidates' sdescs, recogs and keys/aliases for marker lookup
+    matcher = _CandidateMatcher(sender, candidates)
+    if profiling:
+        tmatch = time.perf_counter()
+        _EMOTE_PROFILER.record("candidates", tmatch - tstart, len(matcher.objects))
 
     # escape mapping syntax on the form {#id} if it exists already in emote,
     # if so it is replaced with just "id".
     string = _RE_REF.sub(r"\1", string)
-    # escape loose { } brackets since this will clash with formatting
-    string = _RE_LEFT_BRACKETS.sub("{{", string)
-    string = _RE_RIGHT_BRACKETS.sub("}}", string)
 
     # we now loop over all references and analyze them
     mapping = {}
@@ -408,15 +819,8 @@ def parse_sdescs_and_recogs(sender, candidates, string, search_mode=False):
         istart0 = marker_match.start()
         istart = istart0
 
-        # loop over all candidate regexes and match against the string following the match
-        matches = ((reg.match(string[istart:]), obj, text) for reg, obj, text in candidate_regexes)
-
-        # score matches by how long part of the string was matched
-        matches = [(match.end() if match else -1, obj, text) for match, obj, text in matches]
-        maxscore = max(score for score, obj, text in matches)
-
-        # we have a valid maxscore, extract all matches with this value
-        bestmatches = [(obj, text) for score, obj, text in matches if maxscore == score != -1]
+        # find the candidates matching the longest part of the string following the marker
+        maxscore, bestmatches = matcher.match(string, istart)
         nmatches = len(bestmatches)
 
         if not nmatches:
@@ -471,6 +875,8 @@ def parse_sdescs_and_recogs(sender, candidates, string, search_mode=False):
                     ref=marker_match.group(), reflist="\n    ".join(reflist)
                 )
             )
+    if profiling:
+        _EMOTE_PROFILER.record("markers", time.perf_counter() - tmatch, len(matcher.objects))
     if search_mode:
         # return list of object(s) matching
         if nmatches == 0:
@@ -489,7 +895,467 @@ def parse_sdescs_and_recogs(sender, candidates, string, search_mode=False):
     return string, mapping
 
 
-def send_emote(sender, receivers, emote, anonymous_add="first", **kwargs):
+class EmoteTemplate(object):
+    """
+    The compiled intermediary form of an emote. The emote is stored as
+    a list of tokens, each either a literal string or a `(kind, key)`
+    slot, where kind is "obj" for a {#dbref} object reference and
+    "lang" for a {##n} say. Rendering an emote for a receiver is then
+    a single join of literals and the receiver's texts for each slot,
+    without re-parsing the emote.
+
+    Says keep their text as a string, since they are handed to the
+    receiver's `process_language` as a whole. Object references nested
+    inside them are resolved after that.
+
+    """
+
+    def __init__(self, tokens, obj_mapping, language_mapping):
+        """
+        Args:
+            tokens (list): Literal strings and `(kind, key)` slots.
+            obj_mapping (dict): Mapping `{"#dbref": obj}`.
+            language_mapping (dict): Mapping `{"##n": (langname, saytext)}`.
+
+        """
+        self.tokens = tokens
+        self.obj_mapping = obj_mapping
+        self.language_mapping = language_mapping
+        # says with object references inside them
+        self.nested = set(
+            key for key, (langname, saytext) in language_mapping.items() if _RE_REF.search(saytext)
+        )
+
+    @classmethod
+    def from_string(cls, string, obj_mapping, language_mapping=None):
+        """
+        Compile an intermediary emote string into a template.
+
+        Args:
+            string (str): An emote with {#dbref} and {##n} markers, as
+                returned by `parse_sdescs_and_recogs` and `parse_language`.
+            obj_mapping (dict): Mapping `{"#dbref": obj}`.
+            language_mapping (dict, optional): Mapping
+                `{"##n": (langname, saytext)}`.
+
+        Returns:
+            template (EmoteTemplate): The compiled emote.
+
+        """
+        language_mapping = language_mapping or {}
+        tokens = []
+        ipos = 0
+        for match in _RE_EMOTE_TOKEN.finditer(string):
+            key = match.group(1) + match.group(2)
+            kind = _TOKEN_LANG if match.group(1) == "##" else _TOKEN_OBJ
+            if key not in (language_mapping if kind == _TOKEN_LANG else obj_mapping):
+                # not a marker of ours, leave it as text
+                continue
+            if match.start() > ipos:
+                tokens.append(string[ipos : match.start()])
+            tokens.append((kind, key))
+            ipos = match.end()
+        if ipos < len(string):
+            tokens.append(string[ipos:])
+        return cls(tokens, obj_mapping, language_mapping)
+
+    def render(self, obj_texts, lang_texts=None):
+        """
+        Render the emote.
+
+        Args:
+            obj_texts (dict): Mapping `{"#dbref": text}` for every object
+                reference.
+            lang_texts (dict, optional): Mapping `{"##n": text}` for every say.
+
+        Returns:
+            emote (str): The rendered emote.
+
+        """
+        parts = []
+        for token in self.tokens:
+            if isinstance(token, str):
+                parts.append(token)
+            elif token[0] == _TOKEN_OBJ:
+                parts.append(obj_texts[token[1]])
+            else:
+                text = lang_texts[token[1]]
+                if token[1] in self.nested:
+                    text = _RE_REF.sub(
+                        lambda match: obj_texts.get("#" + match.group(1), match.group()), text
+                    )
+                parts.append(text)
+        return "".join(parts)
+
+    def serialize(self):
+        """
+        Get a JSON-friendly representation of the template, for example
+        for scene logs.
+
+        Returns:
+            data (dict): The tokens, with objects stored by dbref.
+
+        """
+        return {
+            "tokens": [token if isinstance(token, str) else list(token) for token in self.tokens],
+            "objects": dict((key, obj.id) for key, obj in self.obj_mapping.items()),
+            "languages": dict(
+                (key, [langname, saytext])
+                for key, (langname, saytext) in self.language_mapping.items()
+            ),
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        """
+        Rebuild a template stored with `serialize`.
+
+        Args:
+            data (dict): A serialized template.
+
+        Returns:
+            template (EmoteTemplate): The template. References to objects
+                no longer existing are dropped from the object mapping.
+
+        """
+        obj_mapping = {}
+        for key, dbid in data["objects"].items():
+            obj = ObjectDB.objects.get_id(dbid)
+            if obj:
+                obj_mapping[key] = obj
+        tokens = [token if isinstance(token, str) else tuple(token) for token in data["tokens"]]
+        language_mapping = dict(
+            (key, tuple(value)) for key, value in data["languages"].items()
+        )
+        return cls(tokens, obj_mapping, language_mapping)
+
+
+class EmoteProfiler(object):
+    """
+    Rolling timing statistics for the phases of the emote pipeline.
+
+    Every sample is the time spent in a phase and the number of items
+    (candidates, says or receivers) it handled. The pipeline only
+    takes timings while `enabled` is set, so a disabled profiler costs
+    one attribute check per phase.
+
+    Phases:
+        candidates - indexing the candidates of parse_sdescs_and_recogs
+        markers - resolving the /ref markers of parse_sdescs_and_recogs
+        language - finding the says of parse_language
+        obfuscate - receivers' process_language, per render
+        render - rendering the emote for all receivers of a send_emote
+        msg - receiver.msg for all receivers of a send_emote
+
+    """
+
+    def __init__(self, enabled=False, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}
+
+    def record(self, phase, seconds, size):
+        """
+        Store a sample.
+
+        Args:
+            phase (str): The pipeline phase.
+            seconds (float): Time spent in the phase.
+            size (int): Number of items handled in the phase.
+
+        """
+        if phase not in self.samples:
+            self.samples[phase] = deque(maxlen=self.window)
+        self.samples[phase].append((seconds, size))
+
+    def reset(self):
+        """
+        Forget all samples.
+
+        """
+        self.samples = {}
+
+    def stats(self):
+        """
+        Get the statistics of every phase.
+
+        Returns:
+            stats (dict): Mapping `{phase: {"count", "p50", "p95", "p99",
+                "size"}}`, with percentiles in milliseconds and size the
+                mean number of items per call.
+
+        """
+        stats = {}
+        for phase, samples in self.samples.items():
+            times = sorted(seconds for seconds, size in samples)
+            count = len(times)
+            stats[phase] = dict(
+                (name, times[min(count - 1, int(count * percent))] * 1000)
+                for name, percent in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+            )
+            stats[phase]["count"] = count
+            stats[phase]["size"] = sum(size for seconds, size in samples) / count
+        return stats
+
+
+_EMOTE_PROFILER = EmoteProfiler(_PROFILE_EMOTES, _PROFILE_WINDOW)
+
+
+def parse_emote(sender, candidates, emote, anonymous_add=None):
+    """
+    Parse a raw emote into its compiled intermediary form.
+
+    Args:
+        sender (Object): The object sending the emote.
+        candidates (iterable): A list of objects valid for referencing
+            in the emote.
+        emote (str): The raw emote string as input by emoter.
+        anonymous_add (str or None, optional): How to add `sender` to
+            an emote not referencing them, see `send_emote`.
+
+    Returns:
+        template (EmoteTemplate): The compiled emote.
+
+    Raises:
+        EmoteError: For various ref-matching errors.
+        LanguageError: If an invalid language was specified.
+
+    """
+    emote, obj_mapping = parse_sdescs_and_recogs(sender, candidates, emote)
+    emote, language_mapping = parse_language(sender, emote)
+    if anonymous_add and not "#%i" % sender.id in obj_mapping:
+        # no self-reference in the emote - add to the end
+        key = "#%i" % sender.id
+        obj_mapping[key] = sender
+        if anonymous_add == "first":
+            possessive = "" if emote.startswith("'") else " "
+            emote = "%s%s%s" % ("{%s}" % key, possessive, emote)
+        else:
+            emote = "%s [%s]" % (emote, "{%s}" % key)
+    return EmoteTemplate.from_string(emote, obj_mapping, language_mapping)
+
+
+def _render_signature(receiver, sender, obj_mapping, language_mapping):
+    """
+    Get everything deciding how a receiver sees an emote. Receivers with
+    equal signatures are sent the same rendering of the emote.
+
+    Args:
+        receiver (Object): The one seeing the emote.
+        sender (Object): The one sending the emote.
+        obj_mapping (dict): The `{"#dbref": obj}` mapping of the emote.
+        language_mapping (dict): The `{"##n": (langname, saytext)}`
+            mapping of the emote.
+
+    Returns:
+        signature (tuple): A hashable signature.
+
+    Notes:
+        The `process_*` hooks are compared by the functions defined on
+        the receiver's class, so they are assumed not to depend on the
+        receiver's state beyond what `get_language_bucket` reports.
+
+    """
+    cls = type(receiver)
+    processors = (
+        getattr(cls, "process_sdesc", None),
+        getattr(cls, "process_recog", None),
+        getattr(cls, "process_language", None),
+    )
+    recogs = None
+    if hasattr(receiver, "recog"):
+        recog = receiver.recog
+        recogs = tuple((ref, recog.get(obj)) for ref, obj in obj_mapping.items() if recog.has(obj))
+    # receivers always see their own real name
+    own_ref = receiver.id if "#%i" % receiver.id in obj_mapping else None
+    buckets = None
+    if language_mapping and hasattr(receiver, "get_language_bucket"):
+        buckets = tuple(
+            (langname, receiver.get_language_bucket(sender, langname))
+            for langname in sorted(set(langname or "" for langname, _ in language_mapping.values()))
+        )
+    return processors, recogs, own_ref, buckets
+
+
+def _render_emote(receiver, sender, template):
+    """
+    Render the intermediary form of an emote as seen by one receiver.
+
+    Args:
+        receiver (Object): The one seeing the emote.
+        sender (Object): The one sending the emote.
+        template (EmoteTemplate): The compiled emote.
+
+    Returns:
+        emote (str): The emote as `receiver` sees it.
+
+    """
+    obj_mapping = template.obj_mapping
+    # first handle the language mapping, which always produce different keys ##nn
+    receiver_lang_mapping = {}
+    try:
+        process_language = receiver.process_language
+    except AttributeError:
+        process_language = _dummy_process
+    profiling = _EMOTE_PROFILER.enabled and template.language_mapping
+    if profiling:
+        tstart = time.perf_counter()
+    for key, (langname, saytext) in template.language_mapping.items():
+        # color says
+        receiver_lang_mapping[key] = process_language(saytext, sender, langname)
+    if profiling:
+        _EMOTE_PROFILER.record(
+            "obfuscate", time.perf_counter() - tstart, len(template.language_mapping)
+        )
+
+    # handle sdesc mappings. we make a temporary copy that we can modify
+    try:
+        process_sdesc = receiver.process_sdesc
+    except AttributeError:
+        process_sdesc = _dummy_process
+
+    try:
+        process_recog = receiver.process_recog
+    except AttributeError:
+        process_recog = _dummy_process
+
+    try:
+        recog_get = receiver.recog.get
+        receiver_sdesc_mapping = dict(
+            (ref, process_recog(recog_get(obj), obj)) for ref, obj in obj_mapping.items()
+        )
+    except AttributeError:
+        receiver_sdesc_mapping = dict(
+            (
+                ref,
+                process_sdesc(obj.sdesc.get(), obj)
+                if hasattr(obj, "sdesc")
+                else process_sdesc(obj.key, obj),
+            )
+            for ref, obj in obj_mapping.items()
+        )
+    # make sure receiver always sees their real name
+    rkey = "#%i" % receiver.id
+    if rkey in receiver_sdesc_mapping:
+        receiver_sdesc_mapping[rkey] = process_sdesc(receiver.key, receiver)
+
+    # fill the template slots
+    return template.render(receiver_sdesc_mapping, receiver_lang_mapping)
+
+
+def _broadcast(sender, receivers, template, kwargs, result):
+    """
+    Deliver an emote to its receivers, yielding after every chunk of
+    `_BROADCAST_CHUNK_SIZE` receivers.
+
+    Args:
+        sender (Object): The one sending the emote.
+        receivers (list): Receivers of the emote.
+        template (EmoteTemplate): The compiled emote.
+        kwargs (dict): Keyword arguments for `receiver.msg`.
+        result (list): The number of renders saved is appended here
+            once all receivers got the emote.
+
+    """
+    # render once per distinct way of seeing the emote
+    renders = {}
+    trender = tmsg = 0.0
+    for nreceiver, receiver in enumerate(receivers, 1):
+        profiling = _EMOTE_PROFILER.enabled
+        if profiling:
+            tstart = time.perf_counter()
+        try:
+            signature = _render_signature(
+                receiver, sender, template.obj_mapping, template.language_mapping
+            )
+            if signature not in renders:
+                renders[signature] = _render_emote(receiver, sender, template)
+            if profiling:
+                tsend = time.perf_counter()
+            receiver.msg(renders[signature], from_obj=sender, **kwargs)
+        except Exception:
+            # one receiver failing must not keep the emote from the others
+            logger.log_trace("Could not send an emote to %s." % receiver)
+        else:
+            if profiling:
+                trender += tsend - tstart
+                tmsg += time.perf_counter() - tsend
+        if not nreceiver % _BROADCAST_CHUNK_SIZE:
+            yield
+    if trender:
+        _EMOTE_PROFILER.record("render", trender, len(receivers))
+        _EMOTE_PROFILER.record("msg", tmsg, len(receivers))
+    result.append(len(receivers) - len(renders))
+
+
+def _tick_budget():
+    """
+    Termination predicate for the broadcast cooperator, ending a reactor
+    tick's work once `_BROADCAST_TICK_BUDGET` seconds are spent.
+
+    """
+    end = time.time() + _BROADCAST_TICK_BUDGET
+    return lambda: time.time() >= end
+
+
+class _Broadcaster(object):
+    """
+    Delivers chunked broadcasts cooperatively in the reactor.
+
+    Pending broadcasts are delivered one after the other, in the order
+    they were sent, so every receiver gets chunked emotes in the order
+    they were sent. Broadcasts not chunked are never queued here.
+
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.cooperator = Cooperator(terminationPredicateFactory=_tick_budget)
+        self.task = None
+
+    def add(self, broadcast, result):
+        """
+        Queue a broadcast.
+
+        Args:
+            broadcast (iterator): A `_broadcast` generator.
+            result (list): The result list given to `broadcast`.
+
+        Returns:
+            deferred (Deferred): Fires with the number of saved renders
+                when the broadcast is delivered.
+
+        """
+        deferred = Deferred()
+        self.pending.append((broadcast, result, deferred))
+        if self.task is None:
+            self.task = self.cooperator.cooperate(self._work())
+            self.task.whenDone().addErrback(logger.log_trace)
+        return deferred
+
+    def _work(self):
+        """
+        Deliver the pending broadcasts in order.
+
+        """
+        try:
+            while self.pending:
+                broadcast, result, deferred = self.pending[0]
+                try:
+                    for _ in broadcast:
+                        yield
+                except Exception:
+                    logger.log_trace()
+                self.pending.popleft()
+                deferred.callback(result[0] if result else None)
+        finally:
+            self.task = None
+
+
+_BROADCASTER = _Broadcaster()
+
+
+def send_emote(sender, receivers, emote, anonymous_add="first", chunked=False, **kwargs):
     """
     Main access function for distribute an emote.
 
@@ -505,79 +1371,39 @@ def send_emote(sender, receivers, emote, anonymous_add="first", **kwargs):
             - None: No auto-add at anonymous emote
             - 'last': Add sender to the end of emote as [sender]
             - 'first': Prepend sender to start of emote.
+        chunked (bool, optional): Deliver the emote in chunks of
+            receivers, yielding to the reactor between them. Use for
+            very large audiences. Chunked emotes are delivered in the
+            order they were sent, after the chunked emotes still
+            pending; an emote not chunked is delivered at once, and
+            may reach receivers before pending chunked ones.
+
+    Returns:
+        saved (int or None): The number of renders saved by sending the
+            same rendering to receivers seeing the emote identically, or
+            None if the emote could not be parsed.
+        deferred (Deferred): If `chunked`, a Deferred firing with that
+            number (or None) once delivered.
 
     """
+    # if anonymous_add is passed as a kwarg, collect and remove it from kwargs
+    if 'anonymous_add' in kwargs:
+        anonymous_add = kwargs.pop('anonymous_add')
     try:
-        emote, obj_mapping = parse_sdescs_and_recogs(sender, receivers, emote)
-        emote, language_mapping = parse_language(sender, emote)
+        template = parse_emote(sender, receivers, emote, anonymous_add=anonymous_add)
     except (EmoteError, LanguageError) as err:
         # handle all error messages, don't hide actual coding errors
         sender.msg(str(err))
-        return
-    # we escape the object mappings since we'll do the language ones first
-    # (the text could have nested object mappings).
-    emote = _RE_REF.sub(r"{{#\1}}", emote)
-    # if anonymous_add is passed as a kwarg, collect and remove it from kwargs
-    if 'anonymous_add' in kwargs:
-        anonymous_add = kwargs.pop('anonymous_add')
-    if anonymous_add and not "#%i" % sender.id in obj_mapping:
-        # no self-reference in the emote - add to the end
-        key = "#%i" % sender.id
-        obj_mapping[key] = sender
-        if anonymous_add == "first":
-            possessive = "" if emote.startswith("'") else " "
-            emote = "%s%s%s" % ("{{%s}}" % key, possessive, emote)
-        else:
-            emote = "%s [%s]" % (emote, "{{%s}}" % key)
+        return succeed(None) if chunked else None
 
     # broadcast emote to everyone
-    for receiver in receivers:
-        # first handle the language mapping, which always produce different keys ##nn
-        receiver_lang_mapping = {}
-        try:
-            process_language = receiver.process_language
-        except AttributeError:
-            process_language = _dummy_process
-        for key, (langname, saytext) in language_mapping.items():
-            # color says
-            receiver_lang_mapping[key] = process_language(saytext, sender, langname)
-        # map the language {##num} markers. This will convert the escaped sdesc markers on
-        # the form {{#num}} to {#num} markers ready to sdescmat in the next step.
-        sendemote = emote.format(**receiver_lang_mapping)
-
-        # handle sdesc mappings. we make a temporary copy that we can modify
-        try:
-            process_sdesc = receiver.process_sdesc
-        except AttributeError:
-            process_sdesc = _dummy_process
-
-        try:
-            process_recog = receiver.process_recog
-        except AttributeError:
-            process_recog = _dummy_process
-
-        try:
-            recog_get = receiver.recog.get
-            receiver_sdesc_mapping = dict(
-                (ref, process_recog(recog_get(obj), obj)) for ref, obj in obj_mapping.items()
-            )
-        except AttributeError:
-            receiver_sdesc_mapping = dict(
-                (
-                    ref,
-                    process_sdesc(obj.sdesc.get(), obj)
-                    if hasattr(obj, "sdesc")
-                    else process_sdesc(obj.key, obj),
-                )
-                for ref, obj in obj_mapping.items()
-            )
-        # make sure receiver always sees their real name
-        rkey = "#%i" % receiver.id
-        if rkey in receiver_sdesc_mapping:
-            receiver_sdesc_mapping[rkey] = process_sdesc(receiver.key, receiver)
-
-        # do the template replacement of the sdesc/recog {#num} markers
-        receiver.msg(sendemote.format(**receiver_sdesc_mapping), from_obj=sender, **kwargs)
+    result = []
+    broadcast = _broadcast(sender, list(receivers), template, kwargs, result)
+    if chunked:
+        return _BROADCASTER.add(broadcast, result)
+    for _ in broadcast:
+        pass
+    return result[0]
 
 
 # ------------------------------------------------------------
@@ -595,7 +1421,11 @@ class SdescHandler(object):
     The handler stores data in the following Attributes
 
         _sdesc   - a string
-        _regex  - an empty dictionary
+        _sdesc_regex  - the match pattern of the sdesc
+
+    The pattern is only compiled when the sdesc is first matched
+    against, and the compiled regex is shared with all objects having
+    the same pattern (see `intern_regex`).
 
     """
 
@@ -609,7 +1439,8 @@ class SdescHandler(object):
         """
         self.obj = obj
         self.sdesc = ""
-        self.sdesc_regex = ""
+        self._sdesc_regex = None
+        self.match_words = ()
         self._cache()
 
     def _cache(self):
@@ -618,8 +1449,17 @@ class SdescHandler(object):
 
         """
         self.sdesc = self.obj.attributes.get("_sdesc", default="")
-        sdesc_regex = self.obj.attributes.get("_sdesc_regex", default="")
-        self.sdesc_regex = re.compile(sdesc_regex, _RE_FLAGS)
+        self._sdesc_regex = None
+        self.match_words = _match_words(ansi.strip_ansi(self.sdesc))
+
+    @property
+    def sdesc_regex(self):
+        """
+        The compiled regex of the sdesc, compiled on first use.
+        """
+        if self._sdesc_regex is None:
+            self._sdesc_regex = intern_regex(self.obj.attributes.get("_sdesc_regex", default=""))
+        return self._sdesc_regex
 
     def add(self, sdesc, max_length=60):
         """
@@ -665,7 +1505,14 @@ class SdescHandler(object):
         self.obj.attributes.add("_sdesc_regex", sdesc_regex)
         # local caching
         self.sdesc = sdesc
-        self.sdesc_regex = re.compile(sdesc_regex, _RE_FLAGS)
+        self._sdesc_regex = compile_ordered_permutation_regex(cleaned_sdesc)
+        self.match_words = _match_words(cleaned_sdesc)
+
+        # re-index us in our location
+        location = self.obj.location
+        if location and hasattr(location, "match_index"):
+            location.match_index.add(self.obj)
+        touch_appearance(self.obj)
 
         return sdesc
 
@@ -693,41 +1540,100 @@ class RecogHandler(object):
     This handler manages the recognition mapping
     of an Object.
 
-    The handler stores data in Attributes as dictionaries of
-    the following names:
+    The handler stores one Attribute of category "recog" per
+    recognized object, with the object's dbref number as key and
+    a tuple (recog, cleaned recog) as value. Loading it never
+    fetches the recognized objects, and regexes are compiled
+    on first use.
+
+    Older versions stored the recogs in the dictionaries
+    `_recog_ref2recog`, `_recog_obj2recog` and `_recog_obj2regex`;
+    these are migrated when the handler loads.
+
+    """
+
+    def __init__(self, obj):
+        """
+        Initialize the handler
+
+        Args:
+            obj (Object): The entity on which this handler is stored.
+
+        """
+        self.obj = obj
+        # mapping {dbid: (recog, cleaned_recog)}
+        self.recogs = {}
+        self._regexes = {}
+        self._trie = None
+        self._cache()
+
+    def _cache(self):
+        """
+        Load data to handler cache
+        """
+        if self.obj.attributes.has("_recog_obj2recog"):
+            self._migrate()
+        self.recogs = dict(
+            (int(attr.key), tuple(attr.value))
+            for attr in self.obj.attributes.get(category="recog", return_obj=True, return_list=True)
+        )
+        self._regexes = {}
+        self._trie = None
+
+    def _migrate(self):
+        """
+        Move recogs stored in the old three-dictionary layout to the
+        per-object Attributes.
+        """
+        obj2recog = self.obj.attributes.get("_recog_obj2recog", default={})
+        for obj, recog in obj2recog.items():
+            if obj:
+                self.obj.attributes.add(
+                    str(obj.id), (recog, ansi.strip_ansi(recog)), category="recog"
+                )
+        for attrname in ("_recog_ref2recog", "_recog_obj2recog", "_recog_obj2regex"):
+            self.obj.attributes.remove(attrname)
+
+    @property
+    def trie(self):
+        """
+        The MatchTrie of the recogs, built on first use.
+        """
+        if self._trie is None:
+            self._trie = MatchTrie()
+            for dbid, (recog, cleaned_recog) in self.recogs.items():
+                self._trie.add((_MATCH_RECOG, dbid), _match_words(cleaned_recog))
+        return self._trie
+
+    def get_regex(self, obj):
+        """
+        Get the compiled regex of the recog of an object.
+
+        Args:
+            obj (Object): The recognized object.
 
-        _recog_ref2recog
-        _recog_obj2recog
-        _recog_obj2regex
+        Returns:
+            regex (Regex or None): The regex, if `obj` is recognized.
 
-    """
+        """
+        if obj.id not in self._regexes:
+            if obj.id not in self.recogs:
+                return None
+            self._regexes[obj.id] = compile_ordered_permutation_regex(self.recogs[obj.id][1])
+        return self._regexes[obj.id]
 
-    def __init__(self, obj):
+    def has(self, obj):
         """
-        Initialize the handler
+        Check if an object is recognized.
 
         Args:
-            obj (Object): The entity on which this handler is stored.
+            obj (Object): The object to check.
 
-        """
-        self.obj = obj
-        # mappings
-        self.ref2recog = {}
-        self.obj2regex = {}
-        self.obj2recog = {}
-        self._cache()
+        Returns:
+            recognized (bool): If `obj` has a recog, ignoring locks.
 
-    def _cache(self):
         """
-        Load data to handler cache
-        """
-        self.ref2recog = self.obj.attributes.get("_recog_ref2recog", default={})
-        obj2regex = self.obj.attributes.get("_recog_obj2regex", default={})
-        obj2recog = self.obj.attributes.get("_recog_obj2recog", default={})
-        self.obj2regex = dict(
-            (obj, re.compile(regex, _RE_FLAGS)) for obj, regex in obj2regex.items() if obj
-        )
-        self.obj2recog = dict((obj, recog) for obj, recog in obj2recog.items() if obj)
+        return obj.id in self.recogs
 
     def add(self, obj, recog, max_length=60):
         """
@@ -773,16 +1679,13 @@ class RecogHandler(object):
                 % (max_length, len(cleaned_recog))
             )
 
-        # mapping #dbref:obj
-        key = "#%i" % obj.id
-        self.obj.attributes.get("_recog_ref2recog", default={})[key] = recog
-        self.obj.attributes.get("_recog_obj2recog", default={})[obj] = recog
-        regex = ordered_permutation_regex(cleaned_recog)
-        self.obj.attributes.get("_recog_obj2regex", default={})[obj] = regex
+        self.obj.attributes.add(str(obj.id), (recog, cleaned_recog), category="recog")
         # local caching
-        self.ref2recog[key] = recog
-        self.obj2recog[obj] = recog
-        self.obj2regex[obj] = re.compile(regex, _RE_FLAGS)
+        self.recogs[obj.id] = (recog, cleaned_recog)
+        self._regexes.pop(obj.id, None)
+        if self._trie is not None:
+            self._trie.add((_MATCH_RECOG, obj.id), _match_words(cleaned_recog))
+        self.obj.ndb._recog_version = next(_APPEARANCE_VERSIONS)
         return recog
 
     def get(self, obj):
@@ -804,7 +1707,9 @@ class RecogHandler(object):
             # check an eventual recog_masked lock on the object
             # to avoid revealing masked characters. If lock
             # does not exist, pass automatically.
-            return self.obj2recog.get(obj, obj.sdesc.get() if hasattr(obj, "sdesc") else obj.key)
+            if obj.id in self.recogs:
+                return self.recogs[obj.id][0]
+            return obj.sdesc.get() if hasattr(obj, "sdesc") else obj.key
         else:
             # recog_mask log not passed, disable recog
             return obj.sdesc.get() if hasattr(obj, "sdesc") else obj.key
@@ -815,9 +1720,15 @@ class RecogHandler(object):
 
         Returns:
             recogs (dict): A mapping of {recog: obj} stored in handler.
+                Recogs of objects no longer existing are left out.
 
         """
-        return {self.obj2recog[obj]: obj for obj in self.obj2recog.keys()}
+        recogs = {}
+        for dbid, (recog, cleaned_recog) in self.recogs.items():
+            obj = ObjectDB.objects.get_id(dbid)
+            if obj:
+                recogs[recog] = obj
+        return recogs
 
     def remove(self, obj):
         """
@@ -826,22 +1737,340 @@ class RecogHandler(object):
         Args:
             obj (Object): The object for which to remove recog.
         """
-        if obj in self.obj2recog:
-            del self.obj.db._recog_obj2recog[obj]
-            del self.obj.db._recog_obj2regex[obj]
-            del self.obj.db._recog_ref2recog["#%i" % obj.id]
-        self._cache()
+        if obj.id in self.recogs:
+            self.obj.attributes.remove(str(obj.id), category="recog")
+            del self.recogs[obj.id]
+            self._regexes.pop(obj.id, None)
+            if self._trie is not None:
+                self._trie.remove((_MATCH_RECOG, obj.id))
+        self.obj.ndb._recog_version = next(_APPEARANCE_VERSIONS)
 
     def get_regex_tuple(self, obj):
         """
         Returns:
             rec (tuple): Tuple (recog_regex, obj, recog)
         """
-        if obj in self.obj2recog and obj.access(self.obj, "enable_recog", default=True):
-            return self.obj2regex[obj], obj, self.obj2regex[obj]
+        if obj.id in self.recogs and obj.access(self.obj, "enable_recog", default=True):
+            regex = self.get_regex(obj)
+            return regex, obj, regex
         return None
 
 
+class MatchIndexHandler(object):
+    """
+    This handler keeps a `MatchTrie` over the sdescs and keys/aliases
+    of everything located inside an object (usually a room), so that
+    emote references can be resolved without trying every candidate.
+
+    The index is only kept in memory. It is built the first time it
+    is synced and then updated incrementally as objects enter or leave
+    and when their sdesc changes. Renamed objects and objects whose
+    aliases change are marked with `touch` and re-indexed at the next
+    `sync`, which also catches objects moved in or out without the move
+    hooks (by setting `location`). Otherwise `sync` only compares the
+    dbids of the contents and re-indexes nothing.
+
+    """
+
+    def __init__(self, obj):
+        """
+        Initialize the handler
+
+        Args:
+            obj (Object): The entity on which this handler is stored.
+
+        """
+        self.obj = obj
+        self.trie = MatchTrie()
+        # mapping dbid:entries of everything indexed
+        self.entries = {}
+        # dbids to re-index at the next sync
+        self.stale = set()
+        self.built = False
+
+    def add(self, obj):
+        """
+        Index (or re-index) an object located in our object.
+
+        Args:
+            obj (Object): The object to index.
+
+        """
+        if not self.built:
+            # the first sync will pick it up
+            return
+        entries = _match_entries(obj)
+        if self.entries.get(obj.id) == entries:
+            return
+        self.remove(obj)
+        for ref, words in entries:
+            self.trie.add(ref, words)
+        self.entries[obj.id] = entries
+
+    def remove(self, obj):
+        """
+        Remove an object from the index.
+
+        Args:
+            obj (Object or int): The object (or its dbid) to remove.
+
+        """
+        dbid = obj if isinstance(obj, int) else obj.id
+        for ref, _ in self.entries.pop(dbid, ()):
+            self.trie.remove(ref)
+
+    def touch(self, obj):
+        """
+        Mark an object to be re-indexed at the next sync, for changes
+        without a hook of their own (renames, aliases).
+
+        Args:
+            obj (Object): The object changed.
+
+        """
+        if self.built:
+            self.stale.add(obj.id)
+
+    def sync(self):
+        """
+        Make sure the index matches the current contents.
+
+        """
+        contents = self.obj.contents
+        dbids = set(obj.id for obj in contents)
+        if self.built and not self.stale and dbids == self.entries.keys():
+            return
+        self.built = True
+        for obj in contents:
+            if obj.id in self.stale or obj.id not in self.entries:
+                self.add(obj)
+        for dbid in set(self.entries) - dbids:
+            self.remove(dbid)
+        self.stale.clear()
+
+
+def _touch_match_index(obj):
+    """
+    Mark an object to be re-indexed in the match index of its location.
+
+    """
+    location = getattr(obj, "location", None)
+    if location is not None and hasattr(location, "match_index"):
+        location.match_index.touch(obj)
+
+
+def _touch_object(obj):
+    """
+    Mark everything cached about how an object looks as changed: its
+    match index entries, its appearance and how it sees others.
+
+    """
+    _touch_match_index(obj)
+    touch_appearance(obj)
+    obj.ndb._looker_version = next(_APPEARANCE_VERSIONS)
+
+
+def _at_object_saved(sender, instance, update_fields=None, **kwargs):
+    """
+    Catch objects renamed or with their locks changed (the field saved
+    on its own).
+
+    """
+    if update_fields and isinstance(instance, ObjectDB):
+        if "db_key" in update_fields or "db_lock_storage" in update_fields:
+            _touch_object(instance)
+
+
+def _at_object_tags_changed(sender, instance, action, **kwargs):
+    """
+    Catch the aliases or permissions of objects changed (they are tags).
+
+    """
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(instance, ObjectDB):
+        _touch_object(instance)
+
+
+post_save.connect(_at_object_saved, dispatch_uid="aurpg_object_saved")
+m2m_changed.connect(_at_object_tags_changed, sender=ObjectDB.db_tags.through, dispatch_uid="aurpg_object_tags")
+
+
+def comprehension_level(speaker_skill, listener_skill):
+    """
+    Get how much of a say is lost between a speaker and a listener, as
+    the obfuscation level of `obfuscate_language`. Nobody understands
+    better than the speaker speaks, so the lowest skill decides.
+
+    Args:
+        speaker_skill (int): The speaker's skill in the language, 0-100.
+        listener_skill (int): The listener's skill in the language, 0-100.
+
+    Returns:
+        level (float): From 0.0 (all understood) to 1.0 (nothing
+            understood), in steps of 0.1.
+
+    """
+    skill = max(0, min(speaker_skill, listener_skill, 100))
+    return round(1.0 - skill / 100.0, 1)
+
+
+def _language_skill(obj, language):
+    """
+    Get the language skill of anything speaking or listening. Objects
+    without language skills understand everything.
+
+    """
+    get_language_skill = getattr(obj, "get_language_skill", None)
+    return get_language_skill(language) if get_language_skill else 100
+
+
+class ComprehensionHandler(object):
+    """
+    This handler keeps how well everyone inside an object (usually a
+    room) understands everyone else there, per language, so a say in a
+    crowded room does not work it out again for every listener.
+
+    The matrix is only kept in memory, with a row per speaker and
+    language, built the first time that speaker is heard in it. Rows
+    are updated incrementally as characters enter or leave and when
+    their language skills change. Everyone with a `get_language_skill`
+    method takes part.
+
+    """
+
+    def __init__(self, obj):
+        """
+        Initialize the handler
+
+        Args:
+            obj (Object): The entity on which this handler is stored.
+
+        """
+        self.obj = obj
+        # mapping {language: {speaker dbid: (skill, {listener dbid: level})}}
+        self.rows = {}
+        # the translations of the last say, (key, {level: text})
+        self.last = None
+
+    def row(self, speaker, language):
+        """
+        Get the levels at which everyone here understands a speaker.
+
+        Args:
+            speaker (Object): The one speaking.
+            language (str): The language spoken.
+
+        Returns:
+            levels (dict): Mapping `{listener dbid: level}`.
+
+        """
+        rows = self.rows.setdefault(language, {})
+        if speaker.id in rows:
+            return rows[speaker.id][1]
+        skill = _language_skill(speaker, language)
+        levels = dict(
+            (obj.id, 0.0 if obj == speaker else comprehension_level(skill, obj.get_language_skill(language)))
+            for obj in self.obj.contents
+            if hasattr(obj, "get_language_skill")
+        )
+        if speaker.location == self.obj:
+            # the speaker's skills are only followed while here
+            rows[speaker.id] = (skill, levels)
+        return levels
+
+    def get_level(self, speaker, listener, language):
+        """
+        Get how much of a say a listener loses.
+
+        Args:
+            speaker (Object): The one speaking.
+            listener (Object): The one listening.
+            language (str): The language spoken.
+
+        Returns:
+            level (float): The obfuscation level, see `comprehension_level`.
+
+        """
+        if speaker == listener:
+            return 0.0
+        level = self.row(speaker, language).get(listener.id)
+        if level is None:
+            # not listening from in here
+            level = comprehension_level(
+                _language_skill(speaker, language), _language_skill(listener, language)
+            )
+        return level
+
+    def translate(self, text, speaker, listener, language):
+        """
+        Obfuscate a say as a listener hears it. The say is translated
+        once, at all the levels it is heard at here, and the result is
+        kept for the next listener.
+
+        Args:
+            text (str): What is said.
+            speaker (Object): The one speaking.
+            listener (Object): The one listening.
+            language (str): The language spoken.
+
+        Returns:
+            text (str): The say as heard by `listener`.
+
+        """
+        level = self.get_level(speaker, listener, language)
+        if not level:
+            return text
+        key = (speaker.id, language, text)
+        if self.last is None or self.last[0] != key or level not in self.last[1]:
+            levels = set(self.row(speaker, language).values())
+            levels.add(level)
+            levels.discard(0.0)
+            self.last = (key, obfuscate_language_many(text, levels, language=language))
+        return self.last[1][level]
+
+    def add(self, obj):
+        """
+        Add a listener to the rows built so far.
+
+        Args:
+            obj (Object): The object entering.
+
+        """
+        if not hasattr(obj, "get_language_skill"):
+            return
+        for language, rows in self.rows.items():
+            skill = obj.get_language_skill(language)
+            for dbid, (speaker_skill, levels) in rows.items():
+                levels[obj.id] = 0.0 if dbid == obj.id else comprehension_level(speaker_skill, skill)
+        self.last = None
+
+    def remove(self, obj):
+        """
+        Remove a speaker and listener from the matrix.
+
+        Args:
+            obj (Object or int): The object (or its dbid) to remove.
+
+        """
+        dbid = obj if isinstance(obj, int) else obj.id
+        for rows in self.rows.values():
+            rows.pop(dbid, None)
+            for _, levels in rows.values():
+                levels.pop(dbid, None)
+        self.last = None
+
+    def update(self, obj):
+        """
+        Update the matrix after the language skills of an object changed.
+
+        Args:
+            obj (Object): The object whose skills changed.
+
+        """
+        self.remove(obj)
+        if obj.location == self.obj:
+            self.add(obj)
+
+
 # ------------------------------------------------------------
 # RP Commands
 # ------------------------------------------------------------
@@ -1036,6 +2265,7 @@ class CmdPose(RPCommand):  # set current pose and default pose
         if self.reset:
             pose = target.db.pose_default
             target.db.pose = pose
+            touch_appearance(target)
         elif self.default:
             target.db.pose_default = pose
             caller.msg("Default pose is now '%s %s'." % (target_name, pose))
@@ -1043,17 +2273,20 @@ class CmdPose(RPCommand):  # set current pose and default pose
         else:
             # set the pose. We do one-time ref->sdesc mapping here.
             parsed, mapping = parse_sdescs_and_recogs(caller, caller.location.contents, pose)
-            mapping = dict(
-                (ref, obj.sdesc.get() if hasattr(obj, "sdesc") else obj.key)
-                for ref, obj in mapping.items()
+            template = EmoteTemplate.from_string(parsed, mapping)
+            pose = template.render(
+                dict(
+                    (ref, obj.sdesc.get() if hasattr(obj, "sdesc") else obj.key)
+                    for ref, obj in mapping.items()
+                )
             )
-            pose = parsed.format(**mapping)
 
             if len(target_name) + len(pose) > 60:
                 caller.msg("Your pose '%s' is too long." % pose)
                 return
 
             target.db.pose = pose
+            touch_appearance(target)
 
         caller.msg("Pose will read '%s %s'." % (target_name, pose))
 
@@ -1215,6 +2448,59 @@ class CmdMask(RPCommand):
             caller.msg("You remove your mask and are again '%s'." % old_sdesc)
 
 
+class CmdEmoteProfile(RPCommand):
+    """
+    Profile the emote system
+
+    Usage:
+      emoteprofile
+      emoteprofile on|off|reset
+
+    Shows the time spent in each phase of parsing and sending emotes,
+    in milliseconds, with the mean number of candidates, says or
+    receivers handled per call. Profiling is off by default; turn it
+    on to start collecting samples and reset to forget them.
+
+    """
+
+    key = "emoteprofile"
+    locks = "cmd:perm(Builder)"
+
+    def func(self):
+        caller = self.caller
+        if self.args == "on":
+            _EMOTE_PROFILER.enabled = True
+            caller.msg("Emote profiling is on.")
+        elif self.args == "off":
+            _EMOTE_PROFILER.enabled = False
+            caller.msg("Emote profiling is off.")
+        elif self.args == "reset":
+            _EMOTE_PROFILER.reset()
+            caller.msg("Emote profiling samples were reset.")
+        elif self.args:
+            caller.msg("Usage: emoteprofile [on|off|reset]")
+        else:
+            stats = _EMOTE_PROFILER.stats()
+            lines = [
+                "Emote profiling is %s." % ("on" if _EMOTE_PROFILER.enabled else "off"),
+                "%-11s %7s %9s %9s %9s %7s" % ("phase", "count", "p50", "p95", "p99", "size"),
+            ]
+            for phase in ("candidates", "markers", "language", "obfuscate", "render", "msg"):
+                if phase in stats:
+                    lines.append(
+                        "%-11s %7i %9.3f %9.3f %9.3f %7.1f"
+                        % (
+                            phase,
+                            stats[phase]["count"],
+                            stats[phase]["p50"],
+                            stats[phase]["p95"],
+                            stats[phase]["p99"],
+                            stats[phase]["size"],
+                        )
+                    )
+            caller.msg("\n".join(lines))
+
+
 class RPSystemCmdSet(CmdSet):
     """
     Mix-in for adding rp-commands to default cmdset.
@@ -1227,6 +2513,88 @@ class RPSystemCmdSet(CmdSet):
         self.add(CmdPose())
         self.add(CmdRecog())
         self.add(CmdMask())
+        self.add(CmdEmoteProfile())
+
+
+# Version stamps of what return_appearance renders. Stamps are unique for
+# the process, so a stamp lost with the ndb of an object flushed from the
+# idmapper cache can never match an old render.
+_APPEARANCE_VERSIONS = count()
+
+# {(obj.id, looker.id): (version, appearance)}, in LRU order
+_APPEARANCE_CACHE = OrderedDict()
+
+
+def _version_stamp(obj, attrname):
+    """
+    Get a version stamp stored on obj.ndb, creating it if needed.
+
+    """
+    stamp = getattr(obj.ndb, attrname)
+    if stamp is None:
+        stamp = next(_APPEARANCE_VERSIONS)
+        setattr(obj.ndb, attrname, stamp)
+    return stamp
+
+
+def touch_appearance(obj):
+    """
+    Mark the appearance of an object as changed, so looks at it or at
+    its location are rendered anew. This is called when contents,
+    sdescs, poses, keys, aliases, locks and permissions change; call it
+    after changing anything else shown by `return_appearance`.
+
+    Args:
+        obj (Object): The changed object.
+
+    """
+    for target in (obj, obj.location):
+        if target is not None:
+            target.ndb._appearance_version = next(_APPEARANCE_VERSIONS)
+
+
+def filter_search_candidates(candidates, typeclass=None, attribute_name=None):
+    """
+    Filter the candidates matched by sdesc/recog in memory, the way
+    `ObjectDB.objects.object_search` would filter them when searching
+    for each candidate's key among them.
+
+    Args:
+        candidates (list): The matched candidates.
+        typeclass (str or Typeclass, or list of either, optional): Only
+            keep objects with one of these typeclasses.
+        attribute_name (str, optional): Only keep objects whose database
+            field (or, if no object has it set to a candidate key, the
+            Attribute) with this name equals the key of a candidate.
+
+    Returns:
+        results (list): The filtered candidates, in order and unique.
+
+    """
+    if typeclass:
+        paths = set(tc if isinstance(tc, str) else tc.path for tc in make_iter(typeclass))
+        candidates = [obj for obj in candidates if obj.typeclass_path in paths]
+    if attribute_name:
+        keys = set(obj.key for obj in candidates)
+        field = attribute_name if attribute_name.startswith("db_") else "db_%s" % attribute_name
+        matches = [obj for obj in candidates if getattr(obj, field, None) in keys]
+        # keys with no field match are looked for among the Attributes
+        # (as a list, since Attribute values need not be hashable)
+        keys = list(keys.difference(getattr(obj, field) for obj in matches))
+        matched = set(obj.id for obj in matches)
+        matched.update(
+            obj.id
+            for obj in candidates
+            if obj.id not in matched and keys and obj.attributes.get(attribute_name) in keys
+        )
+        candidates = [obj for obj in candidates if obj.id in matched]
+    results = []
+    seen = set()
+    for obj in candidates:
+        if obj.id not in seen:
+            seen.add(obj.id)
+            results.append(obj)
+    return results
 
 
 # ------------------------------------------------------------
@@ -1250,6 +2618,51 @@ class AURPGRPObject(DefaultObject):
         self.db.pose = ""
         self.db.pose_default = "is here."
 
+    @lazy_property
+    def match_index(self):
+        return MatchIndexHandler(self)
+
+    @lazy_property
+    def comprehension(self):
+        return ComprehensionHandler(self)
+
+    def at_init(self):
+        """
+        Called when the object is loaded into the idmapper cache.
+        Warms the key/alias match data of objects referenced by key.
+        """
+        super().at_init()
+        if not (hasattr(type(self), "recog") and hasattr(type(self), "sdesc")):
+            _key_alias_cache(self)
+
+    def at_object_receive(self, moved_obj, source_location, **kwargs):
+        """
+        Called after an object has been moved into this object.
+
+        Args:
+            moved_obj (Object): The object moved into this one.
+            source_location (Object): Where `moved_obj` came from.
+
+        """
+        super().at_object_receive(moved_obj, source_location, **kwargs)
+        self.match_index.add(moved_obj)
+        self.comprehension.add(moved_obj)
+        touch_appearance(self)
+
+    def at_object_leave(self, moved_obj, target_location, **kwargs):
+        """
+        Called just before an object leaves from inside this object.
+
+        Args:
+            moved_obj (Object): The object leaving.
+            target_location (Object): Where `moved_obj` is going.
+
+        """
+        super().at_object_leave(moved_obj, target_location, **kwargs)
+        self.match_index.remove(moved_obj)
+        self.comprehension.remove(moved_obj)
+        touch_appearance(self)
+
     def search(
         self,
         searchdata,
@@ -1394,14 +2807,12 @@ class AURPGRPObject(DefaultObject):
             candidates = parse_sdescs_and_recogs(
                 self, candidates, _PREFIX + searchdata, search_mode=True
             )
-            results = []
-            for candidate in candidates:
-                # we search by candidate keys here; this allows full error
-                # management and use of all kwargs - we will use searchdata
-                # in eventual error reporting later (not their keys). Doing
-                # it like this e.g. allows for use of the typeclass kwarg
-                # limiter.
-                results.extend([obj for obj in search_obj(candidate.key) if obj not in results])
+            # the matched candidates are filtered in memory by the typeclass
+            # and attribute limiters - we will use searchdata in eventual
+            # error reporting later (not their keys).
+            results = filter_search_candidates(
+                candidates, typeclass=typeclass, attribute_name=attribute_name
+            )
 
             if not results and is_builder:
                 # builders get a chance to search only by key+alias
@@ -1462,9 +2873,46 @@ class AURPGRPObject(DefaultObject):
 
         Args:
             looker (Object): Object doing the looking.
+
+        Notes:
+            The description is cached per looker until our contents,
+            their sdescs, poses, keys or locks, the looker's recogs,
+            locks or permissions or our desc change (see
+            `touch_appearance`).
+
         """
         if not looker:
             return ""
+        if not isinstance(looker, ObjectDB):
+            return self._render_appearance(looker)
+        key = (self.id, looker.id)
+        version = (
+            _version_stamp(self, "_appearance_version"),
+            _version_stamp(looker, "_recog_version"),
+            _version_stamp(looker, "_looker_version"),
+            self.db.desc,
+            # objects moved in or out by setting their location
+            tuple(con.id for con in self.contents),
+        )
+        cached = _APPEARANCE_CACHE.get(key)
+        if cached and cached[0] == version:
+            _APPEARANCE_CACHE.move_to_end(key)
+            return cached[1]
+        string = self._render_appearance(looker)
+        _APPEARANCE_CACHE[key] = (version, string)
+        _APPEARANCE_CACHE.move_to_end(key)
+        if len(_APPEARANCE_CACHE) > _APPEARANCE_CACHE_SIZE:
+            _APPEARANCE_CACHE.popitem(last=False)
+        return string
+
+    def _render_appearance(self, looker):
+        """
+        Build the description returned by `return_appearance`.
+
+        Args:
+            looker (Object): Object doing the looking.
+
+        """
         # get and identify all objects
         visible = (con for con in self.contents if con != looker and con.access(looker, "view"))
         exits, users, things = [], [], []
@@ -1553,14 +3001,28 @@ class AURPGRPCharacter(DefaultCharacter, AURPGRPObject):
         self.db._sdesc = ""
         self.db._sdesc_regex = ""
 
-        self.db._recog_ref2recog = {}
-        self.db._recog_obj2regex = {}
-        self.db._recog_obj2recog = {}
-
         self.cmdset.add(RPSystemCmdSet, permanent=True)
         # initializing sdesc
         self.sdesc.add("A normal person")
 
+    def at_post_puppet(self, **kwargs):
+        """
+        Called just after puppeting has been completed. Players are
+        listed apart in room descriptions.
+
+        """
+        super().at_post_puppet(**kwargs)
+        touch_appearance(self)
+
+    def at_post_unpuppet(self, account, session=None, **kwargs):
+        """
+        Called just after the Character was unpuppeted. Players are
+        listed apart in room descriptions.
+
+        """
+        super().at_post_unpuppet(account, session=session, **kwargs)
+        touch_appearance(self)
+
     def at_before_say(self, message, **kwargs):
         """
         Called before the object says or whispers anything, return modified message.
@@ -1627,9 +3089,48 @@ class AURPGRPCharacter(DefaultCharacter, AURPGRPObject):
             text (str): The optionally processed text.
 
         Notes:
-            This is designed to work together with a string obfuscator
-            such as the `obfuscate_language` or `obfuscate_whisper` in
-            the evennia.AURPG.rplanguage module.
+            Says in a language are obfuscated with `obfuscate_language`
+            of the AU_RPGLanguages module, at the level looked up in the
+            comprehension matrix of the room.
 
         """
+        location = self.location
+        if language and hasattr(location, "comprehension"):
+            text = location.comprehension.translate(text, speaker, self, language)
         return "%s|w%s|n" % ("|W(%s)" % language if language else "", text)
+
+    def get_language_bucket(self, speaker, language, **kwargs):
+        """
+        Get how well you understand the speaker in a language. Receivers
+        of the same class getting the same bucket for every language in
+        an emote are sent the same rendering of it, so `process_language`
+        must give the same result within a bucket.
+
+        Args:
+            speaker (Object): The object delivering the text.
+            language (str): An identifier string for the language.
+
+        Returns:
+            bucket (hashable): The obfuscation level of the say, from
+                the comprehension matrix of the room.
+
+        """
+        location = self.location
+        if language and hasattr(location, "comprehension"):
+            return location.comprehension.get_level(speaker, self, language)
+        return 0.0
+
+    def get_language_skill(self, language, **kwargs):
+        """
+        Get how well you know a language. Call `update` on the
+        `comprehension` handler of your location when this changes.
+
+        Args:
+            language (str): An identifier string for the language.
+
+        Returns:
+            skill (int): From 0 (unknown) to 100 (fluent). By default
+                every language is fluent.
+
+        """
+        return 100
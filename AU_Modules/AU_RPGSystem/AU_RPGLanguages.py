@@ -49,6 +49,10 @@ Usage:
     result = rplanguage.obfuscate_whisper(whisper, level=1.0)
     <<< "..."
 
+    # everyone overhearing, each at their own level
+    result = rplanguage.obfuscate_whisper_many(whisper, [(bob, 0.2), (tom, 0.5)])
+    <<< {bob: "This is m- whisp-ring", tom: "---s -s -- ---s------"}
+
     ```
 
     To set up new languages, import and use the `add_language()`
@@ -91,12 +95,39 @@ Usage:
     This allows to quickly build a large corpus of translated words
     that never change (if this is desired).
 
+    Large word lists are better kept in a `lexicon` file, looked up a
+    word at a time instead of stored with the language. Give its path
+    together with `auto_translations` to build it, or build it offline
+    with the AU_RPGLexicon module.
+
+    Other words are made up when spoken and remembered in a bounded
+    cache, so a word keeps looking the same for a while. Set
+    `seeded_words=True` to make them up from the word itself, so they
+    also stay the same across reloads without being stored.
+
 """
+import os
 import re
-from random import choice, randint
-from collections import defaultdict
+import zlib
+import string
+from random import Random, choice, randint
+from threading import Lock
+from types import MappingProxyType
+from collections import OrderedDict
 from evennia import DefaultScript
 from evennia.utils import logger
+from evennia.utils.utils import get_game_dir_path
+
+from AU_Modules.AU_RPGSystem.AU_RPGLexicon import (
+    _GRAMMAR,
+    _PHONEMES,
+    _VOWELS,
+    AURPGLexicon,
+    build_lexicon,
+    compile_grammar,
+    make_auto_word,
+    read_words,
+)
 
 
 # ------------------------------------------------------------
@@ -105,21 +136,19 @@ from evennia.utils import logger
 #
 # ------------------------------------------------------------
 
-# default language grammar
-_PHONEMES = (
-    "ea oh ae aa eh ah ao aw ai er ey ow ia ih iy oy ua uh uw a e i u y p b t d f v t dh "
-    "s z sh zh ch jh k ng g m n l r w"
-)
-_VOWELS = "eaoiuy"
-# these must be able to be constructed from phonemes (so for example,
-# if you have v here, there must exist at least one single-character
-# vowel phoneme defined above)
-_GRAMMAR = "v cv vc cvv vcc vcv cvcc vccv cvccv cvcvcc cvccvcv vccvccvc cvcvccvv cvcvcvcvv"
-
 _RE_FLAGS = re.MULTILINE + re.IGNORECASE + re.DOTALL + re.UNICODE
 _RE_GRAMMAR = re.compile(r"vv|cc|v|c", _RE_FLAGS)
 _RE_WORD = re.compile(r"\w+", _RE_FLAGS)
-_RE_EXTRA_CHARS = re.compile(r"\s+(?=\W)|[,.?;](?=[,.?;]|\s+[,.?;])", _RE_FLAGS)
+# words, and the {#dbref}/{##n} markers of emotes, kept as they are
+_RE_WORD_OR_REF = re.compile(r"\{+\#+[0-9]+\}+|\w+", _RE_FLAGS)
+_RE_REF = re.compile(r"\{+\#+[0-9]+\}+", _RE_FLAGS)
+# punctuation not repeated in a translated text
+_EXTRA_PUNCTUATION = ",.?;"
+
+# The max number of made-up words remembered per language. A word keeps
+# its made-up translation until it is the least recently used one when
+# the cache is full.
+_WORD_CACHE_SIZE = 10000
 
 
 class AURPGLanguageError(RuntimeError):
@@ -130,6 +159,474 @@ class AURPGLanguageExistsError(AURPGLanguageError):
     pass
 
 
+class AURPGWordCache(object):
+    """
+    A bounded LRU cache of the words made up for a language, with
+    hit/miss counters. It is safe to use from several threads.
+
+    """
+
+    def __init__(self, maxsize=_WORD_CACHE_SIZE):
+        """
+        Args:
+            maxsize (int, optional): The max number of words kept.
+
+        """
+        self.maxsize = maxsize
+        self.words = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def get(self, word):
+        """
+        Get the made-up translation of a word.
+
+        Args:
+            word (str): The lowercase word.
+
+        Returns:
+            new_word (str or None): The translation, if cached.
+
+        """
+        with self.lock:
+            new_word = self.words.get(word)
+            if new_word is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.words.move_to_end(word)
+            return new_word
+
+    def add(self, word, new_word):
+        """
+        Remember the made-up translation of a word.
+
+        Args:
+            word (str): The lowercase word.
+            new_word (str): Its translation.
+
+        """
+        with self.lock:
+            self.words[word] = new_word
+            self.words.move_to_end(word)
+            while len(self.words) > self.maxsize:
+                self.words.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            stats (dict): The size, maxsize, hits, misses, evictions and
+                hit_rate (0.0-1.0) of the cache.
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.words),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": float(self.hits) / lookups if lookups else 0.0,
+        }
+
+
+def lexicon_path(path):
+    """
+    Find the file of a lexicon.
+
+    Args:
+        path (str): The lexicon path stored with the language.
+
+    Returns:
+        path (str): The path, relative to the game dir unless absolute.
+
+    """
+    return os.path.join(get_game_dir_path(), path)
+
+
+class AURPGLanguageModel(object):
+    """
+    The compiled, read-only form of a language stored by the
+    `AURPGLanguageHandler`. Models are built once from storage and
+    shared by all translations, which only read them. The only thing
+    changing is the `word_cache` of made-up words.
+
+    """
+
+    __slots__ = (
+        "key",
+        "translation",
+        "grammar",
+        "grammar_lengths",
+        "structures",
+        "grammar2phonemes",
+        "word_length_variance",
+        "noun_translate",
+        "noun_prefix",
+        "noun_postfix",
+        "seeded_words",
+        "word_cache",
+        "lexicon",
+    )
+
+    def __init__(self, key, storage):
+        """
+        Args:
+            key (str): The name of the language.
+            storage (dict): The language data as stored by
+                `AURPGLanguageHandler.add`.
+
+        """
+        grammar = dict(
+            (int(length), tuple(structures)) for length, structures in storage["grammar"].items()
+        )
+        init = object.__setattr__
+        init(self, "key", key)
+        init(self, "translation", MappingProxyType(dict(storage["translation"])))
+        init(self, "grammar", MappingProxyType(grammar))
+        init(self, "grammar_lengths", tuple(grammar))
+        # every structure pre-split into its base phonemes (c, v, cc, vv)
+        init(
+            self,
+            "structures",
+            MappingProxyType(
+                dict(
+                    (structure, tuple(match.group() for match in _RE_GRAMMAR.finditer(structure)))
+                    for structures in grammar.values()
+                    for structure in structures
+                )
+            ),
+        )
+        init(
+            self,
+            "grammar2phonemes",
+            MappingProxyType(
+                dict((gram, tuple(phonemes)) for gram, phonemes in storage["grammar2phonemes"].items())
+            ),
+        )
+        init(self, "word_length_variance", storage["word_length_variance"])
+        init(self, "noun_translate", storage.get("noun_translate", False))
+        init(self, "noun_prefix", storage["noun_prefix"])
+        init(self, "noun_postfix", storage["noun_postfix"])
+        init(self, "seeded_words", storage.get("seeded_words", False))
+        init(self, "word_cache", AURPGWordCache())
+        lexicon = storage.get("lexicon")
+        init(
+            self,
+            "lexicon",
+            AURPGLexicon(lexicon_path(lexicon), on_error=self._lexicon_error) if lexicon else None,
+        )
+
+    def _lexicon_error(self, err):
+        """
+        Report a lexicon file that can not be read. Its words are made
+        up when spoken instead, until it is built again.
+
+        """
+        logger.log_err(
+            "The lexicon '%s' of the language '%s' can not be read, its words are made up "
+            "instead: %s" % (self.lexicon.path, self.key, err)
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Language models are read-only.")
+
+
+def _generate_word(model, word):
+    """
+    Make up a random foreign word for a word of the language, or get
+    the one made up the last time.
+
+    Args:
+        model (AURPGLanguageModel): The language.
+        word (str): The word to make up a translation for.
+
+    Returns:
+        new_word (str): The foreign word, possibly empty if the
+            word has no direct translation.
+
+    """
+    lword = word.lower()
+    new_word = model.word_cache.get(lword)
+    if new_word is None:
+        if model.seeded_words:
+            # the same word always gets the same translation, also after a reload
+            rng = Random(zlib.crc32(("%s\n%s" % (model.key, lword)).encode("utf-8")))
+            new_word = _make_word(model, word, rng.randint, rng.choice)
+        else:
+            new_word = _make_word(model, word, randint, choice)
+        model.word_cache.add(lword, new_word)
+    return new_word
+
+
+def _make_word(model, word, randint, choice):
+    """
+    Make up a random foreign word with the given random functions.
+
+    """
+    # make up translation on the fly. Length can
+    # vary from un-translated word.
+    wlen = max(0, len(word) + sum(randint(-1, 1) for i in range(model.word_length_variance)))
+    grammar = model.grammar
+    if wlen not in grammar:
+        if randint(0, 1) == 0:
+            # this word has no direct translation!
+            return ""
+        # use random word length
+        wlen = choice(model.grammar_lengths)
+
+    new_word = ""
+    grammar2phonemes = model.grammar2phonemes
+    for gram in model.structures[choice(grammar[wlen])]:
+        # there are only four combinations: vv,cc,c,v
+        try:
+            new_word += choice(grammar2phonemes[gram])
+        except KeyError:
+            logger.log_trace(
+                "You need to supply at least one example of each of "
+                "the four base phonemes (c, v, cc, vv)"
+            )
+            # abort translation here
+            return ""
+    return new_word
+
+
+def translate_word(model, word, level, start_sentence=False):
+    """
+    Translate a single word.
+
+    Args:
+        model (AURPGLanguageModel): The language.
+        word (str): The word to translate.
+        level (int): Words this long or shorter are not translated.
+        start_sentence (bool, optional): If the word starts a sentence.
+
+    Returns:
+        new_word (str): The translated word.
+
+    """
+    if len(word) <= level:
+        # below level. Don't translate
+        return word
+
+    # try to translate the word from dictionary
+    lword = word.lower()
+    new_word = model.translation.get(lword, "")
+    if not new_word and model.lexicon is not None:
+        new_word = model.lexicon.get(lword)
+    if not new_word:
+        # no dictionary translation. Generate one
+        new_word = _generate_word(model, word)
+
+        if word.istitle():
+            title_word = ""
+            if not start_sentence and not model.noun_translate:
+                # don't translate what we identify as proper nouns (names)
+                title_word = word
+            elif new_word:
+                title_word = new_word
+
+            if title_word:
+                # Regardless of if we translate or not, we will add the custom prefix/postfixes
+                new_word = "%s%s%s" % (
+                    model.noun_prefix,
+                    title_word.capitalize(),
+                    model.noun_postfix,
+                )
+
+    if len(word) > 1 and word.isupper():
+        # keep LOUD words loud also when translated
+        new_word = new_word.upper()
+    return new_word
+
+
+def _clean_text(pieces):
+    """
+    Remove the too long empty spaces and doubled punctuation that
+    translation leaves behind. This is done in one pass while the text
+    is produced; only whitespace and punctuation that may still be
+    removed is held back.
+
+    Args:
+        pieces (iterable): The pieces of the translated text, in order.
+
+    Yields:
+        piece (str): The cleaned text, piece by piece.
+
+    """
+    punct = ""  # punctuation removed if more punctuation follows
+    space = ""  # whitespace removed, except the last, if a word follows
+    for piece in pieces:
+        if not piece:
+            continue
+        if piece.isalnum() or (piece[0] == "{" and _RE_REF.fullmatch(piece)):
+            # a plain word or reference; what was held back is kept
+            yield punct + space[-1:] + piece
+            punct = space = ""
+            continue
+        if piece.isspace():
+            space += piece
+            continue
+        out = []
+        for char in piece:
+            if char.isspace():
+                space += char
+            elif char in _EXTRA_PUNCTUATION:
+                # drops any held back punctuation and whitespace
+                punct = char
+                space = ""
+            elif char.isalnum() or char == "_":
+                out.append(punct + space[-1:] + char)
+                punct = space = ""
+            else:
+                # no whitespace before other punctuation
+                out.append(punct + char)
+                punct = space = ""
+        if out:
+            yield "".join(out)
+    yield punct + space[-1:]
+
+
+def iter_translate(model, text, level=0.0):
+    """
+    Translate a text piece by piece. The text is read once, from start
+    to end, so this works the same for a line as for a book.
+
+    Args:
+        model (AURPGLanguageModel): The language.
+        text (str): The text to translate.
+        level (real, optional): Value between 0.0 and 1.0, see
+            `AURPGLanguageHandler.translate`.
+
+    Yields:
+        piece (str): The translated text, piece by piece. Write them
+            to a stream or join them to get the full translation.
+
+    """
+    threshold = int(10 * (1.0 - max(0, min(level, 1.0))))
+
+    def _translate():
+        last_char = None
+        ipos = 0
+        for match in _RE_WORD_OR_REF.finditer(text):
+            gap = text[ipos : match.start()]
+            if gap:
+                yield gap
+                stripped = gap.rstrip()
+                if stripped:
+                    last_char = stripped[-1]
+            word = match.group()
+            if len(word) <= threshold or word[0] == "{":
+                # short words and references are not translated
+                yield word
+            else:
+                yield translate_word(
+                    model, word, threshold, last_char is None or last_char in ".!?"
+                )
+            last_char = word[-1]
+            ipos = match.end()
+        yield text[ipos:]
+
+    return _clean_text(_translate())
+
+
+def translate_text(model, text, level=0.0, output=None):
+    """
+    Translate a text. This keeps no state between calls, so any number
+    of translations may run at the same time.
+
+    Args:
+        model (AURPGLanguageModel): The language.
+        text (str): The text to translate.
+        level (real, optional): Value between 0.0 and 1.0, see
+            `AURPGLanguageHandler.translate`.
+        output (list or file-like, optional): If given, the translation
+            is appended or written to this as it is made, and nothing is
+            returned.
+
+    Returns:
+        text (str or None): A translated string, None if `output` is given.
+
+    """
+    pieces = iter_translate(model, text, level)
+    if output is None:
+        return "".join(pieces)
+    write = output.append if isinstance(output, list) else output.write
+    for piece in pieces:
+        write(piece)
+
+
+def translate_text_many(model, text, levels):
+    """
+    Translate a text at several levels at once, for example for all
+    the listeners of a say. The text is tokenized once and every word
+    gets one foreign form, used at all levels where it is translated.
+
+    Args:
+        model (AURPGLanguageModel): The language.
+        text (str): The text to translate.
+        levels (iterable): Values between 0.0 and 1.0, see
+            `AURPGLanguageHandler.translate`.
+
+    Returns:
+        translations (dict): Mapping `{level: translated text}`.
+
+    """
+    levels = set(levels)
+    thresholds = dict(
+        (level, int(10 * (1.0 - max(0, min(level, 1.0))))) for level in levels if level != 0.0
+    )
+    if not thresholds:
+        # no translation
+        return dict((level, text) for level in levels)
+    # split the text into [gap, word, gap, word, ..., gap], noting the
+    # foreign form of every word long enough to be translated at any level
+    tokens = []
+    words = []
+    min_threshold = min(thresholds.values())
+    last_char = None
+    ipos = 0
+    for match in _RE_WORD_OR_REF.finditer(text):
+        gap = text[ipos : match.start()]
+        tokens.append(gap)
+        stripped = gap.rstrip()
+        if stripped:
+            last_char = stripped[-1]
+        word = match.group()
+        if len(word) > min_threshold and word[0] != "{":
+            start_sentence = last_char is None or last_char in ".!?"
+            foreign = translate_word(model, word, -1, start_sentence)
+        else:
+            foreign = word
+        words.append(len(tokens))
+        tokens.append((word, foreign))
+        last_char = word[-1]
+        ipos = match.end()
+    tokens.append(text[ipos:])
+
+    translations = {}
+    by_threshold = {}
+    for level in levels:
+        if level == 0.0:
+            # no translation
+            translations[level] = text
+            continue
+        threshold = thresholds[level]
+        if threshold not in by_threshold:
+            parts = list(tokens)
+            for iword in words:
+                word, foreign = parts[iword]
+                parts[iword] = word if len(word) <= threshold else foreign
+            by_threshold[threshold] = "".join(_clean_text(parts))
+        translations[level] = by_threshold[threshold]
+    return translations
+
+
 class AURPGLanguageHandler(DefaultScript):
     """
     This is a storage class that should usually not be created on its
@@ -155,6 +652,10 @@ class AURPGLanguageHandler(DefaultScript):
     language when so desired (usually because the speaker/listener
     don't know the language well enough).
 
+    The stored languages are compiled into `AURPGLanguageModel`s the
+    first time they are needed, and only recompiled when `add` changes
+    them.
+
     """
 
     def at_script_creation(self):
@@ -175,6 +676,8 @@ class AURPGLanguageHandler(DefaultScript):
         vowels=_VOWELS,
         manual_translations=None,
         auto_translations=None,
+        seeded_words=False,
+        lexicon=None,
         force=False,
     ):
         """
@@ -221,12 +724,25 @@ class AURPGLanguageHandler(DefaultScript):
                 the words to translate.  The `manual_translations` will
                 always override overlapping translations created
                 automatically.
+            seeded_words (bool, optional): Words not in the dictionary
+                are made up when spoken and remembered for a while. If
+                set, they are made up from a seed based on the language
+                and the word, so they are the same after a reload too.
+            lexicon (str, optional): Path to a lexicon file (see the
+                AU_RPGLexicon module), relative to the game dir unless
+                absolute. It is stored as given. Its words are looked up when
+                spoken instead of stored with the language. If
+                `auto_translations` are also given, they are added to
+                this lexicon, building it if needed, instead of stored.
+                Words already in the lexicon keep their translation.
             force (bool, optional): Unless true, will not allow the addition
                 of a language that is already created.
 
         Raises:
             LanguageExistsError: Raised if trying to adding a language
                 with a key that already exists, without `force` being set.
+            AURPGLanguageError: Raised if the phonemes or grammar are
+                invalid, or `lexicon` was built with another grammar.
         Notes:
             The `word_file` is for example a word-frequency list for
             the N most common words in the host language. The
@@ -245,22 +761,11 @@ class AURPGLanguageHandler(DefaultScript):
 
         # create grammar_component->phoneme mapping
         # {"vv": ["ea", "oh", ...], ...}
-        grammar2phonemes = defaultdict(list)
-        for phoneme in phonemes.split():
-            if re.search("\W", phoneme):
-                raise AURPGLanguageError("The phoneme '%s' contains an invalid character" % phoneme)
-            gram = "".join(["v" if char in vowels else "c" for char in phoneme])
-            grammar2phonemes[gram].append(phoneme)
-
-        # allowed grammar are grouped by length
-        gramdict = defaultdict(list)
-        for gram in grammar.split():
-            if re.search("\W|(!=[cv])", gram):
-                raise AURPGLanguageError(
-                    "The grammar '%s' is invalid (only 'c' and 'v' are allowed)" % gram
-                )
-            gramdict[len(gram)].append(gram)
-        grammar = dict(gramdict)
+        # and allowed grammar grouped by length
+        try:
+            gramdict, grammar2phonemes = compile_grammar(phonemes, grammar, vowels)
+        except ValueError as err:
+            raise AURPGLanguageError(str(err))
 
         # create automatic translation
         translation = {}
@@ -268,22 +773,26 @@ class AURPGLanguageHandler(DefaultScript):
         if auto_translations:
             if isinstance(auto_translations, str):
                 # path to a file rather than a list
-                with open(auto_translations, "r") as f:
-                    auto_translations = f.readlines()
-            for word in auto_translations:
-                word = word.strip()
-                lword = len(word)
-                new_word = ""
-                wlen = max(0, lword + sum(randint(-1, 1) for i in range(word_length_variance)))
-                if wlen not in grammar:
-                    # always create a translation, use random length
-                    structure = choice(grammar[choice(list(grammar))])
-                else:
-                    # use the corresponding length
-                    structure = choice(grammar[wlen])
-                for match in _RE_GRAMMAR.finditer(structure):
-                    new_word += choice(grammar2phonemes[match.group()])
-                translation[word.lower()] = new_word.lower()
+                auto_translations = read_words(auto_translations)
+            if lexicon:
+                try:
+                    build_lexicon(
+                        lexicon_path(lexicon),
+                        auto_translations,
+                        phonemes=phonemes,
+                        grammar=grammar,
+                        vowels=vowels,
+                        word_length_variance=word_length_variance,
+                        force=force,
+                    )
+                except ValueError as err:
+                    raise AURPGLanguageError(str(err))
+            else:
+                for word in auto_translations:
+                    word = word.strip()
+                    translation[word.lower()] = make_auto_word(
+                        word, gramdict, grammar2phonemes, word_length_variance
+                    )
 
         if manual_translations:
             # update with manual translations
@@ -294,100 +803,38 @@ class AURPGLanguageHandler(DefaultScript):
         # store data
         storage = {
             "translation": translation,
-            "grammar": grammar,
-            "grammar2phonemes": dict(grammar2phonemes),
+            "grammar": gramdict,
+            "grammar2phonemes": grammar2phonemes,
             "word_length_variance": word_length_variance,
             "noun_translate": noun_translate,
             "noun_prefix": noun_prefix,
             "noun_postfix": noun_postfix,
+            "seeded_words": seeded_words,
+            "lexicon": lexicon,
         }
         self.db.language_storage[key] = storage
+        if self.ndb.language_models is not None:
+            self.ndb.language_models[key] = AURPGLanguageModel(key, storage)
 
-    def _translate_sub(self, match):
+    def get_model(self, language="default"):
         """
-        Replacer method called by re.sub when
-        traversing the language string.
+        Get the compiled model of a language.
 
         Args:
-            match (re.matchobj): Match object from regex.
+            language (str, optional): The language key identifier.
 
         Returns:
-            converted word.
-        Notes:
-            Assumes self.lastword and self.level is available
-            on the object.
+            model (AURPGLanguageModel or None): The language model, if the
+                language exists.
 
         """
-        word = match.group()
-        lword = len(word)
-
-        if len(word) <= self.level:
-            # below level. Don't translate
-            new_word = word
-        else:
-            # try to translate the word from dictionary
-            new_word = self.language["translation"].get(word.lower(), "")
-            if not new_word:
-                # no dictionary translation. Generate one
-
-                # find out what preceeded this word
-                wpos = match.start()
-                preceeding = match.string[:wpos].strip()
-                start_sentence = preceeding.endswith((".", "!", "?")) or not preceeding
-
-                # make up translation on the fly. Length can
-                # vary from un-translated word.
-                wlen = max(
-                    0,
-                    lword
-                    + sum(randint(-1, 1) for i in range(self.language["word_length_variance"])),
-                )
-                grammar = self.language["grammar"]
-                if wlen not in grammar:
-                    if randint(0, 1) == 0:
-                        # this word has no direct translation!
-                        wlen = 0
-                        new_word = ""
-                    else:
-                        # use random word length
-                        wlen = choice(list(grammar.keys()))
-
-                if wlen:
-                    structure = choice(grammar[wlen])
-                    grammar2phonemes = self.language["grammar2phonemes"]
-                    for match in _RE_GRAMMAR.finditer(structure):
-                        # there are only four combinations: vv,cc,c,v
-                        try:
-                            new_word += choice(grammar2phonemes[match.group()])
-                        except KeyError:
-                            logger.log_trace(
-                                "You need to supply at least one example of each of "
-                                "the four base phonemes (c, v, cc, vv)"
-                            )
-                            # abort translation here
-                            new_word = ""
-                            break
-
-                if word.istitle():
-                    title_word = ""
-                    if not start_sentence and not self.language.get("noun_translate", False):
-                        # don't translate what we identify as proper nouns (names)
-                        title_word = word
-                    elif new_word:
-                        title_word = new_word
-
-                    if title_word:
-                        # Regardless of if we translate or not, we will add the custom prefix/postfixes
-                        new_word = "%s%s%s" % (
-                            self.language["noun_prefix"],
-                            title_word.capitalize(),
-                            self.language["noun_postfix"],
-                        )
-
-            if len(word) > 1 and word.isupper():
-                # keep LOUD words loud also when translated
-                new_word = new_word.upper()
-        return new_word
+        models = self.ndb.language_models
+        if models is None:
+            models = self.ndb.language_models = dict(
+                (key, AURPGLanguageModel(key, storage))
+                for key, storage in self.db.language_storage.items()
+            )
+        return models.get(language)
 
     def translate(self, text, level=0.0, language="default"):
         """
@@ -408,16 +855,31 @@ class AURPGLanguageHandler(DefaultScript):
         if level == 0.0:
             # no translation
             return text
-        language = self.db.language_storage.get(language, None)
-        if not language:
+        model = self.get_model(language)
+        if not model:
             return text
-        self.language = language
+        return translate_text(model, text, level)
+
+    def translate_many(self, text, levels, language="default"):
+        """
+        Translate the text at several levels at once, such as one per
+        listener of a say. Each word is translated the same way at all
+        levels obfuscating it.
 
-        # configuring the translation
-        self.level = int(10 * (1.0 - max(0, min(level, 1.0))))
-        translation = _RE_WORD.sub(self._translate_sub, text)
-        # the substitution may create too long empty spaces, remove those
-        return _RE_EXTRA_CHARS.sub("", translation)
+        Args:
+            text (str): The text to translate
+            levels (iterable): Values between 0.0 and 1.0, see `translate`.
+            language (str): The language key identifier.
+
+        Returns:
+            translations (dict): Mapping `{level: translated text}`.
+
+        """
+        levels = set(levels)
+        model = self.get_model(language)
+        if not model:
+            return dict((level, text) for level in levels)
+        return translate_text_many(model, text, levels)
 
 
 # Language access functions
@@ -425,6 +887,52 @@ class AURPGLanguageHandler(DefaultScript):
 _LANGUAGE_HANDLER = None
 
 
+def get_language_handler(create=True):
+    """
+    Get the language handler, loading it from the database the first
+    time and caching it.
+
+    Args:
+        create (bool, optional): Create the handler if it does not exist.
+
+    Returns:
+        handler (AURPGLanguageHandler or None): The handler, None if it
+            does not exist and `create` is unset.
+
+    """
+    global _LANGUAGE_HANDLER
+    if not _LANGUAGE_HANDLER:
+        try:
+            _LANGUAGE_HANDLER = AURPGLanguageHandler.objects.get(db_key="language_handler")
+        except AURPGLanguageHandler.DoesNotExist:
+            if create:
+                from evennia import create_script
+
+                _LANGUAGE_HANDLER = create_script(AURPGLanguageHandler)
+    return _LANGUAGE_HANDLER
+
+
+def warm_languages():
+    """
+    Load everything the first say would otherwise wait for: the
+    language handler, the models of all languages and their lexicon
+    files. Called at server start and reload.
+
+    Returns:
+        languages (list): The keys of the languages made ready.
+
+    """
+    handler = get_language_handler(create=False)
+    if not handler:
+        return []
+    languages = list(handler.db.language_storage or {})
+    for language in languages:
+        model = handler.get_model(language)
+        if model.lexicon is not None:
+            model.lexicon.open()
+    return languages
+
+
 def obfuscate_language(text, level=0.0, language="default"):
     """
     Main access method for the language parser.
@@ -442,17 +950,24 @@ def obfuscate_language(text, level=0.0, language="default"):
         translated (str): The translated text.
 
     """
-    # initialize the language handler and cache it
-    global _LANGUAGE_HANDLER
-    if not _LANGUAGE_HANDLER:
-        try:
-            _LANGUAGE_HANDLER = AURPGLanguageHandler.objects.get(db_key="language_handler")
-        except AURPGLanguageHandler.DoesNotExist:
-            if not _LANGUAGE_HANDLER:
-                from evennia import create_script
+    return get_language_handler().translate(text, level=level, language=language)
 
-                _LANGUAGE_HANDLER = create_script(AURPGLanguageHandler)
-    return _LANGUAGE_HANDLER.translate(text, level=level, language=language)
+
+def obfuscate_language_many(text, levels, language="default"):
+    """
+    Access method for obfuscating a text at several levels at once.
+
+    Args:
+        text (str): Text to obfuscate.
+        levels (iterable): Values from 0.0-1.0, see `obfuscate_language`.
+        language (str, optional): The identifier of a language
+            the system understands.
+
+    Returns:
+        translations (dict): Mapping `{level: translated text}`.
+
+    """
+    return get_language_handler().translate_many(text, levels, language=language)
 
 
 def add_language(**kwargs):
@@ -461,16 +976,7 @@ def add_language(**kwargs):
     `LanguageHandler.add` for list of keyword arguments.
 
     """
-    global _LANGUAGE_HANDLER
-    if not _LANGUAGE_HANDLER:
-        try:
-            _LANGUAGE_HANDLER = AURPGLanguageHandler.objects.get(db_key="language_handler")
-        except AURPGLanguageHandler.DoesNotExist:
-            if not _LANGUAGE_HANDLER:
-                from evennia import create_script
-
-                _LANGUAGE_HANDLER = create_script(AURPGLanguageHandler)
-    _LANGUAGE_HANDLER.add(**kwargs)
+    get_language_handler().add(**kwargs)
 
 
 def available_languages():
@@ -481,16 +987,7 @@ def available_languages():
         languages (list): List of key strings of all available
         languages.
     """
-    global _LANGUAGE_HANDLER
-    if not _LANGUAGE_HANDLER:
-        try:
-            _LANGUAGE_HANDLER = AURPGLanguageHandler.objects.get(db_key="language_handler")
-        except AURPGLanguageHandler.DoesNotExist:
-            if not _LANGUAGE_HANDLER:
-                from evennia import create_script
-
-                _LANGUAGE_HANDLER = create_script(AURPGLanguageHandler)
-    return list(_LANGUAGE_HANDLER.attributes.get("language_storage", {}))
+    return list(get_language_handler().attributes.get("language_storage", {}))
 
 
 # ------------------------------------------------------------
@@ -526,6 +1023,34 @@ _RE_WHISPER_OBSCURE = [
 ]  # ...             #13 (always same length)
 
 
+# The letter classes of levels 1-9 as `str.translate` tables. With
+# IGNORECASE these also match a few non-ASCII letters, like the Kelvin
+# sign for k, included here to give the same result as the regexes.
+_WHISPER_LETTERS = string.ascii_letters + "\u0130\u0131\u017f\u212a"
+_WHISPER_TABLES = dict(
+    (
+        olevel,
+        dict((ord(char), "-") for char in _WHISPER_LETTERS if _RE_WHISPER_OBSCURE[olevel].match(char)),
+    )
+    for olevel in range(1, 10)
+)
+
+
+def _obscure_whisper(whisper, olevel):
+    """
+    Obscure a whisper at one of the levels of `_RE_WHISPER_OBSCURE`.
+
+    """
+    if olevel == 13:
+        return "..."
+    if olevel == 12:
+        return "-" * len(whisper)
+    table = _WHISPER_TABLES.get(olevel)
+    if table is None:
+        return _RE_WHISPER_OBSCURE[olevel].sub("-", whisper)
+    return whisper.translate(table)
+
+
 def obfuscate_whisper(whisper, level=0.0):
     """
     Obfuscate whisper depending on a pre-calculated level
@@ -538,10 +1063,33 @@ def obfuscate_whisper(whisper, level=0.0):
             means not obscured (whisper returned unchanged) and 1
             means fully obscured.
 
+    Returns:
+        whisper (str): The obscured whisper.
+
     """
     level = min(max(0.0, level), 1.0)
-    olevel = int(13.0 * level)
-    if olevel == 13:
-        return "..."
-    else:
-        return _RE_WHISPER_OBSCURE[olevel].sub("-", whisper)
+    return _obscure_whisper(whisper, int(13.0 * level))
+
+
+def obfuscate_whisper_many(whisper, listeners):
+    """
+    Obfuscate a whisper for everyone overhearing it. The whisper is
+    obscured once per distinct level, however many listeners share it.
+
+    Args:
+        whisper (str): The whisper string to obscure.
+        listeners (iterable): `(listener, level)` pairs, with levels as
+            for `obfuscate_whisper`.
+
+    Returns:
+        whispers (dict): Mapping `{listener: obscured whisper}`.
+
+    """
+    obscured = {}
+    whispers = {}
+    for listener, level in listeners:
+        olevel = int(13.0 * min(max(0.0, level), 1.0))
+        if olevel not in obscured:
+            obscured[olevel] = _obscure_whisper(whisper, olevel)
+        whispers[listener] = obscured[olevel]
+    return whispers
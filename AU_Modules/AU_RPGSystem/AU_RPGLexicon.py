@@ -0,0 +1,378 @@
+"""
+On-disk lexicons for the language system
+
+Created by MaCorvalan, 2022
+
+A lexicon holds the fixed auto-translations of a language (see the
+`auto_translations` of `AU_RPGLanguages.add_language`) in an SQLite
+file instead of the language handler's Attributes. Words are looked up
+one at a time when spoken, so a language with a 50k-word lexicon loads
+as fast as one without, and the lexicon is shared between reloads
+without being unpickled.
+
+A lexicon is built once, incrementally: building again with more words
+only adds the new ones, and an interrupted build is resumed. This
+module does not need Evennia, so large lexicons can be built offline
+from the game dir:
+
+    python -m AU_Modules.AU_RPGSystem.AU_RPGLexicon AU_Modules/AU_Langs/AU_Words.txt english.lexicon
+
+See `python -m AU_Modules.AU_RPGSystem.AU_RPGLexicon --help` for the
+grammar options, which must be the same as the language's. Then give
+the file to the language:
+
+    ```python
+    rplanguage.add_language(key="english", lexicon="english.lexicon")
+    ```
+
+"""
+import os
+import re
+import random
+import sqlite3
+import argparse
+from functools import lru_cache
+from urllib.request import pathname2url
+from threading import Lock
+from collections import defaultdict
+
+
+# default language grammar, also used by AU_RPGLanguages
+_PHONEMES = (
+    "ea oh ae aa eh ah ao aw ai er ey ow ia ih iy oy ua uh uw a e i u y p b t d f v t dh "
+    "s z sh zh ch jh k ng g m n l r w"
+)
+_VOWELS = "eaoiuy"
+# these must be able to be constructed from phonemes (so for example,
+# if you have v here, there must exist at least one single-character
+# vowel phoneme defined above)
+_GRAMMAR = "v cv vc cvv vcc vcv cvcc vccv cvccv cvcvcc cvccvcv vccvccvc cvcvccvv cvcvcvcvv"
+
+_RE_GRAMMAR = re.compile(r"vv|cc|v|c")
+_RE_INVALID_PHONEME = re.compile(r"\W")
+_RE_INVALID_GRAMMAR = re.compile(r"[^cv]")
+
+# Words added per transaction when building a lexicon
+_BUILD_BATCH_SIZE = 1000
+
+# The max number of words remembered after being looked up, per lexicon
+_LOOKUP_CACHE_SIZE = 4096
+
+
+def compile_grammar(phonemes=_PHONEMES, grammar=_GRAMMAR, vowels=_VOWELS):
+    """
+    Group the phonemes and grammar of a language for making up words.
+
+    Args:
+        phonemes (str, optional): Space-separated phonemes.
+        grammar (str, optional): Space-separated consonant (c) and vowel
+            (v) combinations.
+        vowels (str, optional): Every vowel of the language.
+
+    Returns:
+        grammar, grammar2phonemes (tuple): The grammar as `{length:
+            [structure, ...]}` and the phonemes as `{"vv": ["ea", ...], ...}`.
+
+    Raises:
+        ValueError: If a phoneme or grammar structure is invalid.
+
+    """
+    grammar2phonemes = defaultdict(list)
+    for phoneme in phonemes.split():
+        if _RE_INVALID_PHONEME.search(phoneme):
+            raise ValueError("The phoneme '%s' contains an invalid character" % phoneme)
+        gram = "".join(["v" if char in vowels else "c" for char in phoneme])
+        grammar2phonemes[gram].append(phoneme)
+
+    gramdict = defaultdict(list)
+    for gram in grammar.split():
+        if _RE_INVALID_GRAMMAR.search(gram):
+            raise ValueError("The grammar '%s' is invalid (only 'c' and 'v' are allowed)" % gram)
+        gramdict[len(gram)].append(gram)
+    return dict(gramdict), dict(grammar2phonemes)
+
+
+def make_auto_word(word, grammar, grammar2phonemes, word_length_variance=0, rand=random):
+    """
+    Make up the fixed translation of a word. Unlike words made up when
+    spoken, this always gives a word, of a random length if no grammar
+    fits.
+
+    Args:
+        word (str): The word to translate.
+        grammar (dict): As returned by `compile_grammar`.
+        grammar2phonemes (dict): As returned by `compile_grammar`.
+        word_length_variance (int, optional): The variation of length of words.
+        rand (Random, optional): Where to take random numbers from.
+
+    Returns:
+        new_word (str): The lowercase translation.
+
+    """
+    wlen = max(0, len(word) + sum(rand.randint(-1, 1) for i in range(word_length_variance)))
+    if wlen not in grammar:
+        # always create a translation, use random length
+        structure = rand.choice(grammar[rand.choice(list(grammar))])
+    else:
+        # use the corresponding length
+        structure = rand.choice(grammar[wlen])
+    new_word = ""
+    for match in _RE_GRAMMAR.finditer(structure):
+        new_word += rand.choice(grammar2phonemes[match.group()])
+    return new_word.lower()
+
+
+def read_words(path):
+    """
+    Read a word file lazily, one word per line.
+
+    Args:
+        path (str): The word file.
+
+    Yields:
+        word (str): Every non-empty word, stripped.
+
+    """
+    with open(path, "r", encoding="utf-8-sig") as fil:
+        for line in fil:
+            word = line.strip()
+            if word:
+                yield word
+
+
+class AURPGLexicon(object):
+    """
+    Read access to a lexicon file. The file is opened on the first
+    lookup, and looked up words are remembered in a small LRU cache.
+    It is safe to use from several threads.
+
+    A file missing or unreadable (a lexicon is not kept in git, and
+    may not be built yet) is reported once, and no word is found in
+    it until the lexicon is closed.
+
+    """
+
+    def __init__(self, path, cache_size=_LOOKUP_CACHE_SIZE, on_error=None):
+        """
+        Args:
+            path (str): The lexicon file, as built by `build_lexicon`.
+            cache_size (int, optional): The max number of looked up
+                words remembered.
+            on_error (callable, optional): Called with the error when
+                the file can not be read, once until closed.
+
+        """
+        self.path = path
+        self.connection = None
+        self.failed = False
+        self.on_error = on_error
+        self.lock = Lock()
+        self.get = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def open(self):
+        """
+        Open the file, unless already open.
+
+        Returns:
+            connection (Connection or None): The read-only SQLite
+                connection, None if the file can not be read.
+
+        """
+        if self.connection is None and not self.failed:
+            try:
+                self.connection = sqlite3.connect(
+                    "file:%s?mode=ro" % pathname2url(os.path.abspath(self.path)),
+                    uri=True,
+                    check_same_thread=False,
+                )
+            except sqlite3.Error as err:
+                self._fail(err)
+        return self.connection
+
+    def _fail(self, err):
+        """
+        Stop reading the file after an error, and report it.
+
+        """
+        self.failed = True
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.on_error is not None:
+            self.on_error(err)
+
+    def _query(self, query, args=()):
+        """
+        Run a query on the file, None if it can not be read.
+
+        """
+        with self.lock:
+            connection = self.open()
+            if connection is None:
+                return None
+            try:
+                return connection.execute(query, args).fetchone()
+            except sqlite3.Error as err:
+                self._fail(err)
+                return None
+
+    def _lookup(self, word):
+        """
+        Look up a word. Available as `get`, cached.
+
+        Args:
+            word (str): The lowercase word.
+
+        Returns:
+            new_word (str): The translation, or the empty string if the
+                word is not in the lexicon.
+
+        """
+        row = self._query("SELECT translation FROM words WHERE word = ?", (word,))
+        return row[0] if row else ""
+
+    def __len__(self):
+        row = self._query("SELECT COUNT(*) FROM words")
+        return row[0] if row else 0
+
+    def close(self):
+        """
+        Close the file. It is opened again if needed, and a file that
+        could not be read is tried again.
+
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            self.failed = False
+        self.get.cache_clear()
+
+
+def build_lexicon(
+    path,
+    words,
+    phonemes=_PHONEMES,
+    grammar=_GRAMMAR,
+    vowels=_VOWELS,
+    word_length_variance=0,
+    seed=None,
+    force=False,
+):
+    """
+    Build a lexicon file, or add words to an existing one. Words are
+    added in batches, each committed on its own, so building can be
+    interrupted and resumed. Words already in the lexicon keep their
+    translation.
+
+    Args:
+        path (str): The lexicon file, created if it does not exist.
+        words (str or iterable): A word file (one word per line) or the
+            words to translate.
+        phonemes, grammar, vowels, word_length_variance (optional): The
+            grammar of the language, see `AU_RPGLanguages.add_language`.
+        seed (int, optional): Seed for making up the words, to get the
+            same lexicon from the same words every time.
+        force (bool, optional): Empty an existing lexicon made with
+            another grammar instead of raising an error.
+
+    Returns:
+        added (int): The number of words added.
+
+    Raises:
+        ValueError: If the grammar is invalid, or differs from that of
+            the existing lexicon without `force`.
+
+    """
+    gramdict, grammar2phonemes = compile_grammar(phonemes, grammar, vowels)
+    meta = {
+        "phonemes": " ".join(phonemes.split()),
+        "grammar": " ".join(grammar.split()),
+        "vowels": vowels,
+        "word_length_variance": str(word_length_variance),
+    }
+    if isinstance(words, str):
+        # path to a file rather than a list
+        words = read_words(words)
+    rand = random.Random(seed) if seed is not None else random
+
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS words "
+                "(word TEXT PRIMARY KEY, translation TEXT NOT NULL) WITHOUT ROWID"
+            )
+            old_meta = dict(connection.execute("SELECT key, value FROM meta"))
+            if old_meta and old_meta != meta:
+                if not force:
+                    raise ValueError(
+                        "The lexicon '%s' was built with another grammar. Use 'force=True' "
+                        "to rebuild it." % path
+                    )
+                connection.execute("DELETE FROM words")
+            connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta.items())
+
+        added = 0
+        batch = {}
+        for word in words:
+            word = word.strip().lower()
+            if word and word not in batch:
+                batch[word] = make_auto_word(word, gramdict, grammar2phonemes, word_length_variance, rand)
+            if len(batch) >= _BUILD_BATCH_SIZE:
+                added += _add_batch(connection, batch)
+                batch = {}
+        if batch:
+            added += _add_batch(connection, batch)
+    finally:
+        connection.close()
+    return added
+
+
+def _add_batch(connection, batch):
+    """
+    Add the words of a batch not already in the lexicon, in one
+    transaction.
+
+    Returns:
+        added (int): The number of words added.
+
+    """
+    with connection:
+        before = connection.total_changes
+        connection.executemany("INSERT OR IGNORE INTO words VALUES (?, ?)", batch.items())
+        return connection.total_changes - before
+
+
+def main(args=None):
+    """
+    Build a lexicon from the command line.
+
+    """
+    parser = argparse.ArgumentParser(description="Build or extend a language lexicon file.")
+    parser.add_argument("words", help="word file, one word per line")
+    parser.add_argument("lexicon", help="lexicon file to build or extend")
+    parser.add_argument("--phonemes", default=_PHONEMES, help="space-separated phonemes")
+    parser.add_argument("--grammar", default=_GRAMMAR, help="space-separated c/v combinations")
+    parser.add_argument("--vowels", default=_VOWELS, help="every vowel of the language")
+    parser.add_argument("--word-length-variance", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None, help="seed for a reproducible lexicon")
+    parser.add_argument("--force", action="store_true", help="rebuild a lexicon of another grammar")
+    args = parser.parse_args(args)
+
+    added = build_lexicon(
+        args.lexicon,
+        args.words,
+        phonemes=args.phonemes,
+        grammar=args.grammar,
+        vowels=args.vowels,
+        word_length_variance=args.word_length_variance,
+        seed=args.seed,
+        force=args.force,
+    )
+    print("Added %i words to %s." % (added, args.lexicon))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,616 @@
+# -*- coding: utf-8 -*-
+"""
+Testing suit for the AU RPG System
+
+"""
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from twisted.internet.task import Clock, Cooperator
+from evennia.utils.test_resources import EvenniaTest
+from evennia import create_object, create_script
+from evennia.utils.utils import get_game_dir_path
+
+from AU_Modules.AU_RPGSystem import AU_RPGCommunications as rpsystem
+from AU_Modules.AU_RPGSystem import AU_RPGLanguages as rplanguage
+from AU_Modules.AU_RPGSystem.AU_RPGLexicon import build_lexicon
+from AU_Modules.AU_RPGSystem.AU_RPGCommunications import AURPGRPCharacter, AURPGRPObject, AURPGRPRoom
+
+
+class TestRPSystem(EvenniaTest):
+
+    def setUp(self):
+        super().setUp()
+        self.room = create_object(AURPGRPRoom, key='A tavern')
+        self.speaker = create_object(AURPGRPCharacter, key='Sender', location=self.room)
+        self.receiver1 = create_object(AURPGRPCharacter, key='Receiver1', location=self.room)
+        self.receiver2 = create_object(AURPGRPCharacter, key='Receiver2', location=self.room)
+        self.speaker.sdesc.add("a big dwarf")
+        self.receiver1.sdesc.add("a tall man")
+        self.receiver2.sdesc.add("a tall woman")
+
+    def test_match_index_markers(self):
+        """
+        Test Class 01
+        Test the resolution of emote markers through the match index.
+                * [longest match]
+                * [N-sep multimatch]
+                * [self reference]
+
+        """
+        emote, mapping = rpsystem.parse_sdescs_and_recogs(
+            self.speaker, self.room.contents, "/me looks at /tall woman and /1-tall.")
+
+        self.assertEqual("{#%i} looks at {#%i} and {#%i}." % (
+            self.speaker.id, self.receiver2.id, self.receiver1.id), emote, "Testing the parsed emote.")
+        self.assertEqual(self.receiver2, mapping["#%i" % self.receiver2.id], "Testing the longest match.")
+        self.assertEqual(self.receiver1, mapping["#%i" % self.receiver1.id], "Testing the N-sep match.")
+
+        self.assertRaises(rpsystem.EmoteError, rpsystem.parse_sdescs_and_recogs,
+                          self.speaker, self.room.contents, "/me looks at /tall.")
+
+    def test_match_index_updates(self):
+        """
+        Test Class 02
+        Test the match index follows sdesc, recog and contents changes.
+                * [sdesc add]
+                * [recog add/remove]
+                * [contents change]
+
+        """
+        search = rpsystem.parse_sdescs_and_recogs
+
+        self.receiver1.sdesc.add("a short man")
+        self.assertEqual([self.receiver1], search(self.speaker, self.room.contents, "/short", search_mode=True),
+                         "Testing the index after an sdesc change.")
+
+        self.speaker.recog.add(self.receiver2, "Ann")
+        self.assertEqual([self.receiver2], search(self.speaker, self.room.contents, "/ann", search_mode=True),
+                         "Testing the index after adding a recog.")
+        self.speaker.recog.remove(self.receiver2)
+        self.assertEqual([], search(self.speaker, self.room.contents, "/ann", search_mode=True),
+                         "Testing the index after removing a recog.")
+
+        chair = create_object(AURPGRPObject, key='Old chair', location=self.room)
+        self.assertEqual([chair], search(self.speaker, self.room.contents, "/chair", search_mode=True),
+                         "Testing the index after an object arrives.")
+        chair.location = None
+        self.assertEqual([], search(self.speaker, self.room.contents, "/chair", search_mode=True),
+                         "Testing the index after an object leaves.")
+
+    def test_key_alias_regex_cache(self):
+        """
+        Test Class 03
+        Test the key/alias regex tuple cached on objects without sdesc.
+                * [cached regex]
+                * [alias invalidation]
+
+        """
+        chair = create_object(AURPGRPObject, key='Old chair', location=self.room)
+        regex, obj, key = rpsystem.regex_tuple_from_key_alias(chair)
+
+        self.assertIs(regex, rpsystem.regex_tuple_from_key_alias(chair)[0], "Testing the cached regex.")
+        self.assertTrue(regex.match("/old chair"), "Testing the cached regex match.")
+
+        chair.aliases.add("seat")
+        regex = rpsystem.regex_tuple_from_key_alias(chair)[0]
+        self.assertTrue(regex.match("/seat"), "Testing the regex after adding an alias.")
+        self.assertEqual([chair], rpsystem.parse_sdescs_and_recogs(
+            self.speaker, self.room.contents, "/seat", search_mode=True), "Testing the index after adding an alias.")
+
+    def test_send_emote_shared_renders(self):
+        """
+        Test Class 04
+        Test receivers seeing an emote identically share one render.
+                * [saved renders]
+                * [recog renders]
+
+        """
+        self.assertEqual(1, rpsystem.send_emote(self.speaker, self.room.contents, "/me waves."),
+                         "Testing the renders saved without recogs.")
+
+        self.receiver1.recog.add(self.speaker, "Griatch")
+        self.assertEqual(0, rpsystem.send_emote(self.speaker, self.room.contents, "/me waves."),
+                         "Testing the renders saved with a recog.")
+
+    def test_emote_template(self):
+        """
+        Test Class 05
+        Test the compiled emote template.
+                * [stray braces]
+                * [nested references]
+                * [serialize]
+
+        """
+        template = rpsystem.parse_emote(self.speaker, self.room.contents,
+                                        '/me {grins} at /tall woman: "Hi /tall man {0}"')
+        obj_texts = {"#%i" % self.speaker.id: "Dwarf",
+                     "#%i" % self.receiver1.id: "Man",
+                     "#%i" % self.receiver2.id: "Woman"}
+        lang_texts = dict((key, saytext) for key, (langname, saytext) in template.language_mapping.items())
+
+        self.assertEqual('Dwarf {grins} at Woman: "Hi Man {0}"', template.render(obj_texts, lang_texts),
+                         "Testing the rendered template.")
+
+        restored = rpsystem.EmoteTemplate.deserialize(template.serialize())
+        self.assertEqual(template.tokens, restored.tokens, "Testing the serialized tokens.")
+        self.assertEqual(template.obj_mapping, restored.obj_mapping, "Testing the serialized objects.")
+
+    def test_chunked_broadcast(self):
+        """
+        Test Class 06
+        Test chunked broadcasts are delivered cooperatively and in order.
+                * [deferred delivery]
+                * [queued broadcast]
+                * [broadcast not chunked delivered at once]
+                * [unparsed chunked emote]
+
+        """
+        clock = Clock()
+        broadcaster = rpsystem._BROADCASTER
+        cooperator = broadcaster.cooperator
+        broadcaster.cooperator = Cooperator(scheduler=lambda work: clock.callLater(0, work),
+                                            terminationPredicateFactory=lambda: lambda: True)
+        self.addCleanup(setattr, broadcaster, "cooperator", cooperator)
+        msgs = []
+        self.receiver1.msg = lambda text, **kwargs: msgs.append(text)
+
+        results = []
+        rpsystem.send_emote(self.speaker, self.room.contents, "/me waves.", chunked=True).addCallback(
+            results.append)
+        rpsystem.send_emote(self.speaker, self.room.contents, "/me nods.", chunked=True).addCallback(
+            results.append)
+        self.assertEqual([], msgs, "Testing the broadcast is deferred.")
+        self.assertEqual(1, rpsystem.send_emote(self.speaker, self.room.contents, "/me sits."),
+                         "Testing the broadcast not chunked is direct.")
+        self.assertEqual(["|ba big dwarf|n sits."], msgs, "Testing the broadcast not chunked delivered.")
+
+        while len(results) < 2:
+            clock.advance(0)
+        self.assertEqual(["|ba big dwarf|n sits.", "|ba big dwarf|n waves.", "|ba big dwarf|n nods."], msgs,
+                         "Testing the order of the delivered broadcasts.")
+
+        results = []
+        rpsystem.send_emote(self.speaker, self.room.contents, "/me looks at /tall.",
+                            chunked=True).addCallback(results.append)
+        self.assertEqual([None], results, "Testing the unparsed chunked emote.")
+
+    def test_emote_profiler(self):
+        """
+        Test Class 07
+        Test the emote pipeline profiler.
+                * [disabled]
+                * [phase samples]
+                * [reset]
+
+        """
+        profiler = rpsystem._EMOTE_PROFILER
+        profiler.reset()
+        self.addCleanup(profiler.reset)
+        rpsystem.send_emote(self.speaker, self.room.contents, '/me waves. "Hello."')
+        self.assertEqual({}, profiler.stats(), "Testing no samples while disabled.")
+
+        profiler.enabled = True
+        self.addCleanup(setattr, profiler, "enabled", False)
+        rpsystem.send_emote(self.speaker, self.room.contents, '/me waves. "Hello."')
+        stats = profiler.stats()
+        self.assertEqual(set(("candidates", "markers", "language", "obfuscate", "render", "msg")),
+                         set(stats), "Testing the profiled phases.")
+        self.assertEqual(3, stats["msg"]["size"], "Testing the receivers per call.")
+
+        profiler.reset()
+        self.assertEqual({}, profiler.stats(), "Testing the reset samples.")
+
+    def test_search_batched_candidates(self):
+        """
+        Test Class 08
+        Test the sdesc search filters the matched candidates in memory.
+                * [all matches]
+                * [typeclass limiter]
+                * [no match]
+
+        """
+        chair = create_object(AURPGRPObject, key='Tall chair', location=self.room)
+
+        self.assertEqual(set([self.receiver1, self.receiver2, chair]),
+                         set(self.speaker.search("tall", quiet=True)), "Testing the matched candidates.")
+        self.assertEqual(set([self.receiver1, self.receiver2]),
+                         set(self.speaker.search("tall", typeclass=AURPGRPCharacter, quiet=True)),
+                         "Testing the typeclass limiter.")
+        self.assertEqual([chair], self.speaker.search("tall", typeclass=AURPGRPObject.path, quiet=True),
+                         "Testing the typeclass path limiter.")
+        self.assertEqual([], self.speaker.search("short", quiet=True), "Testing no match.")
+
+    def test_appearance_cache(self):
+        """
+        Test Class 09
+        Test the per-looker cache of room appearances.
+                * [cached render]
+                * [sdesc/recog/desc invalidation]
+                * [contents invalidation]
+
+        """
+        appearance = self.room.return_appearance(self.speaker)
+        self.assertIs(appearance, self.room.return_appearance(self.speaker), "Testing the cached render.")
+
+        self.receiver1.sdesc.add("a short man")
+        self.assertIn("a short man", self.room.return_appearance(self.speaker), "Testing an sdesc change.")
+        self.speaker.recog.add(self.receiver1, "Bob")
+        self.assertIn("Bob", self.room.return_appearance(self.speaker), "Testing a recog change.")
+        self.room.db.desc = "A smoky tavern."
+        self.assertIn("A smoky tavern.", self.room.return_appearance(self.speaker), "Testing a desc change.")
+
+        create_object(AURPGRPObject, key='Old chair', location=self.room)
+        self.assertIn("Old chair", self.room.return_appearance(self.speaker), "Testing a contents change.")
+
+    def test_recog_storage(self):
+        """
+        Test Class 10
+        Test the dbref-keyed recog storage.
+                * [legacy migration]
+                * [lazy regex]
+                * [remove]
+
+        """
+        self.speaker.attributes.add("_recog_ref2recog", {"#%i" % self.receiver1.id: "Bob"})
+        self.speaker.attributes.add("_recog_obj2recog", {self.receiver1: "Bob"})
+        self.speaker.attributes.add("_recog_obj2regex", {self.receiver1: "Bob"})
+        handler = rpsystem.RecogHandler(self.speaker)
+
+        self.assertEqual({self.receiver1.id: ("Bob", "Bob")}, handler.recogs, "Testing the migrated recogs.")
+        self.assertFalse(self.speaker.attributes.has("_recog_obj2recog"), "Testing the legacy layout removal.")
+        self.assertEqual("Bob", handler.get(self.receiver1), "Testing the migrated recog.")
+        self.assertEqual({}, handler._regexes, "Testing no regex compiled on load.")
+        self.assertTrue(handler.get_regex(self.receiver1).match("/bob"), "Testing the lazy regex.")
+        self.assertEqual({"Bob": self.receiver1}, handler.all(), "Testing all recogs.")
+
+        handler.remove(self.receiver1)
+        self.assertEqual({}, rpsystem.RecogHandler(self.speaker).recogs, "Testing the removed recog.")
+
+    def test_sdesc_regex_pool(self):
+        """
+        Test Class 11
+        Test sdesc regexes are compiled lazily and shared.
+                * [lazy compile]
+                * [shared regex]
+
+        """
+        self.receiver2.sdesc.add("a tall man")
+        handler1 = rpsystem.SdescHandler(self.receiver1)
+        handler2 = rpsystem.SdescHandler(self.receiver2)
+
+        self.assertIsNone(handler1._sdesc_regex, "Testing no regex compiled on load.")
+        self.assertIs(handler1.sdesc_regex, handler2.sdesc_regex, "Testing the shared regex.")
+        self.assertTrue(handler1.sdesc_regex.match("/tall man"), "Testing the shared regex match.")
+
+    def test_language_models(self):
+        """
+        Test Class 12
+        Test languages are compiled into read-only models.
+                * [model cache]
+                * [rebuild on add]
+                * [read-only]
+
+        """
+        handler = create_script(rplanguage.AURPGLanguageHandler)
+        handler.add(manual_translations={"hello": "ola"})
+        model = handler.get_model()
+
+        self.assertIs(model, handler.get_model(), "Testing the cached model.")
+        self.assertEqual("ola", rplanguage.translate_text(model, "hello", level=1.0), "Testing the translation.")
+        self.assertRaises(AttributeError, setattr, model, "noun_prefix", "x")
+
+        handler.add(manual_translations={"hello": "hej"}, force=True)
+        self.assertEqual("hej", handler.translate("Hello", level=1.0), "Testing the rebuilt model.")
+
+    def test_translate_many(self):
+        """
+        Test Class 13
+        Test translating a text at several levels at once.
+                * [untranslated level]
+                * [shared foreign words]
+                * [levels from a generator]
+
+        """
+        handler = create_script(rplanguage.AURPGLanguageHandler)
+        handler.add(manual_translations={"the": "y'e", "weather": "uyi", "is": "ly", "pleasant": "emi"})
+        text = "the blorptastic weather is pleasant"
+        translations = handler.translate_many(text, [0.0, 0.5, 1.0, 1.0])
+
+        self.assertEqual(set([0.0, 0.5, 1.0]), set(translations), "Testing one translation per level.")
+        self.assertEqual(text, translations[0.0], "Testing the untranslated level.")
+        self.assertEqual(translations[1.0], translations[0.5].replace("the ", "y'e ", 1).replace(" is ", " ly "),
+                         "Testing the shared foreign words.")
+        self.assertEqual(translations, rplanguage.translate_text_many(
+            handler.get_model(), text, (level for level in [0.0, 0.5, 1.0])), "Testing levels from a generator.")
+
+    def test_word_cache(self):
+        """
+        Test Class 14
+        Test made-up words are remembered and optionally seeded.
+                * [stable words]
+                * [hit counters]
+                * [seeded words]
+
+        """
+        handler = create_script(rplanguage.AURPGLanguageHandler)
+        handler.add()
+        handler.add(key="seeded", seeded_words=True)
+
+        translation = handler.translate("blorpy blorpy", level=1.0)
+        self.assertEqual(translation.split()[0], translation.split()[1], "Testing the stable word.")
+        stats = handler.get_model().word_cache.stats()
+        self.assertEqual((1, 1), (stats["hits"], stats["misses"]), "Testing the hit counters.")
+
+        translation = handler.translate("blorpy", level=1.0, language="seeded")
+        handler.get_model("seeded").word_cache.words.clear()
+        self.assertEqual(translation, handler.translate("blorpy", level=1.0, language="seeded"),
+                         "Testing the seeded word.")
+
+    def test_streaming_translation(self):
+        """
+        Test Class 15
+        Test the single-pass translation, cleaned up while it is made.
+            * [extra whitespace and punctuation]
+            * [sentence starts]
+            * [list and stream output]
+
+        """
+        handler = create_script(rplanguage.AURPGLanguageHandler)
+        handler.add(manual_translations={"hello": "ola", "friend": "amigo"})
+        model = handler.get_model()
+
+        self.assertEqual("ola amigo, ola amigo.",
+                         rplanguage.translate_text(model, "hello  friend ,, hello friend .", level=1.0),
+                         "Testing the extra whitespace and punctuation.")
+        translation = rplanguage.translate_text(model, "hello Bob. Bob", level=1.0)
+        self.assertTrue(translation.startswith("ola Bob. "), "Testing the kept name.")
+        self.assertNotEqual("Bob", translation.split()[-1], "Testing the translated sentence start.")
+
+        text = "Hello friend, hello  world !"
+        translation = rplanguage.translate_text(model, text, level=1.0)
+        output = []
+        self.assertIsNone(rplanguage.translate_text(model, text, level=1.0, output=output),
+                          "Testing nothing returned.")
+        self.assertEqual(translation, "".join(output), "Testing the list output.")
+        stream = StringIO()
+        rplanguage.translate_text(model, text, level=1.0, output=stream)
+        self.assertEqual(translation, stream.getvalue(), "Testing the stream output.")
+
+    def test_lexicon(self):
+        """
+        Test Class 16
+        Test languages with their auto-translations in a lexicon file.
+            * [built lexicon]
+            * [nothing stored]
+            * [lexicon lookup]
+            * [incremental build]
+            * [path relative to the game dir]
+
+        """
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "test.lexicon")
+        handler = create_script(rplanguage.AURPGLanguageHandler)
+        handler.add(auto_translations=["house", "river"], manual_translations={"river": "ola"}, lexicon=path)
+        model = handler.get_model()
+        self.addCleanup(model.lexicon.close)
+
+        self.assertEqual(2, len(model.lexicon), "Testing the built lexicon.")
+        self.assertEqual({"river": "ola"}, handler.db.language_storage["default"]["translation"],
+                         "Testing nothing stored.")
+        self.assertEqual("%s ola" % model.lexicon.get("house"), handler.translate("house river", level=1.0),
+                         "Testing the lexicon lookup.")
+        self.assertEqual("", model.lexicon.get("street"), "Testing the missing word.")
+        self.assertEqual(1, build_lexicon(path, ["house", "street"]), "Testing the incremental build.")
+        with self.assertRaises(rplanguage.AURPGLanguageError):
+            handler.add(key="other", vowels="ae", auto_translations=["house"], lexicon=path)
+        self.assertEqual(path, rplanguage.lexicon_path(path), "Testing an absolute path.")
+        self.assertEqual(os.path.join(get_game_dir_path(), "test.lexicon"), rplanguage.lexicon_path("test.lexicon"),
+                         "Testing a path relative to the game dir.")
+
+    def test_comprehension_matrix(self):
+        """
+        Test Class 17
+        Test the comprehension matrix of a room.
+            * [comprehension levels]
+            * [fluent by default]
+            * [incremental updates]
+
+        """
+        self.assertEqual(0.0, rpsystem.comprehension_level(100, 80), "Testing the fluent speaker.")
+        self.assertEqual(0.5, rpsystem.comprehension_level(50, 100), "Testing the lowest skill.")
+        self.assertEqual(1.0, rpsystem.comprehension_level(0, 100), "Testing the unknown language.")
+
+        matrix = self.room.comprehension
+        self.assertEqual(0.0, self.receiver1.get_language_bucket(self.speaker, "elvish"), "Testing the bucket.")
+        self.assertEqual('"Hello"', matrix.translate('"Hello"', self.speaker, self.receiver1, "elvish"),
+                         "Testing fluent by default.")
+        row = matrix.row(self.speaker, "elvish")
+        self.assertEqual(set([self.speaker.id, self.receiver1.id, self.receiver2.id]), set(row),
+                         "Testing the row.")
+
+        newcomer = create_object(AURPGRPCharacter, key='Newcomer', location=self.room)
+        self.assertIn(newcomer.id, matrix.row(self.speaker, "elvish"), "Testing the added listener.")
+        self.assertIs(row, matrix.row(self.speaker, "elvish"), "Testing the kept row.")
+        hall = create_object(AURPGRPRoom, key='A hall')
+        self.receiver1.move_to(hall, quiet=True)
+        self.assertNotIn(self.receiver1.id, matrix.row(self.speaker, "elvish"), "Testing the removed listener.")
+        self.speaker.move_to(hall, quiet=True)
+        self.assertNotIn(self.speaker.id, matrix.rows["elvish"], "Testing the removed speaker.")
+
+    def test_warm_languages(self):
+        """
+        Test Class 18
+        Test warming the languages at server start.
+            * [no handler]
+            * [handler and models loaded]
+
+        """
+        rplanguage._LANGUAGE_HANDLER = None
+        self.addCleanup(setattr, rplanguage, "_LANGUAGE_HANDLER", None)
+        self.assertEqual([], rplanguage.warm_languages(), "Testing no handler.")
+        self.assertIsNone(rplanguage._LANGUAGE_HANDLER, "Testing no handler created.")
+
+        rplanguage.add_language(key="elvish")
+        handler = rplanguage.get_language_handler()
+        handler.ndb.language_models = None
+        rplanguage._LANGUAGE_HANDLER = None
+        self.assertEqual(["elvish"], rplanguage.warm_languages(), "Testing the warmed languages.")
+        self.assertEqual(handler, rplanguage._LANGUAGE_HANDLER, "Testing the loaded handler.")
+        self.assertIn("elvish", handler.ndb.language_models, "Testing the compiled models.")
+
+    def test_whisper_tables(self):
+        """
+        Test Class 19
+        Test the table-driven whisper obfuscation.
+            * [levels]
+            * [same as the regexes]
+            * [many listeners]
+
+        """
+        whisper = "This is me whispering, Sir."
+        self.assertEqual(whisper, rplanguage.obfuscate_whisper(whisper, level=0.0), "Testing the full whisper.")
+        self.assertEqual("This is m- whisp-ring, Sir.", rplanguage.obfuscate_whisper(whisper, level=0.2),
+                         "Testing a low level.")
+        self.assertEqual("-" * len(whisper), rplanguage.obfuscate_whisper(whisper, level=0.95),
+                         "Testing the whisper length.")
+        self.assertEqual("...", rplanguage.obfuscate_whisper(whisper, level=1.0), "Testing the full obfuscation.")
+        for olevel in range(1, 10):
+            self.assertEqual(rplanguage._RE_WHISPER_OBSCURE[olevel].sub("-", whisper + " \u212a\u017f"),
+                             rplanguage._obscure_whisper(whisper + " \u212a\u017f", olevel),
+                             "Testing the table of level %i." % olevel)
+
+        whispers = rplanguage.obfuscate_whisper_many(
+            whisper, [(self.receiver1, 0.2), (self.receiver2, 0.2), (self.speaker, 0.0)])
+        self.assertEqual({self.receiver1: "This is m- whisp-ring, Sir.", self.receiver2: "This is m- whisp-ring, Sir.",
+                          self.speaker: whisper}, whispers, "Testing many listeners.")
+
+    def test_translate_references(self):
+        """
+        Test Class 20
+        Test the references of emotes in a say, kept as they are when translated.
+            * [references untouched]
+            * [whitespace around references]
+            * [several levels at once]
+
+        """
+        handler = create_script(rplanguage.AURPGLanguageHandler)
+        handler.add(manual_translations={"everyone": "todos", "friend": "amigo"})
+        model = handler.get_model()
+
+        for level in (0.5, 1.0):
+            self.assertEqual('"Hi {#1234} todos."', rplanguage.translate_text(model, '"Hi {#1234} everyone."', level),
+                             "Testing a reference at level {}.".format(level))
+        self.assertEqual("amigo {#12}, {##3} todos",
+                         rplanguage.translate_text(model, "friend  {#12} , {##3} everyone", 1.0),
+                         "Testing the whitespace around references.")
+        translations = rplanguage.translate_text_many(model, '"Hi {#12} everyone."', [0.5, 1.0])
+        self.assertEqual({0.5: '"Hi {#12} todos."', 1.0: '"Hi {#12} todos."'}, translations,
+                         "Testing the references at several levels.")
+
+    def test_match_index_resync(self):
+        """
+        Test Class 21
+        Test the match index is only re-indexed when the contents changed.
+                * [unchanged contents]
+                * [renamed object]
+                * [direct location change]
+
+        """
+        search = rpsystem.parse_sdescs_and_recogs
+        chair = create_object(AURPGRPObject, key='Old chair', location=self.room)
+        index = self.room.match_index
+        self.assertEqual([chair], search(self.speaker, self.room.contents, "/chair", search_mode=True),
+                         "Testing the index built.")
+
+        entries = tuple(list(index.entries[chair.id]))
+        index.entries[chair.id] = entries
+        index.sync()
+        self.assertIs(entries, index.entries[chair.id], "Testing nothing re-indexed when unchanged.")
+
+        chair.key = "Red stool"
+        self.assertEqual([chair], search(self.speaker, self.room.contents, "/stool", search_mode=True),
+                         "Testing the index after a rename.")
+        self.assertEqual([], search(self.speaker, self.room.contents, "/chair", search_mode=True),
+                         "Testing the old name after a rename.")
+
+        chair.location = None
+        index.sync()
+        self.assertNotIn(chair.id, index.entries, "Testing the index after a direct move.")
+
+    def test_broadcast_receiver_error(self):
+        """
+        Test Class 22
+        Test an error sending to a receiver does not stop the broadcast.
+                * [failing receiver]
+                * [next receivers]
+
+        """
+        def _failing_msg(text, **kwargs):
+            raise RuntimeError("Connection lost.")
+
+        msgs = []
+        self.receiver1.msg = _failing_msg
+        self.receiver2.msg = lambda text, **kwargs: msgs.append(text)
+
+        rpsystem.send_emote(self.speaker, self.room.contents, "/me waves.")
+        self.assertEqual(["|ba big dwarf|n waves."], msgs, "Testing the receiver after the failing one.")
+
+    def test_appearance_cache_direct_changes(self):
+        """
+        Test Class 23
+        Test the appearance cache follows changes made without the hooks.
+                * [rename]
+                * [direct location change]
+                * [view lock]
+
+        """
+        chair = create_object(AURPGRPObject, key='Old chair', location=self.room)
+        self.assertIn("Old chair", self.room.return_appearance(self.speaker), "Testing the cached render.")
+
+        chair.key = "Red stool"
+        appearance = self.room.return_appearance(self.speaker)
+        self.assertIn("Red stool", appearance, "Testing a rename.")
+        self.assertNotIn("Old chair", appearance, "Testing the old name after a rename.")
+
+        chair.locks.add("view:false()")
+        self.assertNotIn("Red stool", self.room.return_appearance(self.speaker), "Testing a view lock.")
+        chair.locks.add("view:all()")
+
+        chair.location = None
+        self.assertNotIn("Red stool", self.room.return_appearance(self.speaker), "Testing a direct location change.")
+
+    def test_lexicon_missing(self):
+        """
+        Test Class 24
+        Test a language whose lexicon file is missing.
+                * [words made up instead]
+                * [error reported once]
+                * [file read again once built]
+
+        """
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "missing.lexicon")
+        handler = create_script(rplanguage.AURPGLanguageHandler)
+        handler.add(lexicon=path)
+        model = handler.get_model()
+        self.addCleanup(model.lexicon.close)
+        errors = []
+        model.lexicon.on_error = errors.append
+
+        translation = handler.translate("house house river", level=1.0)
+        self.assertEqual(3, len(translation.split()), "Testing the words made up.")
+        self.assertNotIn("house", translation, "Testing the words translated.")
+        self.assertEqual(0, len(model.lexicon), "Testing the empty lexicon.")
+        self.assertEqual(1, len(errors), "Testing the error reported once.")
+
+        build_lexicon(path, ["house"])
+        model.lexicon.close()
+        self.assertEqual(1, len(model.lexicon), "Testing the lexicon built.")
+        self.assertEqual(model.lexicon.get("house"), handler.translate("house", level=1.0),
+                         "Testing the lexicon lookup.")
+
+    pass  # END of CLASS
@@ -48,5 +48,39 @@ class CoCCharacter(AURPGRPCharacter):
         self.db._movementRate = 0  # Movement rate - (STR + DEX) from table mod. by age - INTEGER
         self.db._sanity = 0  # Sanity - POW - INTEGER
 
+        # Language skills
+        self.db._languages = {}  # Languages - {language: skill 0-100}, fluent if not rated - DICT
+
         # Status FLAGS
         pass  # END of CLASS
+
+    def get_language_skill(self, language, **kwargs):
+        """
+        Get how well the investigator knows a language. Languages not
+        rated yet are spoken fluently, so investigators understand each
+        other until their skills are set.
+
+        Args:
+            language (str): The language key, as in the language handler.
+
+        Returns:
+            skill (int): From 0 (unknown) to 100 (fluent).
+
+        """
+        return (self.db._languages or {}).get(language, 100)
+
+    def set_language_skill(self, language, skill):
+        """
+        Set how well the investigator knows a language, and update how
+        well everyone around understands each other.
+
+        Args:
+            language (str): The language key, as in the language handler.
+            skill (int): From 0 (unknown) to 100 (fluent).
+
+        """
+        languages = dict(self.db._languages or {})
+        languages[language] = max(0, min(int(skill), 100))
+        self.db._languages = languages
+        if hasattr(self.location, "comprehension"):
+            self.location.comprehension.update(self)
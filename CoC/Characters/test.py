@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Testing suit for CoC Characters
+
+"""
+from evennia.utils.test_resources import EvenniaTest
+from evennia import create_object
+
+import CoC.CoC_Rooms
+from CoC.Characters.CoC_Characters import CoCCharacter
+
+
+class TestCharacters(EvenniaTest):
+
+    def test_language_skills(self):
+        """
+        Test Class 01
+        Test the language skills of the investigators.
+                * [skills]
+                * [fluent in languages not rated]
+                * [comprehension levels]
+                * [skill changes]
+
+        """
+        room = create_object(CoC.CoC_Rooms.CoCRoom, key='A foggy harbour')
+        sailor = create_object(CoCCharacter, key='Sailor', location=room)
+        scholar = create_object(CoCCharacter, key='Scholar', location=room)
+        self.assertEqual(0.0, scholar.get_language_bucket(sailor, "english"), "Testing the languages not rated.")
+        sailor.set_language_skill("english", 100)
+        scholar.set_language_skill("english", 40)
+
+        self.assertEqual(40, scholar.get_language_skill("english"), "Testing the skill.")
+        self.assertEqual(100, scholar.get_language_skill("latin"), "Testing the language not rated.")
+        self.assertEqual(0.6, scholar.get_language_bucket(sailor, "english"), "Testing the comprehension level.")
+        self.assertEqual(0.6, sailor.get_language_bucket(scholar, "english"), "Testing the speaker's skill.")
+
+        scholar.set_language_skill("english", 90)
+        self.assertEqual(0.1, scholar.get_language_bucket(sailor, "english"), "Testing the skill change.")
+        scholar.set_language_skill("english", 0)
+        self.assertEqual({"english": 0}, scholar.db._languages, "Testing the forgotten language.")
+        self.assertEqual(1.0, sailor.get_language_bucket(scholar, "english"), "Testing the unknown language level.")
+
+    pass  # END of CLASS
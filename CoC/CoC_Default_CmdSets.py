@@ -5,6 +5,8 @@
 from evennia import default_cmds
 from evennia import CmdSet
 
+from AU_Modules.AU_Menu_Logging.AU_MenuLogging import CmdLoginQueue
+
 
 class CoCCharacterCmdSet(default_cmds.CharacterCmdSet):
     """
@@ -43,6 +45,7 @@ class CoCAccountCmdSet(default_cmds.AccountCmdSet):
         #
         # any commands you add below will overload the default ones.
         #
+        self.add(CmdLoginQueue())
 
 
 class CoCUnloggedinCmdSet(default_cmds.UnloggedinCmdSet):
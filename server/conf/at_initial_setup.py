@@ -32,6 +32,7 @@ def at_initial_setup():
                                  vowels=AU_Languages.english_vowels,
                                  manual_translations=AU_Languages.english_manual_translations,
                                  auto_translations=AU_Languages.english_auto_translations,
+                                 lexicon=AU_Languages.english_lexicon,
                                  force=AU_Languages.english_force)
 
     # Definition of all languages used in the mud.
@@ -15,6 +15,27 @@ at_server_cold_start()
 at_server_cold_stop()
 
 """
+from time import perf_counter
+
+from evennia.utils import logger
+
+from AU_Modules.AU_RPGSystem import AU_RPGLanguages
+from AU_Modules.AU_Menu_Logging import AU_MenuLogging
+
+
+def _warm_languages():
+    """
+    Load the language handler and models before the first say needs
+    them, and log how long it took.
+    """
+    start = perf_counter()
+    try:
+        languages = AU_RPGLanguages.warm_languages()
+    except Exception:
+        logger.log_trace("Language warm-up failed.")
+        return
+    logger.log_info("Languages warmed up in %.3f s: %s" % (
+        perf_counter() - start, ", ".join(languages) or "none"))
 
 
 def at_server_start():
@@ -22,7 +43,8 @@ def at_server_start():
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    _warm_languages()
+    AU_MenuLogging.load_connection_screens()
 
 
 def at_server_stop():
@@ -30,7 +52,7 @@ def at_server_stop():
     This is called just before the server is shut down, regardless
     of it is for a reload, reset or shutdown.
     """
-    pass
+    AU_MenuLogging.LOGIN_QUEUE.log_metrics()
 
 
 def at_server_reload_start():
@@ -18,13 +18,26 @@ The commands available to the user when the connection screen is shown
 are defined in evennia.default_cmds.UnloggedinCmdSet. The parsing and display
 of the screen is done by the unlogged-in "look" command.
 
+The login menu (AU_Menu_Logging) sends the screen with `send_connection_screen`
+instead, pre-rendered once per output flavour (see AU_ANSI_ScreenCache).
+
 """
 
 from AU_Modules.AU_ANSI import AU_ANSI_Screens_0000
+from AU_Modules.AU_ANSI.AU_ANSI_ScreenCache import AUScreenCache
 
 
 CONNECTION_SCREEN = AU_ANSI_Screens_0000.AU_ANSI_Screen_0000.strip()
 
+_SCREEN_CACHE = AUScreenCache(AU_ANSI_Screens_0000, "AU_ANSI_Screen_0000")
+
+
+def send_connection_screen(session):
+    """
+    Send the connection screen to a session, pre-rendered for its protocol.
+    """
+    _SCREEN_CACHE.send(session)
+
 
 # CONNECTION_SCREEN_R = """
 # |b==============================================================|n
@@ -23,6 +23,7 @@ several more options for customizing the Guest account system.
 """
 
 from evennia import DefaultAccount, DefaultGuest
+from evennia.utils import logger
 
 
 class Account(DefaultAccount):
@@ -92,7 +93,19 @@ class Account(DefaultAccount):
 
     """
 
-    pass
+    def set_password(self, password, **kwargs):
+        """
+        Set the password of the account. A password already hashed by the
+        login menu, out of the reactor, keeps its hash instead of being
+        hashed again (see AU_MenuLogging.AUHashedPassword).
+        """
+        encoded = getattr(password, "encoded", None)
+        if encoded is None:
+            return super().set_password(password, **kwargs)
+        self.password = encoded
+        self._password = str(password)
+        logger.log_sec("Password successfully changed for {}.".format(self))
+        self.at_password_change()
 
 
 class Guest(DefaultGuest):